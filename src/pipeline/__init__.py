@@ -21,7 +21,7 @@ from .downloader import Downloader, TokenManager
 from .uploader import Uploader
 from .processor import RemoteProcessor
 from .checker import AnnotationChecker
-from .tracker import Tracker, TrackingRecord, create_tracking_records
+from .tracker import Tracker, BatchTracker, TrackingRecord, create_tracking_records
 from .server_logger import ServerLogger, ProcessingRecord
 from .state import StateManager, ProcessStatus
 from .scheduler import PipelineScheduler, PipelineStep, StepConfig
@@ -48,6 +48,7 @@ __all__ = [
     "AnnotationChecker",
     # 追踪
     "Tracker",
+    "BatchTracker",
     "TrackingRecord",
     "create_tracking_records",
     # 服务器日志
@@ -14,6 +14,7 @@ logger = logging.getLogger(__name__)
 # 远程检查脚本路径
 REMOTE_CHECKER_SCRIPT = "/tmp/annotation_checker.py"
 REMOTE_CHECK_CONFIG = "/tmp/check_config.yaml"
+REMOTE_KEYFRAME_SCRIPT = "/tmp/keyframe_worker.py"
 
 
 class AnnotationChecker:
@@ -24,25 +25,30 @@ class AnnotationChecker:
         self.config = get_config()
         self._script_deployed = False
     
-    def deploy_script(self):
-        """部署检查脚本到服务器"""
+    def deploy_script(self) -> bool:
+        """部署检查脚本到服务器，返回是否成功（失败时不记为已部署，下次调用重试）"""
         if self._script_deployed:
-            return
+            return True
         
-        # 部署检查脚本
-        from .processor import _load_script
-        self.ssh.write_file(REMOTE_CHECKER_SCRIPT, _load_script("annotation_checker.py"))
+        # 部署检查脚本（远程已有相同内容时跳过）
+        from .processor import _load_script, _load_check_config, _deploy_files
+        files = {
+            REMOTE_CHECKER_SCRIPT: _load_script("annotation_checker.py").encode(),
+            REMOTE_KEYFRAME_SCRIPT: _load_script("keyframe_worker.py").encode(),
+        }
         
-        # 上传检查配置
-        config_path = Path(self.config.check_config_path)
-        if config_path.exists():
-            import yaml
-            with open(config_path, 'r') as f:
-                config_content = yaml.dump(yaml.safe_load(f))
-            self.ssh.write_file(REMOTE_CHECK_CONFIG, config_content)
+        # 检查配置原样上传，远程脚本自行解析
+        config_content = _load_check_config(self.config.check_config_path)
+        if config_content is not None:
+            files[REMOTE_CHECK_CONFIG] = config_content
+        
+        if not _deploy_files(self.ssh, files):
+            logger.error("❌ 检查脚本部署失败")
+            return False
         
         self._script_deployed = True
         logger.info("✅ 检查脚本部署完成")
+        return True
     
     def check(self, data_dir: str, stem: str) -> Tuple[bool, int, str]:
         """
@@ -59,21 +65,19 @@ class AnnotationChecker:
         
         report_path = f"/tmp/report_{stem}.txt"
         
-        cmd = (
-            f"python3 {REMOTE_CHECKER_SCRIPT} "
-            f"--data_dir '{data_dir}' "
-            f"--config '{REMOTE_CHECK_CONFIG}' "
-            f"--report '{report_path}'"
-        )
+        # 运行检查脚本并输出摘要（一次远程调用，不传输报告内容，
+        # 需要时再通过 download_report 下载）
+        from .processor import _check_command, _parse_issue_count
+        cmd = _check_command(data_dir, report_path)
         
         status, out, err = self.ssh.exec_command(cmd, timeout=120)
         
         if status != 0:
             return False, -1, f"检查脚本失败: {err[:200]}"
         
-        # 读取报告判断是否通过
-        report_content = self.ssh.read_file(report_path) or ""
-        issue_count = report_content.count("帧:")
+        issue_count = _parse_issue_count(out)
+        if issue_count is None:
+            return False, -1, f"读取检查结果失败: {err[:200]}"
         
         return issue_count == 0, issue_count, report_path
     
@@ -87,18 +91,17 @@ class AnnotationChecker:
         return None
     
     def get_keyframe_count(self, data_dir: str) -> int:
-        """获取关键帧数量"""
-        sample_paths = [
-            f"{data_dir}/sample.json",
-            f"{data_dir}/undistorted/sample.json",
-        ]
+        """获取关键帧数量（远程流式计数，不加载整个 JSON）"""
+        self.deploy_script()
         
-        for sample_path in sample_paths:
-            if self.ssh.file_exists(sample_path):
-                cmd = f"python3 -c \"import json; print(len(json.load(open('{sample_path}'))))\""
-                status, out, _ = self.ssh.exec_command(cmd)
-                if status == 0 and out.strip().isdigit():
-                    return int(out.strip())
+        cmd = [
+            "python3", REMOTE_KEYFRAME_SCRIPT,
+            "--data_dir", data_dir,
+            "--names", "sample.json", "undistorted/sample.json",
+        ]
+        status, out, _ = self.ssh.exec_command(cmd)
+        if status == 0 and out.strip().isdigit():
+            return int(out.strip())
         
         return 0
     
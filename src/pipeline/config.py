@@ -3,15 +3,40 @@
 集中管理所有配置项，支持YAML文件加载和环境变量覆盖
 """
 import os
+import time
+import socket
+import functools
 from pathlib import Path
 from dataclasses import dataclass, field
 from typing import List, Optional, Dict, Any
 import yaml
 
+# 优先使用 libyaml C 扩展解析 YAML
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
 
 # 配置文件默认路径
 DEFAULT_CONFIG_PATH = Path(__file__).parent.parent.parent / "configs" / "pipeline.yaml"
 
+# 服务器可用性探测：SSH 端口、超时及结果缓存时间（秒）
+SSH_PORT = 22
+SERVER_PROBE_TIMEOUT = 2
+SERVER_PROBE_TTL = 60
+
+
+@functools.lru_cache(maxsize=None)
+def _env(key: str, default: str = "") -> str:
+    """读取环境变量（缓存结果，load_env_file 后自动失效）"""
+    return os.environ.get(key, default)
+
+
+def clear_env_cache():
+    """环境变量被修改后调用，使后续配置重新读取"""
+    _env.cache_clear()
+
 
 @dataclass
 class ServerConfig:
@@ -28,7 +53,7 @@ class ServerConfig:
     def __post_init__(self):
         # 从环境变量获取密码
         env_key = f"SERVER_{self.name.upper()}_PASSWORD"
-        self.password = os.environ.get(env_key, "")
+        self.password = _env(env_key)
 
 
 @dataclass
@@ -39,12 +64,15 @@ class DataWeaveConfig:
     password: str = ""
     token: str = ""
     path_templates: List[str] = field(default_factory=list)
+    # 多段并行下载：分段数（1 表示禁用）及启用分段的最小文件大小
+    segment_count: int = 4
+    segment_min_size: int = 64 * 1024 * 1024
     
     def __post_init__(self):
         # 环境变量优先
-        self.username = os.environ.get("DATAWEAVE_USERNAME", self.username)
-        self.password = os.environ.get("DATAWEAVE_PASSWORD", self.password)
-        self.token = os.environ.get("DATAWEAVE_AUTH_TOKEN", self.token)
+        self.username = _env("DATAWEAVE_USERNAME", self.username)
+        self.password = _env("DATAWEAVE_PASSWORD", self.password)
+        self.token = _env("DATAWEAVE_AUTH_TOKEN", self.token)
         
         if not self.path_templates:
             self.path_templates = [
@@ -75,12 +103,18 @@ class PipelineConfig:
     zip_after_process: str = "rename"
     rename_json: bool = True
     check_config_path: str = "configs/check_rules.yaml"
+    # 关键帧数量范围（0 表示不限制），超出范围的 ZIP 在解压前直接拒绝
+    min_keyframes: int = 0
+    max_keyframes: int = 0
     
     # 并发配置
     max_workers: int = 3
     download_workers: int = 5
     batch_size: int = 20
     
+    # 服务器探测缓存 (server, 过期时间)
+    _probe_cache: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+    
     def __post_init__(self):
         if not self.servers:
             self.servers = [
@@ -96,22 +130,29 @@ class PipelineConfig:
             ]
     
     def get_available_server(self) -> Optional[ServerConfig]:
-        """获取可用的服务器（按优先级）"""
-        import paramiko
+        """获取可用的服务器（按优先级），探测结果缓存 SERVER_PROBE_TTL 秒"""
+        if self._probe_cache is not None:
+            server, expire_at = self._probe_cache
+            if time.monotonic() < expire_at:
+                return server
         
         for server in sorted(self.servers, key=lambda s: s.priority):
             if not server.enabled:
                 continue
             try:
-                ssh = paramiko.SSHClient()
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                ssh.connect(server.ip, username=server.user, timeout=5)
-                ssh.close()
+                # 只探测 SSH 端口是否可达，无需完整的密钥交换
+                with socket.create_connection((server.ip, SSH_PORT), timeout=SERVER_PROBE_TIMEOUT):
+                    pass
+                self._probe_cache = (server, time.monotonic() + SERVER_PROBE_TTL)
                 return server
-            except Exception:
+            except OSError:
                 continue
         return self.servers[0] if self.servers else None
     
+    def invalidate_server_cache(self):
+        """清除服务器探测缓存（连接失败时调用，下次重新探测）"""
+        self._probe_cache = None
+    
     @classmethod
     def load(cls, config_path: str = None) -> "PipelineConfig":
         """从 YAML 文件加载配置"""
@@ -119,7 +160,7 @@ class PipelineConfig:
         
         if path.exists():
             with open(path, 'r', encoding='utf-8') as f:
-                data = yaml.safe_load(f) or {}
+                data = yaml.load(f, Loader=YamlLoader) or {}
             return cls._from_dict(data)
         return cls()
     
@@ -152,6 +193,8 @@ class PipelineConfig:
             zip_after_process=proc_cfg.get('zip_after_process', 'rename'),
             rename_json=proc_cfg.get('rename_json', True),
             check_config_path=proc_cfg.get('check_config_path', 'configs/check_rules.yaml'),
+            min_keyframes=proc_cfg.get('min_keyframes', 0),
+            max_keyframes=proc_cfg.get('max_keyframes', 0),
             max_workers=conc_cfg.get('max_workers', 3),
             download_workers=conc_cfg.get('download_workers', 5),
             batch_size=conc_cfg.get('batch_size', 20),
@@ -190,3 +233,5 @@ def load_env_file(env_path: str = None):
             if '=' in line:
                 key, value = line.split('=', 1)
                 os.environ.setdefault(key.strip(), value.strip())
+    
+    clear_env_cache()
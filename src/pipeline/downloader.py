@@ -2,19 +2,193 @@
 下载模块
 负责从 DataWeave 下载 ZIP 文件
 """
+import os
+import json
 import time
+import zlib
+import base64
+import struct
 import logging
 import zipfile
 import threading
 import hashlib
 from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from .config import get_config, DataWeaveConfig
+from .utils import preallocate_file
 
 logger = logging.getLogger(__name__)
 
+# 下载写入块大小（1MB，减少 Python 层循环次数）
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 多段下载进度保存间隔（字节），进度文件只会落后于实际写入的数据
+SEGMENT_STATE_SAVE_INTERVAL = 32 * 1024 * 1024
+
+# 多段下载进度回调的最短间隔（秒），下载完成时总会回调一次
+SEGMENT_PROGRESS_INTERVAL = 0.2
+
+# ZIP 校验结果缓存文件名（位于本地临时目录，记录已校验文件的 mtime、大小与 inode）
+VERIFY_CACHE_FILE = ".verify_cache.json"
+
+# 校验缓存写回间隔（秒）：新增记录只标记为待写回，超过间隔或批量下载结束时才整体写入一次
+VERIFY_CACHE_FLUSH_INTERVAL = 30.0
+
+# 批量查询下载 URL：单次请求的 URI 数量上限，及预取结果的有效期（预签名 URL 会过期）
+URL_BATCH_SIZE = 200
+URL_PREFETCH_TTL = 10 * 60
+
+# DataWeave JSON 接口的公共请求头（各请求在其基础上添加 Authorization）
+JSON_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Content-Type": "application/json",
+}
+
+
+def _json_dumps(obj) -> bytes:
+    """序列化请求体（优先使用 orjson）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+
+def _json_loads(data: bytes):
+    """解析响应体（优先使用 orjson）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def create_http_session(pool_size: int = 10) -> requests.Session:
+    """创建 HTTP 会话，复用 TCP/TLS 连接（keep-alive），避免每个请求重新握手"""
+    session = requests.Session()
+    # 连接阶段的瞬时错误由连接池自动重试，不占用上层的重试次数
+    retry = Retry(total=3, connect=3, read=0, status=0, backoff_factor=0.3)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# 成员本地文件头固定部分长度；首次 pread 额外多读的字节数（覆盖本地头与中央目录 extra 长度差异）
+_LOCAL_HEADER_SIZE = 30
+_LOCAL_HEADER_SLACK = 64
+
+
+def _zipfile_member_ok(zip_path: Path, info: zipfile.ZipInfo) -> bool:
+    """通过 zipfile 读取整个成员校验 CRC（加密或非 stored/deflate 成员使用）"""
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zf, zf.open(info) as f:
+            while f.read(DOWNLOAD_CHUNK_SIZE):
+                pass
+        return True
+    except (zipfile.BadZipFile, RuntimeError, NotImplementedError, zlib.error, OSError, EOFError):
+        return False
+
+
+def _member_crc_ok(fd: int, info: zipfile.ZipInfo) -> bool:
+    """
+    用 os.pread 读取成员原始数据并计算 CRC32：本地文件头和（小成员的）全部数据一次读出，
+    大成员按 1MB 分块读取、限量解压；stored 成员不经过解压器。
+    """
+    guess = _LOCAL_HEADER_SIZE + len(info.filename.encode()) + len(info.extra) + _LOCAL_HEADER_SLACK
+    first = os.pread(fd, guess + min(info.compress_size, DOWNLOAD_CHUNK_SIZE), info.header_offset)
+    if len(first) < _LOCAL_HEADER_SIZE or first[:4] != b'PK\x03\x04':
+        return False
+    name_len, extra_len = struct.unpack_from('<HH', first, 26)
+    data_start = _LOCAL_HEADER_SIZE + name_len + extra_len
+    if len(first) < data_start:
+        return False
+    
+    decomp = zlib.decompressobj(-15) if info.compress_type == zipfile.ZIP_DEFLATED else None
+    remaining = info.compress_size
+    offset = info.header_offset + data_start
+    data = first[data_start:data_start + remaining]
+    crc = 0
+    size = 0
+    while remaining > 0:
+        if not data:
+            data = os.pread(fd, min(remaining, DOWNLOAD_CHUNK_SIZE), offset)
+            if not data:
+                return False
+        remaining -= len(data)
+        offset += len(data)
+        if decomp is None:
+            crc = zlib.crc32(data, crc)
+            size += len(data)
+        else:
+            # 限制单次解压输出，避免高压缩率数据产生大块内存分配
+            while data:
+                out = decomp.decompress(data, DOWNLOAD_CHUNK_SIZE)
+                crc = zlib.crc32(out, crc)
+                size += len(out)
+                data = decomp.unconsumed_tail
+        data = b''
+    if decomp is not None:
+        data = decomp.flush()
+        crc = zlib.crc32(data, crc)
+        size += len(data)
+    return crc == info.CRC and size == info.file_size
+
+
+def first_bad_zip_member(zip_path: Path, infos: List[zipfile.ZipInfo]) -> Optional[str]:
+    """
+    校验一组 ZIP 成员的 CRC32，返回第一个损坏成员的名称，全部正确返回 None
+    
+    整组成员共用一个文件描述符，用 pread 按偏移读取，减少 open/seek 系统调用。
+    """
+    try:
+        fd = os.open(str(zip_path), os.O_RDONLY)
+    except OSError:
+        return infos[0].filename if infos else None
+    try:
+        for info in infos:
+            if info.flag_bits & 0x01 or info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                ok = _zipfile_member_ok(zip_path, info)
+            else:
+                try:
+                    ok = _member_crc_ok(fd, info)
+                except (zlib.error, OSError):
+                    ok = False
+            if not ok:
+                return info.filename
+        return None
+    finally:
+        os.close(fd)
+
+
+def _safe_stat(path: Path) -> Optional[os.stat_result]:
+    """一次 stat 调用同时判断存在性和获取属性，文件不存在时返回 None"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def split_zip_members(infos: List[zipfile.ZipInfo], groups: int) -> List[List[zipfile.ZipInfo]]:
+    """按文件偏移把成员切成最多 groups 个连续分组，各组压缩数据量大致相等"""
+    infos = sorted(infos, key=lambda info: info.header_offset)
+    target = sum(info.compress_size for info in infos) / max(1, groups) or 1
+    result: List[List[zipfile.ZipInfo]] = [[]]
+    acc = 0
+    for info in infos:
+        if acc >= target and len(result) < groups:
+            result.append([])
+            acc = 0
+        result[-1].append(info)
+        acc += info.compress_size
+    return [group for group in result if group]
+
 
 class TokenManager:
     """Token 管理器，支持自动刷新（线程安全）"""
@@ -35,30 +209,46 @@ class TokenManager:
         if self._initialized:
             return
         self.config = config or get_config().dataweave
-        self._token: Optional[str] = None
-        self._token_time: Optional[float] = None
+        # (token, 获取时间 time.monotonic())，整体替换以便无锁读取；token 已带 "Bearer " 前缀
+        self._token_state: Tuple[Optional[str], Optional[float]] = (None, None)
         self._max_age = 50 * 60  # 50分钟
         self._refresh_buffer = 5 * 60  # 提前5分钟刷新，避免长时间操作中过期
         self._token_lock = threading.Lock()
+        self._session = create_http_session(pool_size=1)
+        # 备用 Token（配置/环境变量中的固定 token）预先拼好请求头
+        self._fallback_token = f"Bearer {self.config.token}" if self.config.token else ""
         self._initialized = True
     
+    def _cached_token(self) -> Optional[str]:
+        """无锁读取仍在有效期内的 token（token 与获取时间作为一个元组整体发布，不会读到不一致的组合）"""
+        token, token_time = self._token_state
+        if token and token_time is not None and \
+                time.monotonic() - token_time < (self._max_age - self._refresh_buffer):
+            return token
+        return None
+    
     def get_token(self, force_refresh: bool = False) -> str:
-        """获取有效的 Token（线程安全）"""
+        """获取有效的 Token（线程安全，快路径无锁，刷新时双重检查只登录一次）"""
+        if not self.config.username or not self.config.password:
+            return self._fallback_token
+        
+        if not force_refresh:
+            token = self._cached_token()
+            if token:
+                return token
+        
         with self._token_lock:
-            # 检查是否有有效 token（提前刷新避免长时间操作中过期）
-            if not force_refresh and self._token and self._token_time:
-                age = time.time() - self._token_time
-                if age < (self._max_age - self._refresh_buffer):
-                    return self._token
+            # 双重检查：等待锁期间其他线程可能已完成刷新
+            token, token_time = self._token_state
+            if not force_refresh and token and token_time is not None:
+                if self._cached_token():
+                    return token
                 # Token即将过期但还有效，记录日志后刷新
-                if age < self._max_age:
+                if time.monotonic() - token_time < self._max_age:
                     logger.info("🔄 Token即将过期，提前刷新")
             
-            if not self.config.username or not self.config.password:
-                return f"Bearer {self.config.token}" if self.config.token else ""
-            
             # 记录是否是首次获取
-            is_first = self._token is None
+            is_first = token is None
             
             for attempt in range(3):
                 try:
@@ -66,30 +256,222 @@ class TokenManager:
                         "email": self.config.username,
                         "password": self.config.password
                     }
-                    headers = {
-                        "User-Agent": "Mozilla/5.0",
-                        "Content-Type": "application/json",
-                    }
-                    
-                    r = requests.post(self.config.login_url, json=login_data, headers=headers, timeout=15)
-                    data = r.json()
+                    r = self._session.post(self.config.login_url, data=_json_dumps(login_data),
+                                           headers=JSON_HEADERS, timeout=15)
+                    data = _json_loads(r.content)
                     
                     if data.get("code") == 0:
                         token_data = data.get("data", {}).get("token", {})
                         access_token = token_data.get("access_token")
                         if access_token:
-                            self._token = f"Bearer {access_token}"
-                            self._token_time = time.time()
+                            token = f"Bearer {access_token}"
+                            self._token_state = (token, time.monotonic())
                             # 只在首次获取时打印日志
                             if is_first:
                                 logger.info("🔑 Token 获取成功")
-                            return self._token
+                            return token
                 except Exception:
                     if attempt < 2:
                         time.sleep(1)
             
             logger.warning("⚠ 使用备用 Token")
-            return f"Bearer {self.config.token}" if self.config.token else ""
+            return self._fallback_token
+
+
+class ZipStreamVerifier:
+    """
+    ZIP 流式校验器：下载过程中按顺序解析本地文件头，边接收边计算每个成员的 CRC32，
+    下载完成后无需再次读取整个文件即可确认成员数据完整。
+    
+    遇到加密、非 stored/deflate 压缩、无大小信息的 stored 成员等情况时放弃流式校验
+    （result() 返回 None），由调用方回退到 testzip()。
+    """
+    
+    _LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+    _LOCAL_SIG = b'PK\x03\x04'
+    _CENTRAL_SIG = b'PK\x01\x02'
+    _DESCRIPTOR_SIG = b'PK\x07\x08'
+    
+    def __init__(self):
+        self._buf = bytearray()
+        self._entry: Optional[dict] = None
+        self._done = False  # 已到达中央目录
+        self._unsupported = False
+        self.bad_member: Optional[str] = None
+        self.crcs: Dict[str, int] = {}  # 成员名 -> 实际数据 CRC32
+    
+    def feed(self, chunk: bytes):
+        """输入下一段下载数据"""
+        if not self.active:
+            return
+        self._buf += chunk
+        try:
+            self._process()
+        except (zlib.error, struct.error, ValueError):
+            self.bad_member = self._entry['name'] if self._entry else "<header>"
+    
+    @property
+    def active(self) -> bool:
+        """是否仍需要继续输入数据"""
+        return not (self._done or self._unsupported or self.bad_member is not None)
+    
+    def result(self) -> Optional[bool]:
+        """True: 所有成员 CRC 正确；False: 发现损坏；None: 无法流式校验"""
+        if self.bad_member is not None:
+            return False
+        if self._unsupported or not self._done:
+            return None
+        return True
+    
+    def _process(self):
+        while not self._done and not self._unsupported and self.bad_member is None:
+            if self._entry is None:
+                if not self._read_header():
+                    return
+            elif not self._read_data():
+                return
+    
+    def _read_header(self) -> bool:
+        if len(self._buf) < 4:
+            return False
+        sig = bytes(self._buf[:4])
+        if sig == self._CENTRAL_SIG:
+            self._done = True
+            return False
+        if sig != self._LOCAL_SIG:
+            self._unsupported = True
+            return False
+        if len(self._buf) < self._LOCAL_HEADER.size:
+            return False
+        (_, _, flags, method, _, _, crc, csize, usize,
+         name_len, extra_len) = self._LOCAL_HEADER.unpack_from(self._buf)
+        header_len = self._LOCAL_HEADER.size + name_len + extra_len
+        if len(self._buf) < header_len:
+            return False
+        
+        name = bytes(self._buf[30:30 + name_len]).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = bytes(self._buf[30 + name_len:header_len])
+        del self._buf[:header_len]
+        
+        zip64 = False
+        pos = 0
+        while pos + 4 <= len(extra):
+            tag, size = struct.unpack_from('<HH', extra, pos)
+            if tag == 0x0001:
+                zip64 = True
+                fields = extra[pos + 4:pos + 4 + size]
+                offset = 0
+                if usize == 0xFFFFFFFF and offset + 8 <= len(fields):
+                    usize = struct.unpack_from('<Q', fields, offset)[0]
+                    offset += 8
+                if csize == 0xFFFFFFFF and offset + 8 <= len(fields):
+                    csize = struct.unpack_from('<Q', fields, offset)[0]
+            pos += 4 + size
+        
+        has_descriptor = bool(flags & 0x08)
+        if flags & 0x01 or method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED) \
+                or (has_descriptor and method == zipfile.ZIP_STORED):
+            self._unsupported = True
+            return False
+        
+        self._entry = {
+            'name': name,
+            'crc': crc,
+            'expected_crc': None if has_descriptor else crc,
+            'remaining': None if has_descriptor else csize,
+            'descriptor': has_descriptor,
+            'zip64': zip64,
+            'running': 0,
+            'decomp': zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None,
+        }
+        return True
+    
+    def _read_data(self) -> bool:
+        entry = self._entry
+        
+        if entry['remaining'] is not None:
+            # 已知压缩大小：消费精确的字节数
+            if entry['remaining'] > 0:
+                if not self._buf:
+                    return False
+                take = min(entry['remaining'], len(self._buf))
+                data = bytes(self._buf[:take])
+                del self._buf[:take]
+                entry['remaining'] -= take
+                if entry['decomp'] is not None:
+                    data = entry['decomp'].decompress(data)
+                entry['running'] = zlib.crc32(data, entry['running'])
+                if entry['remaining'] > 0:
+                    return False
+            if entry['decomp'] is not None:
+                entry['running'] = zlib.crc32(entry['decomp'].flush(), entry['running'])
+            return self._finish_entry()
+        
+        # 带数据描述符的 deflate 成员：依靠解压器识别数据流结束
+        decomp = entry['decomp']
+        if not decomp.eof:
+            if not self._buf:
+                return False
+            data = decomp.decompress(bytes(self._buf))
+            self._buf.clear()
+            entry['running'] = zlib.crc32(data, entry['running'])
+            if not decomp.eof:
+                return False
+            self._buf[:0] = decomp.unused_data
+        
+        # 解析数据描述符（签名可选）
+        size_len = 8 if entry['zip64'] else 4
+        need = 4 + 2 * size_len
+        if len(self._buf) >= 4 and bytes(self._buf[:4]) == self._DESCRIPTOR_SIG:
+            need += 4
+        if len(self._buf) < need:
+            return False
+        offset = need - (4 + 2 * size_len)
+        entry['expected_crc'] = struct.unpack_from('<I', self._buf, offset)[0]
+        del self._buf[:need]
+        return self._finish_entry()
+    
+    def _finish_entry(self) -> bool:
+        entry = self._entry
+        if entry['running'] != entry['expected_crc']:
+            self.bad_member = entry['name']
+            return False
+        self.crcs[entry['name']] = entry['running']
+        self._entry = None
+        return True
+
+
+class BodyChecksum:
+    """
+    响应体校验和：服务器在完整响应（200）中提供 Content-MD5 或 x-amz-checksum-crc32 时，
+    边下载边计算，下载完成后与响应头比对；一致则说明本地文件与服务器文件逐字节相同。
+    """
+    
+    def __init__(self, md5_b64: Optional[str] = None, crc32_b64: Optional[str] = None):
+        self._md5_b64 = md5_b64
+        self._crc32_b64 = crc32_b64
+        self._md5 = hashlib.md5() if md5_b64 else None
+        self._crc = 0
+    
+    @classmethod
+    def from_headers(cls, headers) -> Optional['BodyChecksum']:
+        """根据响应头创建，响应未提供校验和时返回 None"""
+        md5_b64 = headers.get('content-md5')
+        crc32_b64 = headers.get('x-amz-checksum-crc32')
+        if not md5_b64 and not crc32_b64:
+            return None
+        return cls(md5_b64=md5_b64, crc32_b64=crc32_b64)
+    
+    def update(self, chunk: bytes):
+        if self._md5 is not None:
+            self._md5.update(chunk)
+        elif self._crc32_b64:
+            self._crc = zlib.crc32(chunk, self._crc)
+    
+    def matches(self) -> bool:
+        if self._md5 is not None:
+            return base64.b64encode(self._md5.digest()).decode() == self._md5_b64
+        return base64.b64encode(struct.pack('>I', self._crc)).decode() == self._crc32_b64
 
 
 class Downloader:
@@ -98,50 +480,176 @@ class Downloader:
     def __init__(self, config: DataWeaveConfig = None):
         self.config = config or get_config().dataweave
         self.token_manager = TokenManager(self.config)
+        # 所有 API 请求和下载共用一个会话；连接池覆盖 下载并发数 × 分段数
+        pool_size = max(10, get_config().download_workers * max(1, self.config.segment_count))
+        self._session = create_http_session(pool_size)
+        # 预取的下载 URL: 文件名 -> ((url, found_path) 或 None 表示不存在, 获取时间)
+        self._prefetched_urls: Dict[str, Tuple[Optional[Tuple[str, str]], float]] = {}
+        # 各路径模板对应的路径名（模板倒数第二段），避免在查询循环中重复切分
+        self._template_pathnames = [t.split("/")[-2] for t in self.config.path_templates]
+        self._prefetch_lock = threading.Lock()
+        # ZIP 成员 CRC 校验线程池（zlib 解压和文件读取会释放 GIL），在所有下载任务间共享
+        # 已通过完整校验的文件: 绝对路径 -> [mtime_ns, size, inode]，文件未变化时跳过重复校验
+        self._verify_cache_path = Path(get_config().local_temp_dir) / VERIFY_CACHE_FILE
+        self._verify_cache: Dict[str, List[int]] = self._load_verify_cache()
+        self._verify_cache_lock = threading.Lock()
+        # 内存缓存是否有未写回的记录，及上次写回时间；写文件由单独的锁串行，不阻塞校验线程
+        self._verify_cache_dirty = False
+        self._verify_cache_saved = time.monotonic()
+        self._verify_cache_save_lock = threading.Lock()
+        # 未通过校验的文件（仅内存）: 绝对路径 -> [mtime_ns, size, inode]，文件未变化时直接判定无效
+        self._invalid_zips: Dict[str, List[int]] = {}
+        self._verify_workers = os.cpu_count() or 4
+        self._verify_executor = ThreadPoolExecutor(max_workers=self._verify_workers,
+                                                   thread_name_prefix="zip-verify")
+    
+    def _load_verify_cache(self) -> Dict[str, List[int]]:
+        """加载 ZIP 校验结果缓存"""
+        try:
+            with open(self._verify_cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def _record_verified(self, zip_path: Path, st: os.stat_result = None):
+        """记录文件已通过校验，缓存文件按间隔批量写回"""
+        st = st or zip_path.stat()
+        with self._verify_cache_lock:
+            self._verify_cache[str(zip_path.resolve())] = [st.st_mtime_ns, st.st_size, st.st_ino]
+            self._verify_cache_dirty = True
+            due = time.monotonic() - self._verify_cache_saved >= VERIFY_CACHE_FLUSH_INTERVAL
+        if due:
+            self.flush_verify_cache()
+    
+    def flush_verify_cache(self):
+        """把未写回的校验记录写入缓存文件，同时清除已不存在的文件的记录"""
+        with self._verify_cache_save_lock:
+            with self._verify_cache_lock:
+                if not self._verify_cache_dirty:
+                    return
+                self._verify_cache_dirty = False
+                self._verify_cache_saved = time.monotonic()
+                snapshot = dict(self._verify_cache)
+            
+            # 在锁外检查文件是否存在，不阻塞校验线程
+            missing = [key for key in snapshot if not os.path.exists(key)]
+            if missing:
+                with self._verify_cache_lock:
+                    for key in missing:
+                        self._verify_cache.pop(key, None)
+                        del snapshot[key]
+            try:
+                self._verify_cache_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self._verify_cache_path.with_name(VERIFY_CACHE_FILE + ".tmp")
+                tmp.write_text(json.dumps(snapshot), encoding='utf-8')
+                os.replace(tmp, self._verify_cache_path)
+            except OSError as e:
+                logger.debug(f"校验缓存保存失败: {e}")
+    
+    def _forget_verified(self, zip_path: Path):
+        """文件被删除或替换前清除其校验缓存"""
+        key = str(zip_path.resolve())
+        with self._verify_cache_lock:
+            self._verify_cache.pop(key, None)
+            self._invalid_zips.pop(key, None)
+    
+    def _find_bad_member(self, zf: zipfile.ZipFile) -> Optional[str]:
+        """
+        按偏移分组并行校验已打开 ZIP 的所有成员 CRC，返回发现的损坏成员名称，全部正确返回 None
+        直接复用 zf 已解析的中央目录，不再重复打开文件
+        """
+        zip_path = Path(zf.filename)
+        infos = [info for info in zf.infolist() if not info.is_dir()]
+        groups = split_zip_members(infos, self._verify_workers)
+        if len(groups) <= 1:
+            return first_bad_zip_member(zip_path, infos)
+        
+        futures = [self._verify_executor.submit(first_bad_zip_member, zip_path, group)
+                   for group in groups]
+        for future in as_completed(futures):
+            bad = future.result()
+            if bad is not None:
+                # 发现损坏后取消尚未开始的校验
+                for f in futures:
+                    f.cancel()
+                return bad
+        return None
     
     def is_valid_zip(self, zip_path: Path) -> bool:
-        """检查 ZIP 文件是否有效（验证完整性）"""
-        if not zip_path.exists() or zip_path.stat().st_size == 0:
+        """检查 ZIP 文件是否有效（验证完整性，文件未变化时直接使用上次的校验结果）"""
+        st = _safe_stat(zip_path)
+        if st is None or st.st_size == 0:
+            return False
+        key = str(zip_path.resolve())
+        signature = [st.st_mtime_ns, st.st_size, st.st_ino]
+        if self._verify_cache.get(key) == signature:
+            return True
+        if self._invalid_zips.get(key) == signature:
             return False
         try:
+            # 检查所有成员的 CRC
             with zipfile.ZipFile(zip_path, 'r') as zf:
-                # 测试 ZIP 文件完整性（检查 CRC）
-                bad_file = zf.testzip()
-                return bad_file is None
+                valid = self._find_bad_member(zf) is None
         except (zipfile.BadZipFile, OSError, IOError):
+            valid = False
+        if not valid:
+            with self._verify_cache_lock:
+                self._invalid_zips[key] = signature
             return False
+        self._record_verified(zip_path, st)
+        return True
     
     def _verify_zip_integrity(self, zip_path: Path) -> bool:
         """
         验证 ZIP 文件完整性
-        检查 ZIP 文件结构是否完整（End-of-central-directory 签名）
+        检查 ZIP 文件结构是否完整（End-of-central-directory 签名）及所有成员的 CRC
         """
         try:
             with zipfile.ZipFile(zip_path, 'r') as zf:
-                # testzip() 会检查所有文件的 CRC
-                # 返回第一个损坏文件的名称，如果没有损坏则返回 None
-                bad_file = zf.testzip()
-                if bad_file is not None:
-                    logger.warning(f"ZIP 文件中存在损坏的文件: {bad_file}")
-                    return False
-                return True
+                bad_file = self._find_bad_member(zf)
+            if bad_file is not None:
+                logger.warning(f"ZIP 文件中存在损坏的文件: {bad_file}")
+                return False
+            return True
+        except zipfile.BadZipFile as e:
+            logger.warning(f"无效的 ZIP 文件: {e}")
+            return False
+        except Exception as e:
+            logger.warning(f"ZIP 验证异常: {e}")
+            return False
+    
+    def _verify_zip_directory(self, zip_path: Path, crcs: Dict[str, int]) -> bool:
+        """
+        用流式校验得到的成员 CRC 核对中央目录（只读取目录，不重新读取成员数据）
+        """
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zf:
+                infos = zf.infolist()
         except zipfile.BadZipFile as e:
             logger.warning(f"无效的 ZIP 文件: {e}")
             return False
         except Exception as e:
             logger.warning(f"ZIP 验证异常: {e}")
             return False
+        
+        if len(infos) != len(crcs):
+            logger.warning(f"ZIP 中央目录成员数不一致: 目录 {len(infos)}, 数据 {len(crcs)}")
+            return False
+        for info in infos:
+            if crcs.get(info.filename) != info.CRC:
+                logger.warning(f"ZIP 文件中存在损坏的文件: {info.filename}")
+                return False
+        return True
     
     def get_download_url(self, filename: str, headers: Dict[str, str]) -> Optional[Tuple[str, str]]:
         """获取文件的下载 URL，返回 (url, found_path)"""
-        for i, template in enumerate(self.config.path_templates):
+        for template, path_name in zip(self.config.path_templates, self._template_pathnames):
             dw_path = template.format(filename=filename)
             payload = {"uris": [dw_path]}
-            path_name = template.split("/")[-2]
             
             try:
-                r = requests.post(self.config.api_url, json=payload, headers=headers, timeout=8)
-                data = r.json()
+                r = self._session.post(self.config.api_url, data=_json_dumps(payload), headers=headers, timeout=8)
+                data = _json_loads(r.content)
                 
                 if data.get("code") != 0:
                     msg = data.get("msg", "")
@@ -165,6 +673,106 @@ class Downloader:
         
         return None
     
+    def get_download_urls(self, filenames: List[str],
+                          headers: Dict[str, str]) -> Optional[Dict[str, Optional[Tuple[str, str]]]]:
+        """
+        批量获取下载 URL：一次请求查询所有 (文件名 × 路径模板) 组合
+        
+        Returns:
+            {filename: (url, found_path) 或 None(所有路径都不存在)}；
+            请求失败或响应无法与请求对应时返回 None，由调用方逐个查询
+        """
+        uris = []
+        owners = []  # 与 uris 对齐: (filename, path_name)
+        for filename in filenames:
+            for template, path_name in zip(self.config.path_templates, self._template_pathnames):
+                uris.append(template.format(filename=filename))
+                owners.append((filename, path_name))
+        
+        found: Dict[str, Tuple[str, str]] = {}
+        for start in range(0, len(uris), URL_BATCH_SIZE):
+            batch_uris = uris[start:start + URL_BATCH_SIZE]
+            batch_owners = owners[start:start + URL_BATCH_SIZE]
+            try:
+                r = self._session.post(self.config.api_url, data=_json_dumps({"uris": batch_uris}),
+                                       headers=headers, timeout=30)
+                data = _json_loads(r.content)
+            except Exception as e:
+                logger.debug(f"批量查询下载 URL 失败: {type(e).__name__}")
+                return None
+            
+            if data.get("code") != 0:
+                # 可能是部分 URI 不存在导致整批失败，交给逐个查询处理
+                return None
+            
+            url_data = data.get("data", {})
+            urls_list = url_data.get("urls") if isinstance(url_data, dict) else None
+            if not isinstance(urls_list, list):
+                return None
+            
+            by_uri = {item.get("uri"): item.get("url") for item in urls_list
+                      if isinstance(item, dict) and item.get("uri")}
+            if not by_uri:
+                # 响应不带 uri 字段时只能按位置对应
+                if len(urls_list) != len(batch_uris):
+                    return None
+                by_uri = {uri: item.get("url") if isinstance(item, dict) else None
+                          for uri, item in zip(batch_uris, urls_list)}
+            
+            # 按模板优先级保留每个文件第一个命中的路径
+            for uri, (filename, path_name) in zip(batch_uris, batch_owners):
+                url = by_uri.get(uri)
+                if url and filename not in found:
+                    found[filename] = (url, path_name)
+        
+        return {filename: found.get(filename) for filename in filenames}
+    
+    def prefetch_download_urls(self, filenames: List[str]) -> int:
+        """
+        为一批文件预取下载 URL（包含所有候选文件名），供后续 download_file 直接使用
+        
+        Returns:
+            找到 URL 的候选文件名数量
+        """
+        from .utils import get_zip_name_candidates
+        
+        # dict 保持顺序并去重
+        candidates = list(dict.fromkeys(
+            candidate
+            for filename in filenames
+            for candidate in get_zip_name_candidates(filename.replace('.zip', ''))
+        ))
+        if not candidates:
+            return 0
+        
+        headers = {**JSON_HEADERS, "Authorization": self.token_manager.get_token()}
+        results = self.get_download_urls(candidates, headers)
+        if results is None:
+            logger.debug("批量查询下载 URL 不可用，回退到逐个查询")
+            return 0
+        
+        now = time.time()
+        with self._prefetch_lock:
+            for filename, result in results.items():
+                self._prefetched_urls[filename] = (result, now)
+        return sum(1 for result in results.values() if result)
+    
+    def _take_prefetched_url(self, filename: str):
+        """
+        取出预取的下载 URL（只使用一次）
+        
+        Returns:
+            (hit, result)：hit 为 False 表示没有可用的预取结果
+        """
+        with self._prefetch_lock:
+            entry = self._prefetched_urls.pop(filename, None)
+        if entry is None:
+            return False, None
+        result, fetched_at = entry
+        if time.time() - fetched_at > URL_PREFETCH_TTL:
+            return False, None
+        return True, result
+    
     def download_file(self, filename: str, target_path: Path, 
                       progress_callback=None, resume: bool = True) -> bool:
         """
@@ -190,6 +798,12 @@ class Downloader:
         
         logger.debug(f"生成候选文件名: {candidates}")
         
+        # 未经批量预取时，一次请求查询所有候选文件名 × 路径模板，避免逐个候选往返
+        with self._prefetch_lock:
+            prefetched = any(candidate in self._prefetched_urls for candidate in candidates)
+        if not prefetched and len(candidates) * len(self.config.path_templates) > 1:
+            self.prefetch_download_urls([filename])
+        
         # 尝试每个候选文件名
         for idx, candidate_filename in enumerate(candidates, 1):
             logger.info(f"尝试候选 {idx}/{len(candidates)}: {candidate_filename}")
@@ -225,15 +839,20 @@ class Downloader:
         temp_file = target_path.with_suffix('.zip.tmp')
         
         token = self.token_manager.get_token()
-        headers = {
-            "User-Agent": "Mozilla/5.0",
-            "Content-Type": "application/json",
-            "Authorization": token,
-        }
+        headers = {**JSON_HEADERS, "Authorization": token}
+        
+        # 批量预取过的文件名直接使用结果（None 表示已确认所有路径都不存在）
+        prefetched, prefetched_result = self._take_prefetched_url(filename)
+        if prefetched and prefetched_result is None:
+            logger.debug(f"预取结果: 文件不存在 {filename}")
+            return False
         
         for attempt in range(2):
             try:
-                result = self.get_download_url(filename, headers)
+                if prefetched and attempt == 0:
+                    result = prefetched_result
+                else:
+                    result = self.get_download_url(filename, headers)
                 
                 if result is None:
                     if attempt == 0:
@@ -245,73 +864,62 @@ class Downloader:
                 
                 url, found_path = result
                 
-                # 检查是否可以断点续传
-                downloaded = 0
-                download_headers = {"User-Agent": "Mozilla/5.0"}
-                
-                if resume and temp_file.exists():
-                    downloaded = temp_file.stat().st_size
-                    if downloaded > 0:
-                        download_headers["Range"] = f"bytes={downloaded}-"
+                # 大文件优先使用多段并行下载（Range 请求），不适用时回退到单流下载
+                # 已有单流下载的临时文件时继续单流续传；有分段进度文件时继续分段下载
+                state_file = self._segment_state_file(temp_file)
+                segmented = None
+                if self.config.segment_count > 1 and \
+                        not (resume and temp_file.exists() and not state_file.exists()):
+                    segmented = self._download_segmented(url, temp_file, progress_callback, resume)
                 
-                with requests.get(url, headers=download_headers, stream=True, timeout=(15, 60)) as r:
-                    # 检查服务器是否支持断点续传
-                    if r.status_code == 416:  # Range Not Satisfiable
-                        # 本地临时文件异常（可能大于服务器文件），删除重新下载
-                        logger.warning(f"本地临时文件异常，重新下载: {filename}")
+                checksum_ok = False
+                if segmented is not None:
+                    total_size, verifier = segmented
+                else:
+                    if state_file.exists():
+                        # 预分配的分段临时文件不能用于单流续传
+                        state_file.unlink()
                         if temp_file.exists():
                             temp_file.unlink()
-                        downloaded = 0
-                        download_headers.pop("Range", None)
-                        # 重新发起请求
-                        r.close()
-                        r = requests.get(url, headers=download_headers, stream=True, timeout=(15, 60))
-                        r.raise_for_status()
-                        total_size = int(r.headers.get('content-length', 0))
-                        mode = 'wb'
-                    elif r.status_code == 206:  # Partial Content
-                        # 服务器支持断点续传
-                        content_range = r.headers.get('content-range', '')
-                        if content_range:
-                            # 格式: bytes start-end/total
-                            total_size = int(content_range.split('/')[-1])
-                        else:
-                            total_size = downloaded + int(r.headers.get('content-length', 0))
-                        mode = 'ab'  # 追加模式
-                    elif r.status_code == 200:
-                        # 服务器不支持断点续传，从头开始
-                        total_size = int(r.headers.get('content-length', 0))
-                        downloaded = 0
-                        mode = 'wb'  # 覆盖模式
-                    else:
-                        r.raise_for_status()
+                    streamed = self._download_stream(url, temp_file, filename, progress_callback, resume)
+                    if streamed is None:
                         return False
-                    
-                    with open(temp_file, mode) as f:
-                        for chunk in r.iter_content(chunk_size=65536):
-                            if chunk:
-                                f.write(chunk)
-                                downloaded += len(chunk)
-                                if progress_callback:
-                                    progress_callback(downloaded, total_size)
+                    total_size, verifier, checksum_ok = streamed
                 
                 # 验证完整性 - 第一步：检查文件大小
                 if total_size > 0:
-                    actual_size = temp_file.stat().st_size
+                    st = _safe_stat(temp_file)
+                    actual_size = st.st_size if st is not None else 0
                     if actual_size != total_size:
                         logger.warning(f"下载不完整: 预期 {total_size}, 实际 {actual_size} - {filename}")
                         # 不删除临时文件，下次可以继续
                         continue
                 
-                # 验证完整性 - 第二步：检查 ZIP 文件结构
-                if not self._verify_zip_integrity(temp_file):
+                # 验证完整性 - 第二步：检查 ZIP 文件结构和成员 CRC
+                stream_result = verifier.result() if verifier is not None else None
+                if stream_result is True:
+                    zip_ok = self._verify_zip_directory(temp_file, verifier.crcs)
+                elif stream_result is False:
+                    logger.warning(f"ZIP 文件中存在损坏的文件: {verifier.bad_member}")
+                    zip_ok = False
+                elif checksum_ok:
+                    # 响应体校验和与服务器一致，无需再读取整个文件校验
+                    logger.debug(f"响应校验和一致，跳过 ZIP 校验 - {filename}")
+                    zip_ok = True
+                else:
+                    zip_ok = self._verify_zip_integrity(temp_file)
+                
+                if not zip_ok:
                     logger.warning(f"ZIP 文件损坏，删除临时文件重新下载 - {filename}")
                     temp_file.unlink()
                     continue
                 
+                self._forget_verified(target_path)
                 if target_path.exists():
                     target_path.unlink()
                 temp_file.rename(target_path)
+                # 刚完成校验，记录结果供后续跳过检查使用
+                self._record_verified(target_path)
                 return True
                 
             except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
@@ -328,27 +936,256 @@ class Downloader:
         
         return False
     
-    def download_batch(self, files: List[Tuple[str, Path]], 
-                       skip_existing: bool = True,
-                       server_exists: Set[str] = None) -> Dict[str, bool]:
-        """批量下载文件（串行）"""
-        results = {}
-        server_exists = server_exists or set()
+    def _download_stream(self, url: str, temp_file: Path, filename: str,
+                         progress_callback=None, resume: bool = True
+                         ) -> Optional[Tuple[int, Optional[ZipStreamVerifier], bool]]:
+        """
+        单连接流式下载到临时文件（支持断点续传）
+        
+        Returns:
+            (total_size, verifier, checksum_ok)，服务器返回非预期状态时返回 None；
+            checksum_ok 表示完整响应的 Content-MD5 / x-amz-checksum-crc32 与下载内容一致
+        """
+        # 检查是否可以断点续传
+        downloaded = 0
+        download_headers = {"User-Agent": "Mozilla/5.0"}
         
-        for filename, target_path in files:
-            stem = filename.replace('.zip', '')
+        st = _safe_stat(temp_file) if resume else None
+        if st is not None:
+            downloaded = st.st_size
+            if downloaded > 0:
+                download_headers["Range"] = f"bytes={downloaded}-"
+        
+        with self._session.get(url, headers=download_headers, stream=True, timeout=(15, 60)) as r:
+            # 检查服务器是否支持断点续传
+            if r.status_code == 416:  # Range Not Satisfiable
+                # 本地临时文件异常（可能大于服务器文件），删除重新下载
+                logger.warning(f"本地临时文件异常，重新下载: {filename}")
+                if temp_file.exists():
+                    temp_file.unlink()
+                downloaded = 0
+                download_headers.pop("Range", None)
+                # 重新发起请求
+                r.close()
+                r = self._session.get(url, headers=download_headers, stream=True, timeout=(15, 60))
+                r.raise_for_status()
+                total_size = int(r.headers.get('content-length', 0))
+                mode = 'wb'
+            elif r.status_code == 206:  # Partial Content
+                # 服务器支持断点续传
+                content_range = r.headers.get('content-range', '')
+                if content_range:
+                    # 格式: bytes start-end/total
+                    total_size = int(content_range.split('/')[-1])
+                else:
+                    total_size = downloaded + int(r.headers.get('content-length', 0))
+                mode = 'ab'  # 追加模式
+            elif r.status_code == 200:
+                # 服务器不支持断点续传，从头开始
+                total_size = int(r.headers.get('content-length', 0))
+                downloaded = 0
+                mode = 'wb'  # 覆盖模式
+            else:
+                r.raise_for_status()
+                return None
             
-            # 跳过服务器已存在的
-            if filename in server_exists:
-                results[filename] = True
-                continue
+            # 边写边校验成员 CRC；续传时先用本地已有部分初始化校验器，只读取已有数据一次
+            verifier = ZipStreamVerifier()
+            if mode == 'ab':
+                with open(temp_file, 'rb') as f:
+                    while verifier.active:
+                        chunk = f.read(DOWNLOAD_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        verifier.feed(chunk)
             
-            # 跳过本地已存在的
-            if skip_existing and self.is_valid_zip(target_path):
-                results[filename] = True
-                continue
+            # 响应头中的校验和针对完整文件，只在从头下载时使用
+            checksum = BodyChecksum.from_headers(r.headers) if mode == 'wb' else None
+            
+            with open(temp_file, mode) as f:
+                # 已知总大小时预留剩余部分的磁盘空间（不改变文件大小）
+                if total_size > downloaded:
+                    preallocate_file(f.fileno(), downloaded, total_size - downloaded)
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        if verifier is not None:
+                            verifier.feed(chunk)
+                        if checksum is not None:
+                            checksum.update(chunk)
+                        downloaded += len(chunk)
+                        if progress_callback:
+                            progress_callback(downloaded, total_size)
+        
+        return total_size, verifier, checksum is not None and checksum.matches()
+    
+    @staticmethod
+    def _segment_state_file(temp_file: Path) -> Path:
+        """多段下载的进度文件（记录每段已写入的字节数）"""
+        return temp_file.with_name(temp_file.name + ".segments")
+    
+    def _download_segmented(self, url: str, temp_file: Path,
+                            progress_callback=None, resume: bool = True
+                            ) -> Optional[Tuple[int, Optional[ZipStreamVerifier]]]:
+        """
+        多段并行下载：每段一个 Range 请求，用 os.pwrite 直接写入预分配临时文件的对应偏移
+        
+        各段进度记录在 .segments 文件中，中断后可分段续传；无需合并步骤。
+        分段乱序到达，无法流式校验，verifier 为 None（由调用方读取文件校验）。
+        
+        Returns:
+            (total_size, None)；服务器不支持 Range 或文件较小时返回 None（由调用方单流下载）
+        """
+        if not hasattr(os, 'pwrite'):
+            return None
+        
+        # 探测文件大小及 Range 支持（预签名 URL 通常不允许 HEAD，用 1 字节 GET 代替）
+        with self._session.get(url, headers={"User-Agent": "Mozilla/5.0", "Range": "bytes=0-0"},
+                          stream=True, timeout=(15, 60)) as r:
+            if r.status_code != 206:
+                return None
+            content_range = r.headers.get('content-range', '')
+            if '/' not in content_range or content_range.endswith('/*'):
+                return None
+            total_size = int(content_range.split('/')[-1])
+        
+        if total_size < self.config.segment_min_size:
+            return None
+        
+        segment_count = self.config.segment_count
+        segment_size = -(-total_size // segment_count)
+        ranges = [(start, min(start + segment_size, total_size) - 1)
+                  for start in range(0, total_size, segment_size)]
+        state_file = self._segment_state_file(temp_file)
+        
+        # 读取上次的分段进度（文件大小和分段方式一致才续传）
+        progress: Dict[int, int] = {}
+        if resume and state_file.exists() and temp_file.exists():
+            try:
+                state = json.loads(state_file.read_text())
+                if state.get('total') == total_size and state.get('ranges') == [list(r) for r in ranges]:
+                    progress = {int(k): v for k, v in state['done'].items()}
+            except (ValueError, KeyError, OSError):
+                progress = {}
+        if not progress:
+            # 预分配（稀疏）临时文件，各段按偏移写入
+            with open(temp_file, 'wb') as f:
+                f.truncate(total_size)
+        
+        # 各段只更新 progress 中自己的键（预先建好，迭代时字典大小不变），下载过程中无需加锁；
+        # 锁只用于串行化进度文件写入
+        for start, _ in ranges:
+            progress.setdefault(start, 0)
+        save_lock = threading.Lock()
+        # 每段各自累计未保存字节数，合计约每 SEGMENT_STATE_SAVE_INTERVAL 字节保存一次
+        save_interval = max(DOWNLOAD_CHUNK_SIZE, SEGMENT_STATE_SAVE_INTERVAL // len(ranges))
+        last_report = [0.0]
+        
+        def save_state():
+            tmp = state_file.with_name(state_file.name + ".tmp")
+            tmp.write_text(json.dumps({
+                'total': total_size,
+                'ranges': [list(r) for r in ranges],
+                'done': {str(k): v for k, v in progress.items()},
+            }))
+            os.replace(tmp, state_file)
+        
+        save_state()
+        fd = os.open(temp_file, os.O_WRONLY)
+        
+        def fetch(start: int, end: int):
+            length = end - start + 1
+            have = progress.get(start, 0)
+            if have >= length:
+                return
             
-            success = self.download_file(filename, target_path)
-            results[filename] = success
+            unsaved = 0
+            headers = {"User-Agent": "Mozilla/5.0", "Range": f"bytes={start + have}-{end}"}
+            with self._session.get(url, headers=headers, stream=True, timeout=(15, 60)) as r:
+                if r.status_code != 206:
+                    r.raise_for_status()
+                    raise IOError(f"分段请求未返回 206: {r.status_code}")
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    view = memoryview(chunk)
+                    while view:
+                        written = os.pwrite(fd, view, start + have)
+                        have += written
+                        view = view[written:]
+                    progress[start] = have
+                    unsaved += len(chunk)
+                    if unsaved >= save_interval:
+                        with save_lock:
+                            save_state()
+                        unsaved = 0
+                    if progress_callback:
+                        now = time.monotonic()
+                        if now - last_report[0] >= SEGMENT_PROGRESS_INTERVAL:
+                            last_report[0] = now
+                            progress_callback(sum(progress.values()), total_size)
+            
+            # 连接提前关闭时响应正常结束但数据不足；临时文件已按总大小预分配，大小检查无法发现，
+            # 在此报错，已写入的部分记录在进度文件中，续传时只重新请求该段剩余部分
+            if have < length:
+                raise IOError(f"分段数据不完整: bytes={start}-{end} 仅收到 {have}/{length} 字节")
+        
+        try:
+            with ThreadPoolExecutor(max_workers=segment_count, thread_name_prefix="segment") as executor:
+                futures = [executor.submit(fetch, start, end) for start, end in ranges]
+                for future in futures:
+                    future.result()  # 任一分段失败则抛出，保留进度文件用于续传
+        finally:
+            os.close(fd)
+            with save_lock:
+                save_state()
+        
+        if progress_callback:
+            progress_callback(total_size, total_size)
+        state_file.unlink()
+        return total_size, None
+    
+    def download_batch(self, files: List[Tuple[str, Path]], 
+                       skip_existing: bool = True,
+                       server_exists: Set[str] = None,
+                       workers: int = None) -> Dict[str, bool]:
+        """
+        批量下载文件（线程池并行）
+        
+        Args:
+            files: [(filename, target_path), ...]
+            skip_existing: 是否跳过本地已有的有效 ZIP
+            server_exists: 服务器已存在的文件名，直接视为成功
+            workers: 并发数，默认使用配置中的 download_workers
+        """
+        server_exists = server_exists or set()
+        workers = workers or get_config().download_workers
+        
+        # 跳过服务器已存在的
+        results = {filename: True for filename, _ in files if filename in server_exists}
+        to_fetch = [(filename, target_path) for filename, target_path in files
+                    if filename not in server_exists]
+        
+        # 一次请求预取所有待下载文件的 URL
+        self.prefetch_download_urls([filename for filename, _ in to_fetch])
+        
+        def download_task(item: Tuple[str, Path]) -> bool:
+            filename, target_path = item
+            try:
+                # 跳过本地已存在的
+                if skip_existing and self.is_valid_zip(target_path):
+                    return True
+                return self.download_file(filename, target_path)
+            except Exception as e:
+                logger.error(f"下载异常 {filename}: {e}")
+                return False
+        
+        # 结果与完成顺序无关，异常已在任务内处理，直接按提交顺序收集
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="download") as executor:
+                for (filename, _), success in zip(to_fetch, executor.map(download_task, to_fetch)):
+                    results[filename] = success
+        finally:
+            self.flush_verify_cache()
         
-        return results
+        return {filename: results[filename] for filename, _ in files}
@@ -7,9 +7,12 @@ import time
 import logging
 import subprocess
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 import yaml
 
+from .config import YamlLoader
+
 logger = logging.getLogger(__name__)
 
 
@@ -31,7 +34,7 @@ class NASBackup:
                 return
             
             with open(self.config_path, 'r', encoding='utf-8') as f:
-                self.config = yaml.safe_load(f) or {}
+                self.config = yaml.load(f, Loader=YamlLoader) or {}
             
             # 从环境变量获取密码
             nas_password = os.environ.get('NAS_PASSWORD', '')
@@ -199,12 +202,12 @@ class NASBackup:
         rsync_options = backup_config.get('rsync_options', ['-av', '--progress'])
         retry_count = backup_config.get('retry_count', 2)
         retry_delay = backup_config.get('retry_delay', 5)
+        parallel_shards = max(1, int(backup_config.get('parallel_shards', 1)))
         
-        # 构建rsync命令
-        rsync_cmd = ['rsync'] + rsync_options + [
-            f"{source_dir}/",  # 源目录（末尾加/表示复制目录内容）
-            f"{target_dir}/"   # 目标目录
-        ]
+        # 构建rsync命令（多个分片并行传输）
+        rsync_cmds, cleanup_cmd = self._build_rsync_commands(
+            rsync_options, source_dir, target_dir, parallel_shards
+        )
         
         logger.info(f"📦 备份数据: {data_name}")
         logger.debug(f"  源: {source_dir}")
@@ -213,12 +216,7 @@ class NASBackup:
         # 尝试备份，支持重试
         for attempt in range(retry_count + 1):
             try:
-                result = subprocess.run(
-                    rsync_cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=3600  # 1小时超时
-                )
+                result = self._run_rsync_commands(rsync_cmds, cleanup_cmd, timeout=3600)  # 1小时超时
                 
                 if result.returncode == 0:
                     logger.info(f"✓ 备份成功: {data_name}")
@@ -248,6 +246,63 @@ class NASBackup:
         
         return False, "备份失败"
     
+    @staticmethod
+    def _build_rsync_commands(rsync_options: List[str], source_dir: str,
+                              target_dir: Path, shards: int
+                              ) -> Tuple[List[List[str]], Optional[List[str]]]:
+        """
+        构建 rsync 命令
+        
+        shards > 1 时按顶层条目分成多组，每组一个 rsync 进程并行传输（多条 TCP/SMB 流）；
+        若启用 --delete，另外返回一个只处理顶层目录的收尾命令，删除目标中多余的顶层条目。
+        
+        Returns:
+            (并行执行的命令列表, 收尾命令或 None)
+        """
+        full_cmd = ['rsync'] + rsync_options + [
+            f"{source_dir}/",  # 源目录（末尾加/表示复制目录内容）
+            f"{target_dir}/"   # 目标目录
+        ]
+        if shards <= 1:
+            return [full_cmd], None
+        
+        try:
+            with os.scandir(source_dir) as it:
+                entries = sorted(entry.name for entry in it)
+        except OSError:
+            return [full_cmd], None
+        if len(entries) <= 1:
+            return [full_cmd], None
+        
+        groups = [entries[i::shards] for i in range(min(shards, len(entries)))]
+        cmds = [
+            ['rsync'] + rsync_options + [f"{source_dir}/{name}" for name in group] + [f"{target_dir}/"]
+            for group in groups
+        ]
+        cleanup_cmd = None
+        if '--delete' in rsync_options:
+            # -d --no-recursive 只同步顶层目录本身，配合 --delete 清理顶层多余条目
+            cleanup_cmd = ['rsync'] + rsync_options + ['-d', '--no-recursive',
+                                                      f"{source_dir}/", f"{target_dir}/"]
+        return cmds, cleanup_cmd
+    
+    @staticmethod
+    def _run_rsync_commands(cmds: List[List[str]], cleanup_cmd: Optional[List[str]],
+                            timeout: int) -> subprocess.CompletedProcess:
+        """并行执行各分片 rsync，全部成功后执行收尾命令（如有），返回第一个失败的结果"""
+        def run(cmd):
+            return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        
+        if len(cmds) == 1:
+            results = [run(cmds[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=len(cmds), thread_name_prefix="rsync") as executor:
+                results = list(executor.map(run, cmds))
+        for result in results:
+            if result.returncode != 0:
+                return result
+        return run(cleanup_cmd) if cleanup_cmd else results[0]
+    
     def __enter__(self):
         """上下文管理器入口"""
         if self.is_enabled:
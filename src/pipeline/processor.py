@@ -3,13 +3,21 @@
 负责在远程服务器上解压 ZIP、替换 JSON、检查质量
 """
 import json
+import uuid
+import base64
+import time
+import shlex
+import hashlib
+import functools
 import logging
+import threading
 from pathlib import Path
+from types import MappingProxyType
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
 from .config import get_config, PipelineConfig
-from .ssh_client import SSHClient
+from .ssh_client import SSHClient, shell_join
 
 logger = logging.getLogger(__name__)
 
@@ -17,80 +25,223 @@ logger = logging.getLogger(__name__)
 REMOTE_WORKER_SCRIPT = "/tmp/zip_worker.py"
 REMOTE_CHECKER_SCRIPT = "/tmp/annotation_checker.py"
 REMOTE_CHECK_CONFIG = "/tmp/check_config.yaml"
+REMOTE_KEYFRAME_SCRIPT = "/tmp/keyframe_worker.py"
+
+# 解压前因关键帧数超出范围被拒绝时，process_zip 返回的错误信息前缀（无需重试）
+EARLY_REJECT_PREFIX = "early_reject:"
+
+# 远程 ZIP 完整性校验（ZIP 路径经 sys.argv 传入）
+ZIP_VERIFY_CODE = "import sys, zipfile; exit(0 if zipfile.ZipFile(sys.argv[1]).testzip() is None else 1)"
+
+# 检查脚本输出与摘要文件内容之间的分隔行
+CHECK_SUMMARY_MARKER = "===ANNOTAPIPE_SUMMARY==="
+
+# 常驻进程不可用时，不超过此大小的关键帧文件直接读回本地解析（省去启动远程解释器）
+KEYFRAME_LOCAL_PARSE_MAX = 4 * 1024 * 1024
+
+# 服务器状态缓存时间（秒），短时间内重复查询直接返回上次结果
+SERVER_STATE_TTL = 3
+
+# 批量统计关键帧的超时（秒）：基础时间加每个目录的时间，目录越多允许越久
+KEYFRAME_BATCH_TIMEOUT = 60
+KEYFRAME_BATCH_TIMEOUT_PER_DIR = 2
+
+# 关键帧数据的候选位置（相对数据目录，按优先级排序）
+KEYFRAME_SAMPLE_NAMES = [
+    "sample.json",
+    "undistorted/sample.json",
+    "annotations.json",  # JSON-only 模式
+]
+
+# ZIP 内关键帧数据的候选位置（相对数据根目录，按优先级排序）
+ZIP_KEYFRAME_SAMPLE_NAMES = [
+    "sample.json",
+    "undistorted/sample.json",
+]
 
 # 本地脚本目录
 LOCAL_SCRIPTS_DIR = Path(__file__).parent.parent / "remote_scripts"
 
 
+@functools.lru_cache(maxsize=None)
 def _load_script(name: str) -> str:
-    """从 remote_scripts 目录加载脚本内容"""
+    """从 remote_scripts 目录加载脚本内容（进程内只读取一次）"""
     script_path = LOCAL_SCRIPTS_DIR / name
     if script_path.exists():
         return script_path.read_text(encoding='utf-8')
     raise FileNotFoundError(f"脚本文件不存在: {script_path}")
 
 
+@functools.lru_cache(maxsize=None)
+def _load_check_config(path: str) -> Optional[bytes]:
+    """读取检查配置文件内容（进程内只读取一次），文件不存在返回 None"""
+    config_path = Path(path)
+    return config_path.read_bytes() if config_path.exists() else None
+
+
+def _deploy_files(ssh: SSHClient, files: Dict[str, bytes]) -> bool:
+    """
+    上传文件到服务器，远程已有相同内容（SHA256 一致）的文件跳过
+    所有远程文件的校验和通过一次 sha256sum 调用获取；
+    变化的文件先写入临时文件再统一 mv 替换，并发部署或正在运行的脚本不会读到写了一半的文件
+    返回是否全部部署成功（失败时远程仍可能是旧文件）
+    """
+    _, out, _ = ssh.exec_command(f"sha256sum {shell_join(files)} 2>/dev/null")
+    remote_sums = {}
+    for line in out.splitlines():
+        parts = line.split(None, 1)
+        if len(parts) == 2:
+            remote_sums[parts[1]] = parts[0]
+    
+    renames = []
+    tmp_paths = []
+    try:
+        for path, content in files.items():
+            if remote_sums.get(path) != hashlib.sha256(content).hexdigest():
+                # 临时文件名带随机后缀：同一进程内多个连接并发部署也不会写同一个临时文件
+                tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                tmp_paths.append(tmp_path)
+                ssh.write_file(tmp_path, content, compress=True)
+                renames.append(shell_join(["mv", "-f", tmp_path, path]))
+        
+        if not renames:
+            return True
+        status, _, err = ssh.exec_command(" && ".join(renames))
+    except Exception as e:
+        status, err = -1, str(e)
+    
+    if status != 0:
+        # 替换失败：清理残留的临时文件
+        ssh.exec_command(["rm", "-f", *tmp_paths])
+        logger.debug(f"  ✗ 远程文件替换失败: {err.strip()}")
+        return False
+    logger.debug(f"已更新 {len(renames)}/{len(files)} 个远程文件")
+    return True
+
+
+def _check_command(data_dir: str, report_path: str) -> str:
+    """
+    运行检查脚本并在同一调用中输出摘要文件（以 CHECK_SUMMARY_MARKER 分隔）
+    没有摘要文件时（旧版检查脚本）改为输出报告中的问题帧行数，报告本身不传输
+    """
+    summary_path = shlex.quote(report_path + ".summary.json")
+    return shell_join([
+        "python3", REMOTE_CHECKER_SCRIPT,
+        "--data_dir", data_dir,
+        "--config", REMOTE_CHECK_CONFIG,
+        "--report", report_path,
+    ]) + (f" && {{ echo {CHECK_SUMMARY_MARKER}; cat {summary_path} 2>/dev/null"
+          f" || grep -c '^帧:' {shlex.quote(report_path)} || true; }}")
+
+
+def _parse_issue_count(out: str) -> Optional[int]:
+    """
+    从检查命令输出中解析问题帧数，解析失败返回 None
+    优先取脚本输出的最后一行 ISSUES=<n>，其次取分隔行后的摘要 JSON（或问题帧行数）
+    """
+    script_out, _, summary = out.partition(CHECK_SUMMARY_MARKER)
+    last_line = script_out.strip().rsplit("\n", 1)[-1]
+    if last_line.startswith("ISSUES="):
+        try:
+            return int(last_line.split("=", 1)[1])
+        except ValueError:
+            pass
+    try:
+        summary = json.loads(summary)
+        return int(summary["issues"] if isinstance(summary, dict) else summary)
+    except (TypeError, ValueError, KeyError):
+        return None
+
+
 class RemoteProcessor:
     """远程服务器处理器"""
     
-    def __init__(self, ssh: SSHClient, config: PipelineConfig = None):
+    def __init__(self, ssh: SSHClient, config: PipelineConfig = None, scripts_deployed: bool = False):
         self.ssh = ssh
         self.config = config or get_config()
-        self._scripts_deployed = False
+        # 脚本已由其他连接部署到同一服务器时传入 True，不再重复部署
+        self._scripts_deployed = scripts_deployed
+        # 常驻关键帧计数进程 (stdin, stdout)，首次使用时启动
+        self._keyframe_daemon = None
+        self._keyframe_lock = threading.Lock()
+        # 常驻解压进程 (stdin, stdout)，首次解压时启动；启动或执行失败后改用单次调用
+        self._zip_daemon = None
+        self._zip_daemon_disabled = False
+        self._zip_lock = threading.Lock()
+        # 服务器状态缓存 (服务器地址, 过期时间, 状态)
+        self._state_cache: Optional[Tuple[str, float, Dict]] = None
     
-    def deploy_scripts(self):
-        """部署远程处理脚本"""
+    def deploy_scripts(self) -> bool:
+        """部署远程处理脚本，返回是否成功（失败时不记为已部署，下次调用重试）"""
         if self._scripts_deployed:
-            return
+            return True
         
-        # 部署 ZIP 处理脚本
-        self.ssh.write_file(REMOTE_WORKER_SCRIPT, _load_script("zip_worker.py"))
+        files = {
+            # ZIP 处理脚本、检查脚本、关键帧计数脚本
+            REMOTE_WORKER_SCRIPT: _load_script("zip_worker.py").encode(),
+            REMOTE_CHECKER_SCRIPT: _load_script("annotation_checker.py").encode(),
+            REMOTE_KEYFRAME_SCRIPT: _load_script("keyframe_worker.py").encode(),
+        }
         
-        # 部署检查脚本
-        self.ssh.write_file(REMOTE_CHECKER_SCRIPT, _load_script("annotation_checker.py"))
+        # 检查配置原样上传，远程脚本自行解析
+        config_content = _load_check_config(self.config.check_config_path)
+        if config_content is not None:
+            files[REMOTE_CHECK_CONFIG] = config_content
         
-        # 上传检查配置
-        config_path = Path(self.config.check_config_path)
-        if config_path.exists():
-            import yaml
-            with open(config_path, 'r') as f:
-                config_content = yaml.dump(yaml.safe_load(f))
-            self.ssh.write_file(REMOTE_CHECK_CONFIG, config_content)
+        if not _deploy_files(self.ssh, files):
+            logger.error("❌ 远程脚本部署失败")
+            return False
         
         self._scripts_deployed = True
         logger.info("✅ 远程脚本部署完成")
+        return True
+    
+    def invalidate_state(self):
+        """服务器上的文件发生变化后清除状态缓存"""
+        self._state_cache = None
     
     def get_server_state(self) -> Dict:
-        """获取服务器状态"""
+        """获取服务器状态（缓存 SERVER_STATE_TTL 秒）"""
         server = self.ssh.server
+        cached = self._state_cache
+        if cached is not None and cached[0] == server.ip and time.monotonic() < cached[1]:
+            return cached[2]
         
-        # 获取已有的 ZIP 文件
-        zip_files = set()  # 存储标准化的文件名（不带processed_前缀）
-        zip_file_map = {}  # 标准文件名 -> 实际文件名的映射
-        files = self.ssh.list_files(server.zip_dir, "*.zip")
-        for name in files:
-            if name.startswith("processed_"):
-                # 去掉 processed_ 前缀得到标准文件名
-                standard_name = name[len("processed_"):]
-                zip_files.add(standard_name)
+        # ZIP 文件、已处理目录、处理中目录合并为一次远程调用，远程只输出文件名（不含目录前缀）
+        # ZIP 按行输出 "标准文件名<TAB>实际文件名"，processed_ 前缀由 awk 在服务器上去掉
+        list_dirs = "find {} -mindepth 1 -maxdepth 1 -xtype d ! -name '.*' -printf '%f\\n' 2>/dev/null"
+        zips_out, final_out, process_out = self.ssh.exec_batch([
+            f"find {shlex.quote(server.zip_dir)} -mindepth 1 -maxdepth 1 -name '*.zip' ! -name '.*' "
+            f"-printf '%f\\n' 2>/dev/null | "
+            "awk '{ n = $0; sub(/^processed_/, \"\", n); print n \"\\t\" $0 }'",
+            list_dirs.format(shlex.quote(server.final_dir)),
+            list_dirs.format(shlex.quote(server.process_dir)),
+        ])
+        
+        # 标准文件名（不带 processed_ 前缀）-> 实际文件名；两者并存时取 processed_ 文件
+        zip_file_map = {}
+        for line in zips_out.splitlines():
+            standard_name, sep, name = line.partition("\t")
+            if sep and (name != standard_name or standard_name not in zip_file_map):
                 zip_file_map[standard_name] = name
-            else:
-                # 文件名本身就是标准名
-                zip_files.add(name)
-                zip_file_map[name] = name
         
-        # 获取已处理完成的目录（只检查当前 final_dir）
-        processed_dirs = set(self.ssh.list_dirs(server.final_dir))
+        # 状态会被缓存共享，集合使用 frozenset 防止调用方修改（工作线程无锁读取）
+        zip_files = frozenset(zip_file_map)
         
-        # 获取处理中的目录（断点续传支持）
-        processing_dirs = set(self.ssh.list_dirs(server.process_dir))
+        # 已处理完成的目录（只检查当前 final_dir）
+        processed_dirs = frozenset(final_out.splitlines())
         
-        return {
+        # 处理中的目录（断点续传支持）
+        processing_dirs = frozenset(process_out.splitlines())
+        state = {
             "zip_files": zip_files,
-            "zip_file_map": zip_file_map,
+            # 只读视图：状态在多个线程间共享，与 frozenset 一样不允许修改
+            "zip_file_map": MappingProxyType(zip_file_map),
             "processed_dirs": processed_dirs,
             "processing_dirs": processing_dirs,
         }
+        self._state_cache = (server.ip, time.monotonic() + SERVER_STATE_TTL, state)
+        return state
     
     def process_zip(self, zip_path: str, json_path: str, stem: str) -> Tuple[bool, str]:
         """
@@ -106,94 +257,142 @@ class RemoteProcessor:
         
         server = self.ssh.server
         
-        # 上传 JSON 文件
-        remote_json = f"/tmp/{Path(json_path).name}"
-        if not self.ssh.file_exists(remote_json):
-            if not self.ssh.upload_file(json_path, remote_json):
-                return False, "上传 JSON 文件失败"
+        # JSON 内容经 SSH 标准输入直接传给远程命令，不再经 SFTP 中转到 /tmp
+        json_name = Path(json_path).name
+        json_bytes = Path(json_path).read_bytes()
         
-        # 检查是否有 ZIP 文件
-        has_zip = self.ssh.file_exists(zip_path)
+        # 检查是否有 ZIP 文件并验证完整性（一次远程调用，ZIP 不存在时退出码为 2）
+        verify_cmd = (
+            f"[ -e {shlex.quote(zip_path)} ] || exit 2; "
+            + shell_join(["python3", "-c", ZIP_VERIFY_CODE, zip_path])
+        )
+        status, _, err = self.ssh.exec_command(verify_cmd, timeout=30)
+        has_zip = status != 2
         
         if has_zip:
-            # 验证 ZIP 文件完整性
             logger.info(f"[{stem}] 🔍 验证ZIP完整性...")
-            verify_cmd = f"python3 -c \"import zipfile; z=zipfile.ZipFile('{zip_path}'); exit(0 if z.testzip() is None else 1)\""
-            status, _, err = self.ssh.exec_command(verify_cmd, timeout=30)
             if status != 0:
                 logger.error(f"[{stem}] ZIP文件损坏")
                 return False, f"ZIP文件损坏，请重新上传: {err[:100]}"
             
+            # 解压前先直接读取 ZIP 内的关键帧数，超出配置范围的直接拒绝
+            min_kf, max_kf = self.config.min_keyframes, self.config.max_keyframes
+            if min_kf > 0 or max_kf > 0:
+                kf = self.get_keyframe_count_from_zip(zip_path)
+                # 数量未知（读取失败）时不拒绝，解压后再按实际数据检查
+                if kf is not None and ((min_kf > 0 and kf < min_kf) or (max_kf > 0 and kf > max_kf)):
+                    logger.warning(f"[{stem}] ✗ 关键帧数 {kf} 超出范围，跳过解压")
+                    return False, f"{EARLY_REJECT_PREFIX}keyframes={kf}"
+            
             # 有 ZIP 文件：解压并处理
             logger.info(f"[{stem}] 📦 解压ZIP...")
             
-            # 尝试使用tqdm显示进度
-            try:
-                from tqdm import tqdm
-                import threading
-                import sys
-                
-                # 创建不确定进度条
-                pbar = tqdm(desc=f"  解压 {stem[:20]}", bar_format='{desc}: {elapsed}', ncols=60, file=sys.stdout)
-                
-                # 在后台线程中执行解压命令
-                result = [None, None, None]  # [status, out, err]
-                
-                def extract_task():
-                    cmd = (
-                        f"python3 {REMOTE_WORKER_SCRIPT} "
-                        f"--zip '{zip_path}' "
-                        f"--json '{remote_json}' "
-                        f"--out '{server.process_dir}' "
-                        f"--output_name '{stem}' "
-                        f"--rename_json '{self.config.rename_json}'"
-                    )
-                    status, out, err = self.ssh.exec_command(cmd, timeout=300)
-                    result[0], result[1], result[2] = status, out, err
-                
-                thread = threading.Thread(target=extract_task)
-                thread.start()
-                
-                # 等待线程完成，同时更新进度条
-                while thread.is_alive():
-                    pbar.update(0)  # 触发刷新
-                    thread.join(timeout=0.5)
-                
-                pbar.close()
-                status, out, err = result
-                
-            except ImportError:
-                # 如果没有tqdm，直接执行
-                cmd = (
-                    f"python3 {REMOTE_WORKER_SCRIPT} "
-                    f"--zip '{zip_path}' "
-                    f"--json '{remote_json}' "
-                    f"--out '{server.process_dir}' "
-                    f"--output_name '{stem}' "
-                    f"--rename_json '{self.config.rename_json}'"
-                )
-                status, out, err = self.ssh.exec_command(cmd, timeout=300)
+            # 解压命令本身是阻塞调用，直接执行并记录耗时
+            t0 = time.monotonic()
+            status, out, err = self._run_zip_worker(zip_path, json_name, json_bytes, stem)
+            elapsed = time.monotonic() - t0
             
             if status != 0:
                 return False, f"处理脚本失败: {err}"
             
-            logger.info(f"[{stem}] ✓ 解压完成")
+            logger.info(f"[{stem}] ✓ 解压完成 ({elapsed:.1f}s)")
         else:
             # 没有 ZIP 文件：仅处理 JSON
             target_dir = f"{server.process_dir}/{stem}"
-            self.ssh.mkdir_p(target_dir)
             
             # 确定 JSON 文件名
-            json_filename = "annotations.json" if self.config.rename_json else Path(json_path).name
+            json_filename = "annotations.json" if self.config.rename_json else json_name
             target_json = f"{target_dir}/{json_filename}"
             
-            # 复制 JSON 到目标位置
-            status, _, err = self.ssh.exec_command(f"cp '{remote_json}' '{target_json}'")
+            # 创建目录并把标准输入中的 JSON 写到目标位置
+            status, _, err = self.ssh.exec_command_with_stdin(
+                f"{shell_join(['mkdir', '-p', target_dir])} && cat > {shlex.quote(target_json)}", json_bytes
+            )
             if status != 0:
                 return False, f"复制 JSON 失败: {err}"
         
+        self.invalidate_state()
         return True, ""
     
+    def _run_zip_worker(self, zip_path: str, json_name: str,
+                        json_bytes: bytes, stem: str) -> Tuple[int, str, str]:
+        """
+        运行远程解压脚本：优先交给常驻解压进程，不可用时单次调用，JSON 通过标准输入传入（--json -）
+        """
+        server = self.ssh.server
+        result = self._run_zip_daemon({
+            "zip": zip_path,
+            "out": server.process_dir,
+            "output_name": stem,
+            "rename_json": self.config.rename_json,
+            "json_name": json_name,
+            "json_b64": base64.b64encode(json_bytes).decode(),
+        })
+        if result is not None:
+            return result
+        
+        base_cmd = [
+            "python3", REMOTE_WORKER_SCRIPT,
+            "--zip", zip_path,
+            "--out", server.process_dir,
+            "--output_name", stem,
+            "--rename_json", self.config.rename_json,
+        ]
+        return self.ssh.exec_command_with_stdin(
+            base_cmd + ["--json", "-", "--json_name", json_name], json_bytes, timeout=300
+        )
+    
+    def _run_zip_daemon(self, job: Dict) -> Optional[Tuple[int, str, str]]:
+        """
+        把解压任务交给常驻解压进程（省去每个数据的解释器启动）
+        进程被其他线程占用、不可用或输出异常时返回 None，由调用方改用单次调用
+        """
+        if self._zip_daemon_disabled or not self._zip_lock.acquire(blocking=False):
+            return None
+        try:
+            if self._zip_daemon is None:
+                self.deploy_scripts()
+                self._zip_daemon = self.ssh.start_process(
+                    ["python3", REMOTE_WORKER_SCRIPT, "--serve"], timeout=300
+                )
+                if self._zip_daemon is None:
+                    self._zip_daemon_disabled = True
+                    return None
+            
+            stdin, stdout = self._zip_daemon
+            try:
+                stdin.write(json.dumps(job) + "\n")
+                stdin.flush()
+                line = stdout.readline()
+            except Exception as e:
+                # 超时或通道断开：任务可能仍在远程执行，不再重复提交，直接按失败返回
+                logger.debug(f"  ✗ 解压常驻进程失效: {e}")
+                self._close_zip_daemon()
+                return -1, "", str(e) or type(e).__name__
+            try:
+                result = json.loads(line)
+            except ValueError:
+                result = None
+            if not isinstance(result, dict):
+                # 进程已退出（如远程脚本不支持 --serve）或输出异常，之后改用单次调用
+                self._close_zip_daemon()
+                self._zip_daemon_disabled = True
+                return None
+            if result.get("ok"):
+                return 0, f"提取完成: 共 {result.get('extracted', 0)} 个文件", ""
+            return 1, "", result.get("error", "")
+        finally:
+            self._zip_lock.release()
+    
+    def _close_zip_daemon(self):
+        """关闭常驻解压进程的输入，进程处理完当前任务后自行退出"""
+        if self._zip_daemon is not None:
+            try:
+                self._zip_daemon[0].close()
+            except Exception:
+                pass
+            self._zip_daemon = None
+    
     def check_annotations(self, data_dir: str, stem: str) -> Tuple[bool, int, str]:
         """
         检查标注质量
@@ -202,127 +401,202 @@ class RemoteProcessor:
         server = self.ssh.server
         # 报告存放在服务器端 process_dir/reports/ 目录
         reports_dir = f"{server.process_dir}/reports"
-        self.ssh.mkdir_p(reports_dir)
         report_path = f"{reports_dir}/report_{stem}.txt"
         
-        cmd = (
-            f"python3 {REMOTE_CHECKER_SCRIPT} "
-            f"--data_dir '{data_dir}' "
-            f"--config '{REMOTE_CHECK_CONFIG}' "
-            f"--report '{report_path}'"
-        )
+        # 创建报告目录、运行检查脚本、输出摘要合并为一次远程调用
+        # （不传输报告内容，需要时再通过 download_report 下载）
+        cmd = shell_join(["mkdir", "-p", reports_dir]) + " && " + _check_command(data_dir, report_path)
         
         status, out, err = self.ssh.exec_command(cmd, timeout=120)
         
         if status != 0:
             return False, -1, f"检查脚本失败: {err[:200]}"
         
-        # 读取报告判断是否通过
-        report_content = self.ssh.read_file(report_path) or ""
-        issue_count = report_content.count("帧:")
+        issue_count = _parse_issue_count(out)
+        if issue_count is None:
+            return False, -1, f"读取检查结果失败: {err[:200]}"
         
         return issue_count == 0, issue_count, report_path
     
+    def _query_keyframe_daemon(self, query: str) -> Optional[int]:
+        """
+        通过常驻进程统计关键帧，进程不可用时返回 None
+        query 为数据目录，或 "zip\t<ZIP 路径>"
+        """
+        with self._keyframe_lock:
+            if self._keyframe_daemon is None:
+                self.deploy_scripts()
+                self._keyframe_daemon = self.ssh.start_process(
+                    ["python3", REMOTE_KEYFRAME_SCRIPT, "--serve",
+                     "--names", *KEYFRAME_SAMPLE_NAMES, "--zip_names", *ZIP_KEYFRAME_SAMPLE_NAMES]
+                )
+                if self._keyframe_daemon is None:
+                    return None
+            
+            stdin, stdout = self._keyframe_daemon
+            try:
+                stdin.write(query + "\n")
+                stdin.flush()
+                line = stdout.readline().strip()
+            except Exception as e:
+                logger.debug(f"  ✗ 关键帧常驻进程失效: {e}")
+                line = ""
+            if not line.isdigit():
+                # 进程已退出、超时或输出异常，关闭旧进程，下次重新启动
+                self._close_keyframe_daemon()
+                return None
+            return int(line)
+    
+    def _close_keyframe_daemon(self):
+        """关闭常驻关键帧进程的输入，进程读到 EOF 后自行退出（调用方持有 _keyframe_lock）"""
+        if self._keyframe_daemon is not None:
+            try:
+                self._keyframe_daemon[0].close()
+            except Exception:
+                pass
+            self._keyframe_daemon = None
+    
+    def _count_keyframes_locally(self, data_dir: str) -> Optional[int]:
+        """
+        读回第一个存在的候选关键帧文件并在本地计数
+        未找到返回 0；文件过大或读取/解析失败返回 None（由调用方远程计数）
+        """
+        for name in KEYFRAME_SAMPLE_NAMES:
+            path = f"{data_dir}/{name}"
+            size = self.ssh.file_size(path)
+            if size is None:
+                continue
+            if size > KEYFRAME_LOCAL_PARSE_MAX:
+                return None
+            content = self.ssh.read_bytes(path)
+            if content is None:
+                return None
+            try:
+                data = json.loads(content)
+            except ValueError as e:
+                logger.debug(f"  ✗ 解析失败 {path}: {e}")
+                return None
+            return len(data['frames']) if isinstance(data, dict) and 'frames' in data else len(data)
+        return 0
+    
     def get_keyframe_count(self, data_dir: str) -> int:
-        """获取关键帧数量"""
-        # 检查多个可能的 JSON 文件位置
-        sample_paths = [
-            f"{data_dir}/sample.json",
-            f"{data_dir}/undistorted/sample.json",
-            f"{data_dir}/annotations.json",  # JSON-only 模式
-        ]
-        
+        """获取关键帧数量（远程常驻进程流式计数，避免每次启动解释器）"""
         logger.debug(f"🔍 检查关键帧: {data_dir}")
         
-        for sample_path in sample_paths:
-            if self.ssh.file_exists(sample_path):
-                logger.debug(f"  ✓ 找到: {sample_path}")
-                # 尝试多种 JSON 格式
-                cmd = (
-                    f"python3 -c \""
-                    f"import json; "
-                    f"data = json.load(open('{sample_path}')); "
-                    f"print(len(data['frames']) if isinstance(data, dict) and 'frames' in data else len(data))"
-                    f"\""
-                )
-                status, out, err = self.ssh.exec_command(cmd)
-                if status == 0 and out.strip().isdigit():
-                    count = int(out.strip())
-                    logger.debug(f"  ✓ 关键帧数: {count}")
-                    return count
-                else:
-                    logger.debug(f"  ✗ 读取失败 status={status}, out={out.strip()}, err={err.strip()}")
+        count = self._query_keyframe_daemon(data_dir)
+        if count is None:
+            # 常驻进程不可用：小文件读回本地解析
+            count = self._count_keyframes_locally(data_dir)
+        if count is None:
+            # 回退到单次执行
+            cmd = ["python3", REMOTE_KEYFRAME_SCRIPT, "--data_dir", data_dir, "--names", *KEYFRAME_SAMPLE_NAMES]
+            status, out, err = self.ssh.exec_command(cmd)
+            if status == 0 and out.strip().isdigit():
+                count = int(out.strip())
             else:
-                logger.debug(f"  ✗ 不存在: {sample_path}")
+                logger.debug(f"  ✗ 读取失败 status={status}, out={out.strip()}, err={err.strip()}")
+        
+        if count:
+            logger.debug(f"  ✓ 关键帧数: {count}")
+            return count
         
         logger.debug(f"⚠ 未找到关键帧数据: {data_dir}")
         return 0
     
-    def get_keyframe_count_from_zip(self, zip_path: str) -> int:
-        """从ZIP文件中读取关键帧数量（不解压整个ZIP）"""
-        # 创建临时目录
-        temp_dir = f"/tmp/kf_extract_{Path(zip_path).stem}"
-        self.ssh.exec_command(f"rm -rf '{temp_dir}'")
-        self.ssh.mkdir_p(temp_dir)
+    def get_keyframe_counts(self, data_dirs: List[str]) -> Dict[str, int]:
+        """
+        批量获取多个目录的关键帧数量（一次 SSH 调用，远程只启动一次解释器）
         
-        try:
-            # 尝试提取 sample.json 或 undistorted/sample.json
-            sample_paths = ["sample.json", "undistorted/sample.json"]
-            
-            for sample_path in sample_paths:
-                # 尝试从ZIP中提取特定文件
-                extract_cmd = f"unzip -q -j '{zip_path}' '*/{sample_path}' -d '{temp_dir}' 2>/dev/null || true"
-                self.ssh.exec_command(extract_cmd)
-                
-                # 检查是否提取成功
-                extracted_file = f"{temp_dir}/sample.json"
-                if self.ssh.file_exists(extracted_file):
-                    # 读取关键帧数量
-                    cmd = (
-                        f"python3 -c \""
-                        f"import json; "
-                        f"data = json.load(open('{extracted_file}')); "
-                        f"print(len(data['frames']) if isinstance(data, dict) and 'frames' in data else len(data))"
-                        f"\""
-                    )
-                    status, out, _ = self.ssh.exec_command(cmd)
-                    if status == 0 and out.strip().isdigit():
-                        count = int(out.strip())
-                        logger.info(f"从ZIP读取关键帧: {Path(zip_path).name} -> {count} 帧")
-                        return count
-            
-            logger.warning(f"无法从ZIP中提取sample.json: {zip_path}")
-            return 0
-        finally:
-            # 清理临时目录
-            self.ssh.exec_command(f"rm -rf '{temp_dir}'")
+        Returns:
+            {data_dir: 关键帧数}，只包含远程确实返回了数量的目录；
+            调用失败（超时、连接断开等）时缺少的目录由调用方单独检查，不能当作 0
+        """
+        if not data_dirs:
+            return {}
+        
+        cmd = ["python3", REMOTE_KEYFRAME_SCRIPT, "--names", *KEYFRAME_SAMPLE_NAMES, "--data_dirs", *data_dirs]
+        timeout = KEYFRAME_BATCH_TIMEOUT + KEYFRAME_BATCH_TIMEOUT_PER_DIR * len(data_dirs)
+        status, out, err = self.ssh.exec_command(cmd, timeout=timeout)
+        if status != 0:
+            logger.debug(f"  ✗ 批量读取关键帧失败 status={status}, err={err.strip()}")
+        
+        # 失败前已输出的行仍然有效
+        wanted = set(data_dirs)
+        counts = {}
+        for line in out.splitlines():
+            count, _, data_dir = line.partition("\t")
+            if count.isdigit() and data_dir in wanted:
+                counts[data_dir] = int(count)
+        return counts
     
-    def move_to_final(self, stem: str) -> Tuple[bool, str]:
-        """移动到最终目录，并清理原始 ZIP"""
-        server = self.ssh.server
-        src = f"{server.process_dir}/{stem}"
-        dst = f"{server.final_dir}/{stem}"
-        zip_path = f"{server.zip_dir}/{stem}.zip"
+    def get_keyframe_count_from_zip(self, zip_path: str) -> Optional[int]:
+        """
+        从ZIP文件中读取关键帧数量（远程直接读取 ZIP 内的 sample.json，不解压）
+        读取失败返回 None（远程脚本找不到或解析失败时输出 0，同样视为未知）
+        """
+        count = self._query_keyframe_daemon(f"zip\t{zip_path}")
+        if count is None:
+            # 常驻进程不可用，回退到单次执行
+            cmd = ["python3", REMOTE_KEYFRAME_SCRIPT, "--zip", zip_path, "--names", *ZIP_KEYFRAME_SAMPLE_NAMES]
+            status, out, _ = self.ssh.exec_command(cmd)
+            count = int(out.strip()) if status == 0 and out.strip().isdigit() else None
+        if count:
+            logger.info(f"从ZIP读取关键帧: {Path(zip_path).name} -> {count} 帧")
+            return count
         
-        # 检查源目录
-        if not self.ssh.dir_exists(src):
-            return False, "源目录不存在"
+        logger.warning(f"无法从ZIP中提取sample.json: {zip_path}")
+        return None
+    
+    def get_keyframe_counts_from_zips(self, zip_paths: List[str]) -> Dict[str, int]:
+        """
+        批量从多个 ZIP 读取关键帧数量（一次 SSH 调用，远程多进程并行读取）
         
-        # 如果目标目录已存在，直接删除（不备份）
-        if self.ssh.dir_exists(dst):
-            self.ssh.exec_command(f"rm -rf '{dst}'")
+        Returns:
+            {zip_path: 关键帧数}，读取失败的为 0
+        """
+        if not zip_paths:
+            return {}
         
-        # 移动
-        status, _, err = self.ssh.exec_command(f"mv '{src}' '{dst}'")
+        self.deploy_scripts()
+        cmd = ["python3", REMOTE_KEYFRAME_SCRIPT, "--names", *ZIP_KEYFRAME_SAMPLE_NAMES, "--zips", *zip_paths]
+        status, out, err = self.ssh.exec_command(cmd, timeout=300)
         
+        counts = dict.fromkeys(zip_paths, 0)
         if status != 0:
-            return False, f"移动失败: {err}"
+            logger.debug(f"  ✗ 批量读取 ZIP 关键帧失败 status={status}, err={err.strip()}")
+            return counts
+        for line in out.splitlines():
+            count, _, zip_path = line.partition("\t")
+            if count.isdigit() and zip_path in counts:
+                counts[zip_path] = int(count)
+        return counts
+    
+    def move_to_final(self, stem: str) -> Tuple[bool, str]:
+        """移动到最终目录，并清理原始 ZIP（所有步骤合并为一次远程命令）"""
+        server = self.ssh.server
+        src = shlex.quote(f"{server.process_dir}/{stem}")
+        dst_path = f"{server.final_dir}/{stem}"
+        dst = shlex.quote(dst_path)
+        zip_path = shlex.quote(f"{server.zip_dir}/{stem}.zip")
         
-        # 整个流程完成后，处理原始 ZIP（避免中途失败导致重复上传）
+        # 检查源目录；目标目录已存在时直接删除（不备份）后移动
+        # 脚本最后输出一行状态：OK / ERR:no_src / ERR:mv
+        cmd = (f"[ -d {src} ] || {{ echo ERR:no_src; exit 1; }}; "
+               f"rm -rf {dst} && mv {src} {dst} || {{ echo ERR:mv; exit 1; }}")
+        
+        # 整个流程完成后，处理原始 ZIP（避免中途失败导致重复上传；失败不影响结果）
         if self.config.zip_after_process == "rename":
-            new_name = f"{server.zip_dir}/processed_{stem}.zip"
-            self.ssh.exec_command(f"mv '{zip_path}' '{new_name}'")
+            new_name = shlex.quote(f"{server.zip_dir}/processed_{stem}.zip")
+            cmd += f"; mv {zip_path} {new_name} 2>/dev/null"
         elif self.config.zip_after_process == "delete":
-            self.ssh.exec_command(f"rm -f '{zip_path}'")
+            cmd += f"; rm -f {zip_path}"
+        cmd += "; echo OK"
         
-        return True, dst
+        status, out, err = self.ssh.exec_command(cmd)
+        result = out.rsplit("\n", 1)[-1]
+        if result == "OK":
+            self.invalidate_state()
+            return True, dst_path
+        if result == "ERR:no_src":
+            return False, "源目录不存在"
+        return False, f"移动失败: {err}"
@@ -5,83 +5,180 @@
 import sys
 import time
 import logging
+import itertools
 import threading
 from pathlib import Path
+from types import MappingProxyType
 from datetime import datetime
-from typing import Dict, List, Optional, Set
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from collections import defaultdict, deque
 from dataclasses import dataclass, field
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue
+from queue import Queue, Empty, Full
 
 from .config import get_config, PipelineConfig
 from .ssh_client import SSHClient
 from .downloader import Downloader
-from .processor import RemoteProcessor
+from .processor import RemoteProcessor, EARLY_REJECT_PREFIX
 from .server_logger import ServerLogger
-from .tracker import Tracker, TrackingRecord
+from .tracker import Tracker, BatchTracker, TrackingRecord
 from .state import StateManager, ProcessStatus
 from .nas_backup import NASBackup
-from .utils import normalize_zip_name
+from .utils import normalize_zip_name, drop_page_cache, list_files
 from .scheduler import PipelineScheduler, PipelineStep
 
 logger = logging.getLogger(__name__)
 
+# 服务器状态缺少对应字段时使用的共享空集合（避免每个文件都新建空容器）
+_EMPTY_SET: frozenset = frozenset()
+_EMPTY_MAP = MappingProxyType({})
+
+
+class _IndexedList(list):
+    """
+    保持追加顺序的列表，附带集合索引，成员判断为 O(1)
+    
+    多个线程并发追加时无需加锁：set.add 与 list.append 各自是原子操作，
+    且先写索引再写列表，遍历列表看到的名称在索引中必定能查到
+    """
+    
+    def __init__(self, items=()):
+        super().__init__(items)
+        self._index = set(self)
+    
+    def append(self, item):
+        self._index.add(item)
+        super().append(item)
+    
+    def extend(self, items):
+        items = list(items)
+        self._index.update(items)
+        super().extend(items)
+    
+    def __contains__(self, item) -> bool:
+        return item in self._index
+
 
 @dataclass
 class PipelineResult:
-    """流水线执行结果"""
+    """
+    流水线执行结果（处理过程中需要按名称查询的字段使用 _IndexedList）
+    
+    各工作线程直接追加，不做线程本地结果再合并：主流程和飞书同步在运行中就要按名称查询
+    （如后台上传的 uploaded、检查结果 check_passed）
+    """
     downloaded: List[str] = field(default_factory=list)
-    download_failed: List[str] = field(default_factory=list)
-    skipped_server_exists: List[str] = field(default_factory=list)
-    uploaded: List[str] = field(default_factory=list)
+    download_failed: List[str] = field(default_factory=_IndexedList)
+    skipped_server_exists: List[str] = field(default_factory=_IndexedList)
+    uploaded: List[str] = field(default_factory=_IndexedList)
     processed: List[str] = field(default_factory=list)
-    check_passed: List[str] = field(default_factory=list)
-    check_failed: List[str] = field(default_factory=list)
-    moved_to_final: List[str] = field(default_factory=list)
+    check_passed: List[str] = field(default_factory=_IndexedList)
+    check_failed: List[str] = field(default_factory=_IndexedList)
+    moved_to_final: List[str] = field(default_factory=_IndexedList)
     backed_up: List[str] = field(default_factory=list)  # NAS备份成功的数据包
     backup_failed: List[str] = field(default_factory=list)  # NAS备份失败的数据包
     keyframe_counts: Dict[str, int] = field(default_factory=dict)
-    errors: Dict[str, List[tuple]] = field(default_factory=dict)
+    errors: Dict[str, List[tuple]] = field(default_factory=lambda: defaultdict(list))
     
     def log_error(self, stem: str, step: str, msg: str):
-        if stem not in self.errors:
-            self.errors[stem] = []
+        # defaultdict(list) 的取值/创建与 append 均在 C 层完成，多线程记录同一数据的错误时不会互相覆盖
         self.errors[stem].append((step, msg))
 
 
+class FileJob(NamedTuple):
+    """待处理文件：各阶段用到的 ZIP 文件名在构建时计算一次"""
+    json_file: Path
+    stem: str
+    zip_name: str       # 本地/服务器处理使用的 ZIP 文件名（原始文件名）
+    download_name: str  # 下载使用的 ZIP 文件名（规范化后）
+    
+    @classmethod
+    def from_json(cls, json_file: Path) -> "FileJob":
+        stem = json_file.stem
+        return cls(json_file, stem, f"{stem}.zip", f"{normalize_zip_name(stem)}.zip")
+
+
+# 进度条最短刷新间隔（秒），完成时总会刷新
+PROGRESS_RENDER_INTERVAL = 0.1
+
+
 class ProgressTracker:
-    """进度追踪器"""
+    """进度追踪器（可多线程调用 update，计数不加锁）"""
     
-    def __init__(self, total: int, title: str = "处理进度"):
+    def __init__(self, total: int, title: str = "处理进度", status: Callable[[], str] = None):
         self.total = total
-        self.completed = 0
-        self.success = 0
-        self.failed = 0
         self.title = title
-        self.lock = threading.Lock()
+        # 附加在进度条后的状态（如并行下载的进度与速度），为空字符串时不显示
+        self.status = status
+        # 完成序号：itertools.count 的 next() 是原子操作，恰好一个线程拿到最后一个序号
+        self._seq = itertools.count(1)
+        # 各文件的结果，list.append 为原子操作
+        self._outcomes: List[bool] = []
+        # 只用于输出；刷新时已有线程在输出则跳过本次
+        self._print_lock = threading.Lock()
         self.start_time = datetime.now()
+        self._last_render = 0.0
+        # 最近一次更新的 (完成序号, 名称, 是否成功)，refresh 时重绘
+        self._last = (0, "", True)
+    
+    @property
+    def completed(self) -> int:
+        return len(self._outcomes)
+    
+    @property
+    def success(self) -> int:
+        return self._outcomes.count(True)
+    
+    @property
+    def failed(self) -> int:
+        return self._outcomes.count(False)
     
     def update(self, success: bool = True, name: str = ""):
-        with self.lock:
-            self.completed += 1
-            if success:
-                self.success += 1
-            else:
-                self.failed += 1
-            self._display(name, success)
+        seq = next(self._seq)
+        self._outcomes.append(success)
+        self._last = (seq, name, success)
+        if seq >= self.total:
+            # 最后一个完成时总会刷新
+            with self._print_lock:
+                self._display(seq, name, success)
+            return
+        # 大量快速完成（跳过、已缓存）时限制刷新频率，避免终端输出成为瓶颈
+        now = time.monotonic()
+        if now - self._last_render >= PROGRESS_RENDER_INTERVAL and self._print_lock.acquire(blocking=False):
+            try:
+                self._last_render = now
+                self._display(seq, name, success)
+            finally:
+                self._print_lock.release()
     
-    def _display(self, name: str, success: bool):
-        percent = self.completed / self.total * 100 if self.total > 0 else 0
+    def refresh(self):
+        """附加状态变化时重绘当前进度（同样限制刷新频率，全部完成后不再重绘）"""
+        now = time.monotonic()
+        if now - self._last_render < PROGRESS_RENDER_INTERVAL or not self._print_lock.acquire(blocking=False):
+            return
+        try:
+            completed, name, success = self._last
+            if completed < self.total:
+                self._last_render = now
+                self._display(completed, name, success)
+        finally:
+            self._print_lock.release()
+    
+    def _display(self, completed: int, name: str, success: bool):
+        percent = completed / self.total * 100 if self.total > 0 else 0
         width = 25
-        filled = int(width * self.completed / self.total) if self.total > 0 else 0
+        filled = int(width * completed / self.total) if self.total > 0 else 0
         bar = '━' * filled + '╸' + '─' * (width - filled - 1) if filled < width else '━' * width
-        status = "✓" if success else "✗"
+        status = ("✓" if success else "✗") if name else " "
+        extra = self.status() if self.status else ""
         
         sys.stdout.write(f'\r\033[K')
-        sys.stdout.write(f'[{bar}] {self.completed}/{self.total} ({percent:.0f}%) │ {status} {name[:30]:<30}')
+        sys.stdout.write(f'[{bar}] {completed}/{self.total} ({percent:.0f}%) │ {status} {name[:30]:<30}')
+        if extra:
+            sys.stdout.write(f' │ {extra}')
         sys.stdout.flush()
         
-        if self.completed >= self.total:
+        if completed >= self.total:
             print()
     
     def summary(self):
@@ -93,48 +190,159 @@ class ProgressTracker:
         print(f"{'─'*50}")
 
 
+# 优化模式下后台预上传最多领先服务器处理的文件数
+PIPELINE_UPLOAD_AHEAD = 2
+# 优化模式下后台预上传的并发数（每个上传线程使用独立的 SSH 连接）
+PIPELINE_UPLOAD_WORKERS = 4
+
+
+# 连接池中的连接及绑定在该连接上的处理器
+PooledConnection = Tuple[SSHClient, RemoteProcessor]
+
+# 等待可用连接的最长时间（秒）
+POOL_WAIT_TIMEOUT = 60
+# 连接池中共用一条 TCP 连接的客户端数（每个客户端另占 SFTP、常驻 shell、常驻进程等多个通道，
+# 需低于 sshd 默认 MaxSessions=10；同一连接上的 SFTP 传输也会互相争用带宽）
+POOL_CLIENTS_PER_TRANSPORT = 2
+
+
 class SSHConnectionPool:
-    """SSH 连接池，用于并行模式复用连接"""
+    """SSH 连接池，用于并行模式复用连接（每个连接绑定一个已部署脚本的处理器）"""
     
-    def __init__(self, size: int = 3):
-        self._pool: Queue = Queue()
+    def __init__(self, size: int = 3, config: PipelineConfig = None, scripts_deployed: bool = False):
+        # 空闲连接：deque 的 append/popleft 在 CPython 中是原子操作，取/还连接无需加锁
+        self._idle: deque = deque()
+        # 等待连接的线程，每个线程一个 Event，归还时只唤醒一个
+        self._waiters: deque = deque()
         self._size = size
-        self._created = 0
-        self._lock = threading.Lock()
-        self._scripts_deployed = False
-    
-    def get(self) -> Optional[SSHClient]:
-        """获取一个连接"""
-        # 先尝试从池中获取
-        if not self._pool.empty():
+        self._config = config
+        # 连接创建名额：每个存活的连接占用一个，连接失效时归还
+        self._slots = threading.BoundedSemaphore(size)
+        # 所有连接指向同一服务器，脚本部署成功一次即可（只读判断，无需加锁）
+        self._scripts_deployed = scripts_deployed
+        # 当前可被复用的 TCP 连接 (拥有该连接的客户端, 已共用的客户端数)，仅建连时加锁
+        self._mux: Optional[Tuple[SSHClient, int]] = None
+        self._mux_lock = threading.Lock()
+    
+    def get(self) -> Optional[PooledConnection]:
+        """获取一个连接及其处理器，POOL_WAIT_TIMEOUT 秒内无可用连接返回 None"""
+        deadline = time.monotonic() + POOL_WAIT_TIMEOUT
+        tried_create = False
+        while True:
+            # 快速路径：直接取空闲连接
             try:
-                return self._pool.get_nowait()
-            except:
+                return self._idle.popleft()
+            except IndexError:
                 pass
+            
+            # 还有名额时创建新连接（不持锁建连，多个线程可同时建立连接）
+            # 每次获取只尝试建连一次，失败后等待其他线程归还连接
+            if not tried_create and self._slots.acquire(blocking=False):
+                tried_create = True
+                conn = self._create()
+                if conn is not None:
+                    return conn
+                continue
+            
+            # 慢速路径：先登记再复查，避免与 put 之间丢失唤醒
+            event = threading.Event()
+            self._waiters.append(event)
+            try:
+                return self._idle.popleft()
+            except IndexError:
+                pass
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not event.wait(remaining):
+                try:
+                    self._waiters.remove(event)
+                except ValueError:
+                    pass
+                # 超时的同时可能刚好有连接归还，最后再取一次
+                try:
+                    return self._idle.popleft()
+                except IndexError:
+                    return None
+    
+    def _create(self) -> Optional[PooledConnection]:
+        """占用名额后创建连接并部署脚本，连接失败时归还名额并返回 None"""
+        ssh = self._connect()
+        if ssh is None:
+            self._release_slot()
+            return None
+        # 已部署时处理器直接标记为已部署，常驻进程启动等路径不会再做部署校验
+        processor = RemoteProcessor(ssh, self._config, scripts_deployed=self._scripts_deployed)
+        if not self._scripts_deployed:
+            # 尚未部署时由新连接部署（部署为原子替换，多个连接同时部署互不影响）
+            try:
+                # 部署失败时保持未部署状态，由下一个新连接重试
+                self._scripts_deployed = processor.deploy_scripts()
+            except Exception:
+                self._discard(ssh)
+                raise
+        return ssh, processor
+    
+    def _connect(self) -> Optional[SSHClient]:
+        """建立连接：优先复用已有 TCP 连接（每条最多 POOL_CLIENTS_PER_TRANSPORT 个客户端），否则新建"""
+        owner = None
+        with self._mux_lock:
+            if self._mux is not None:
+                mux_owner, shared = self._mux
+                if mux_owner.is_connected and shared < POOL_CLIENTS_PER_TRANSPORT:
+                    owner = mux_owner
+                    self._mux = (mux_owner, shared + 1)
         
-        # 创建新连接
-        with self._lock:
-            if self._created < self._size:
-                ssh = SSHClient()
-                if ssh.connect():
-                    self._created += 1
-                    return ssh
+        if owner is not None:
+            ssh = SSHClient(owner.server)
+            return ssh if ssh.connect(share_with=owner) else None
         
-        # 等待可用连接
-        return self._pool.get(timeout=60)
+        ssh = SSHClient()
+        if not ssh.connect():
+            return None
+        with self._mux_lock:
+            self._mux = (ssh, 1)
+        return ssh
     
-    def put(self, ssh: SSHClient):
-        """归还连接"""
-        if ssh and ssh.is_connected:
-            self._pool.put(ssh)
+    def put(self, conn: Optional[PooledConnection]):
+        """归还连接，已断开的连接释放名额以便重新创建"""
+        if not conn:
+            return
+        if conn[0].is_connected:
+            self._idle.append(conn)
+            self._wake_one()
+        else:
+            self._discard(conn[0])
+    
+    def _wake_one(self):
+        """唤醒一个等待中的线程"""
+        try:
+            self._waiters.popleft().set()
+        except IndexError:
+            pass
+    
+    def _release_slot(self):
+        """归还创建名额，并唤醒一个等待线程去创建新连接"""
+        self._slots.release()
+        self._wake_one()
+    
+    def _discard(self, ssh: SSHClient):
+        """关闭失效连接并归还名额"""
+        self._release_slot()
+        try:
+            ssh.close()
+        except Exception:
+            pass
     
     def close_all(self):
         """关闭所有连接"""
-        while not self._pool.empty():
+        while True:
+            try:
+                ssh, _ = self._idle.popleft()
+            except IndexError:
+                break
             try:
-                ssh = self._pool.get_nowait()
                 ssh.close()
-            except:
+            except Exception:
                 pass
 
 
@@ -156,11 +364,12 @@ class PipelineRunner:
         # 组件
         self.downloader = Downloader(self.config.dataweave)
         self.result = PipelineResult()
-        self._lock = threading.Lock()
-        self._deploy_lock = threading.Lock()
-        self._scripts_deployed = False
+        # process_dir 中已有数据的关键帧数量（run 中批量获取），_process_single 首次使用后移除
+        self._processing_counts: Dict[str, int] = {}
         self.server_logger: Optional[ServerLogger] = None
         self.nas_backup: Optional[NASBackup] = None
+        # 飞书同步（run 中创建，逐条加入后由后台线程攒批写入）
+        self._tracker: Optional[BatchTracker] = None
         
         # 状态管理器（断点续传支持）
         self.state_manager = StateManager(base_dir)
@@ -172,11 +381,12 @@ class PipelineRunner:
             config_dict = self.config.__dict__ if hasattr(self.config, '__dict__') else {}
             # 尝试从 YAML 配置中读取
             import yaml
+            from .config import YamlLoader
             from pathlib import Path as P
             pipeline_yaml = P("configs/pipeline.yaml")
             if pipeline_yaml.exists():
                 with open(pipeline_yaml, 'r') as f:
-                    yaml_config = yaml.safe_load(f) or {}
+                    yaml_config = yaml.load(f, Loader=YamlLoader) or {}
                     scheduler_config = yaml_config
         
         self.scheduler = PipelineScheduler(
@@ -203,16 +413,17 @@ class PipelineRunner:
         self.scheduler.print_execution_plan()
         print()
         
-        json_files = list(self.json_dir.glob("*.json"))
+        json_files = list_files(self.json_dir, ".json")
         if not json_files:
             print("  ⚠ 未找到 JSON 文件")
             return self.result
         
         print(f"  📋 共 {len(json_files)} 个文件")
         
-        # 初始化NAS备份（使用上下文管理器）
-        with NASBackup() as nas_backup:
+        # 初始化NAS备份与飞书批量同步（使用上下文管理器，退出时写入剩余的飞书记录）
+        with NASBackup() as nas_backup, BatchTracker(Tracker(), str(self.json_dir)) as tracker:
             self.nas_backup = nas_backup
+            self._tracker = tracker
             
             with SSHClient() as ssh:
                 if not ssh.is_connected:
@@ -222,7 +433,9 @@ class PipelineRunner:
                 print(f"  🔗 已连接服务器: {ssh.server.ip}")
                 
                 processor = RemoteProcessor(ssh, self.config)
-                processor.deploy_scripts()
+                if not processor.deploy_scripts():
+                    print("  ✗ 远程脚本部署失败")
+                    return self.result
                 
                 # 初始化服务器日志
                 self.server_logger = ServerLogger(ssh)
@@ -240,34 +453,39 @@ class PipelineRunner:
                 print(f"  📊 服务器: {len(state['zip_files'])} ZIPs / {len(state['processed_dirs'])} 已完成")
                 
                 # 统计本地已下载的文件（只统计数量，不验证完整性）
-                local_zip_files = list(self.local_zip_dir.glob("*.zip"))
+                local_zip_files = list_files(self.local_zip_dir, ".zip")
                 print(f"  💾 本地ZIP: {len(local_zip_files)} 个")
                 
-                # 过滤需要处理的文件，跳过的文件立即更新飞书
+                # 过滤需要处理的文件，跳过的文件加入飞书同步队列
                 files_to_process = []
-                tracker = Tracker()
+                # 一次 SSH 调用批量获取已完成目录的关键帧数量
+                done_stems = [f.stem for f in json_files if f.stem in state['processed_dirs']]
+                final_counts = processor.get_keyframe_counts(
+                    [f"{ssh.server.final_dir}/{stem}" for stem in done_stems]
+                )
                 for json_file in json_files:
                     stem = json_file.stem
                     if stem in state['processed_dirs']:
-                        # 尝试获取关键帧数量，如果失败则重新处理
+                        # 关键帧数量为 0 说明数据不完整，需要重新处理
                         logger.info(f"[{stem}] 检查final_dir中的数据完整性...")
-                        kf = processor.get_keyframe_count(f"{ssh.server.final_dir}/{stem}")
+                        kf = final_counts.get(f"{ssh.server.final_dir}/{stem}")
+                        if kf is None:
+                            # 批量读取失败的目录单独检查，避免一次临时错误导致已完成的数据全部重新处理
+                            kf = processor.get_keyframe_count(f"{ssh.server.final_dir}/{stem}")
                         if kf > 0:
                             # 服务器上已完成且数据完整的文件，记录为跳过
                             logger.info(f"[{stem}] ✓ 已在final_dir中 (关键帧: {kf})，跳过所有步骤")
                             self.result.skipped_server_exists.append(stem)
                             self.result.check_passed.append(stem)
                             self.result.keyframe_counts[stem] = kf
-                            # 立即更新飞书
-                            logger.info(f"[{stem}] 更新飞书表格...")
-                            self._track_single_to_feishu(tracker, stem, silent=True)
-                            logger.info(f"[{stem}] ✓ 飞书已更新")
+                            # 加入飞书同步队列
+                            self._track_single_to_feishu(stem)
                         else:
                             # 数据不完整，需要重新处理
                             logger.warning(f"[{stem}] ✗ 在final_dir但数据不完整，将重新处理")
-                            files_to_process.append((json_file, stem))
+                            files_to_process.append(FileJob.from_json(json_file))
                     else:
-                        files_to_process.append((json_file, stem))
+                        files_to_process.append(FileJob.from_json(json_file))
                 
                 skipped = len(json_files) - len(files_to_process)
                 if skipped > 0:
@@ -275,219 +493,323 @@ class PipelineRunner:
                 
                 if not files_to_process:
                     print("  ✓ 所有文件都已处理完成")
+                    tracker.close()
                     self._print_summary()
                     return self.result
                 
-                # 计算实际需要下载的数量
-                local_stems = set(f.stem for f in local_zip_files)
-                need_download = 0
-                for json_file, stem in files_to_process:
-                    zip_name = f"{stem}.zip"
-                    if zip_name not in state['zip_files'] and stem not in local_stems:
-                        need_download += 1
+                # 一次 SSH 调用批量获取处理中目录的关键帧数量（断点续传时验证数据完整性）
+                resume_dirs = {
+                    f"{ssh.server.process_dir}/{job.stem}": job.stem
+                    for job in files_to_process if job.stem in state['processing_dirs']
+                }
+                processing_counts = processor.get_keyframe_counts(list(resume_dirs))
+                # 只保存确实读到的数量；批量读取失败的目录在处理时再单独检查，不会被当作不完整而删除
+                self._processing_counts = {
+                    resume_dirs[data_dir]: count for data_dir, count in processing_counts.items()
+                }
+                
+                # 一次遍历确定每个文件的 ZIP 来源（服务器已有 / 本地已有 / 需下载），优化模式直接复用
+                zip_plan = self._plan_zips(files_to_process, state)
+                need_download = sum(1 for source in zip_plan.values() if source == "download")
                 
                 print(f"  📦 待处理: {len(files_to_process)} 个 (需下载: {need_download})")
                 if mode != "streaming":
                     print(f"  🧵 并发数: {workers}")
                 print()
                 
-                if mode == "optimized":
-                    self._run_optimized(ssh, processor, files_to_process, state, workers)
-                elif mode == "parallel":
-                    self._run_parallel(processor, files_to_process, state, workers)
-                else:
-                    self._run_streaming(ssh, processor, files_to_process, state)
+                try:
+                    if mode == "optimized":
+                        self._run_optimized(ssh, processor, files_to_process, state, workers, zip_plan)
+                    elif mode == "parallel":
+                        self._run_parallel(processor, files_to_process, state, workers)
+                    else:
+                        self._run_streaming(ssh, processor, files_to_process, state)
+                finally:
+                    # 写回下载过程中累积的 ZIP 校验记录
+                    self.downloader.flush_verify_cache()
         
         self._print_summary()
         
-        # 注意：飞书同步已在 _track_single_to_feishu 中逐个完成
+        # 注意：飞书同步已通过 _track_single_to_feishu 加入队列，并在上面退出时全部写入
         # 不再调用 _track_to_feishu 避免重复同步
         
         return self.result
     
+    def _plan_zips(self, files: List[FileJob], state: Dict) -> Dict[str, str]:
+        """
+        确定每个文件的 ZIP 来源: "server"（服务器已有）、"local"（本地已下载）或 "download"（需下载）
+        本地只检查文件存在且大小>0，不验证完整性（避免卡顿），每个文件最多一次 stat
+        """
+        plan = {}
+        for job in files:
+            # 规范化文件名用于查找ZIP
+            if job.download_name in state['zip_files']:
+                plan[job.stem] = "server"
+                continue
+            try:
+                has_local = (self.local_zip_dir / job.download_name).stat().st_size > 0
+            except OSError:
+                has_local = False
+            plan[job.stem] = "local" if has_local else "download"
+        return plan
+    
     def _run_optimized(self, ssh: SSHClient, processor: RemoteProcessor,
-                       files: List[tuple], state: Dict, workers: int):
-        """优化模式：下载并行 + 服务器操作串行"""
+                       files: List[FileJob], state: Dict, workers: int,
+                       zip_plan: Dict[str, str] = None):
+        """
+        优化模式：下载并行 + 服务器操作串行，两者流水线重叠（zip_plan 为 _plan_zips 的结果，未提供时重新计算）
         
-        # 阶段1: 并行下载
-        print("=" * 50)
-        print("  📥 阶段1: 并行下载 ZIP 文件")
-        print("=" * 50)
+        下载完成的文件立即进入后台预上传线程（PIPELINE_UPLOAD_WORKERS 个连接并行上传），
+        再交给主线程逐个解压/检查/移动，总耗时约为 max(下载, 上传, 服务器处理) 而不是三者之和
+        """
+        if zip_plan is None:
+            zip_plan = self._plan_zips(files, state)
         
+        jobs = {job.stem: job for job in files}
+        ready_stems = []
         files_to_download = []
         skipped_local = 0
         skipped_server = 0
-        for json_file, stem in files:
-            # 规范化文件名用于查找ZIP
-            normalized_stem = normalize_zip_name(stem)
-            zip_name = f"{normalized_stem}.zip"
-            local_zip = self.local_zip_dir / zip_name
-            
-            if zip_name in state['zip_files']:
+        for job in files:
+            stem = job.stem
+            source = zip_plan[stem]
+            if source == "server":
                 self.result.skipped_server_exists.append(stem)
                 skipped_server += 1
-                continue
-            # 只检查文件存在且大小>0，不验证完整性（避免卡顿）
-            if local_zip.exists() and local_zip.stat().st_size > 0:
+                ready_stems.append(stem)
+            elif source == "local":
                 self.result.downloaded.append(stem)
                 skipped_local += 1
-                continue
-            files_to_download.append((stem, zip_name, local_zip))
+                ready_stems.append(stem)
+            else:
+                files_to_download.append((stem, job.download_name, self.local_zip_dir / job.download_name))
         
+        print("=" * 50)
+        print("  🔄 并行下载 + 串行服务器操作（流水线）")
+        print("=" * 50)
         if skipped_server > 0 or skipped_local > 0:
-            print(f"  跳过: 服务器已有 {skipped_server} 个, 本地已有 {skipped_local} 个")
+            print(f"  跳过下载: 服务器已有 {skipped_server} 个, 本地已有 {skipped_local} 个")
+        
+        # 服务器上没有 ZIP 的文件都需要上传（下载失败的除外），用于显示上传序号
+        need_upload_count = len(files) - skipped_server
+        print(f"  待处理: {len(files)} 个 (需下载: {len(files_to_download)} 个, 需上传: {need_upload_count} 个)")
+        
+        # 就绪队列: (stem, 下载是否成功)，None 表示没有更多文件
+        ready_queue: Queue = Queue()
+        # 处理队列: 已完成预上传、等待服务器处理的 (stem, 是否可处理)，下载失败或上传前检查失败的为 False，
+        # 容量限制预上传的领先数量
+        process_queue: Queue = Queue(maxsize=PIPELINE_UPLOAD_AHEAD)
+        stop = threading.Event()
+        
+        def need_upload(stem: str) -> bool:
+            zip_name = jobs[stem].zip_name
+            return zip_name not in state['zip_files'] and (self.local_zip_dir / zip_name).exists()
+        
+        for stem in ready_stems:
+            ready_queue.put((stem, True))
+        
+        # 下载进度显示在服务器处理进度条之后：各文件已下载字节数（键预先建好，下载线程只更新自己的值）
+        remaining = [len(files_to_download)]
+        remaining_lock = threading.Lock()
+        download_bytes = {stem: 0 for stem, _, _ in files_to_download}
+        download_start = time.monotonic()
+        download_end = [None]
+        
+        def download_status() -> str:
+            done = len(files_to_download) - remaining[0]
+            mb = sum(download_bytes.values()) / 1024 / 1024
+            elapsed = (download_end[0] or time.monotonic()) - download_start
+            speed = mb / elapsed if elapsed > 0 else 0
+            return f"⬇ {done}/{len(files_to_download)} {mb:.0f}MB {speed:.1f}MB/s"
         
+        print()
+        progress = ProgressTracker(len(files), "服务器处理",
+                                   status=download_status if files_to_download else None)
+        
+        executor = None
         if files_to_download:
-            print(f"  需下载: {len(files_to_download)} 个文件 (并发: {workers})")
-            
-            # 预先获取 token，避免在进度条显示期间输出日志
+            print(f"  下载并发: {workers}")
+            # 预先获取 token 并批量预取下载 URL
             self.downloader.token_manager.get_token()
-            
-            # 尝试使用 tqdm 进度条
-            try:
-                from tqdm import tqdm
-                use_tqdm = True
-            except ImportError:
-                use_tqdm = False
-            
-            # 并行下载
-            download_status = {}  # stem -> status
-            status_lock = threading.Lock()
-            active_downloads = {}  # stem -> (downloaded, total)
-            
-            if use_tqdm:
-                # 单进度条：显示文件数 + 下载流量
-                file_pbar = tqdm(total=len(files_to_download), desc="  下载进度", 
-                                unit="个", ncols=80, leave=True)
-                total_bytes = [0]
-                downloaded_bytes = [0]
-                last_update = [time.time()]
-                start_time = [time.time()]
-                
-                def make_progress_callback(stem):
-                    def callback(downloaded, total):
-                        with status_lock:
-                            if stem not in active_downloads:
-                                active_downloads[stem] = (0, total)
-                                if total > 0:
-                                    total_bytes[0] += total
-                            old_downloaded, _ = active_downloads[stem]
-                            delta = downloaded - old_downloaded
-                            if delta > 0:
-                                active_downloads[stem] = (downloaded, total)
-                                downloaded_bytes[0] += delta
-                                # 限制刷新频率，避免闪烁
-                                now = time.time()
-                                if now - last_update[0] > 0.2:
-                                    last_update[0] = now
-                                    # 计算下载速度
-                                    elapsed = now - start_time[0]
-                                    speed = downloaded_bytes[0] / elapsed / 1024 / 1024 if elapsed > 0 else 0
-                                    file_pbar.set_postfix_str(f"{downloaded_bytes[0]/1024/1024:.0f}MB {speed:.1f}MB/s", refresh=True)
-                    return callback
-            else:
-                make_progress_callback = lambda stem: None
+            self.downloader.prefetch_download_urls([zip_name for _, zip_name, _ in files_to_download])
             
             def download_task(stem, zip_name, local_zip):
+                def on_progress(downloaded, total):
+                    download_bytes[stem] = downloaded
+                    progress.refresh()
+                
                 try:
-                    progress_cb = make_progress_callback(stem)
-                    success = self.downloader.download_file(zip_name, local_zip, progress_callback=progress_cb)
-                    with status_lock:
-                        download_status[stem] = success
-                    return stem, success
+                    success = self.downloader.download_file(zip_name, local_zip, progress_callback=on_progress)
                 except Exception as e:
-                    with status_lock:
-                        download_status[stem] = False
                     logger.error(f"下载异常 {stem}: {e}")
-                    return stem, False
+                    success = False
+                if success:
+                    self.result.downloaded.append(stem)
+                    logger.info(f"[{stem}] ✓ 下载完成")
+                else:
+                    self.result.download_failed.append(stem)
+                    logger.error(f"[{stem}] ✗ 下载失败")
+                ready_queue.put((stem, success))
+                with remaining_lock:
+                    remaining[0] -= 1
+                    if remaining[0] == 0:
+                        download_end[0] = time.monotonic()
+                        ready_queue.put(None)
             
-            with ThreadPoolExecutor(max_workers=workers) as executor:
-                futures = [executor.submit(download_task, stem, zip_name, local_zip) 
-                          for stem, zip_name, local_zip in files_to_download]
-                
-                for future in as_completed(futures):
-                    stem, success = future.result()
-                    if use_tqdm:
-                        file_pbar.update(1)
-                        status = "✓" if success else "✗"
-                        file_pbar.set_postfix_str(f"{status} {stem[:20]}")
-                    else:
-                        status = "✓" if success else "✗"
-                        sys.stdout.write(f'\r\033[K  [{len(download_status)}/{len(futures)}] {status} {stem[:40]}')
-                        sys.stdout.flush()
-                    
-                    if success:
-                        self.result.downloaded.append(stem)
-                    else:
-                        self.result.download_failed.append(stem)
+            # 每个下载线程循环从共享队列取文件（deque.popleft 为原子操作），
+            # 只提交 workers 个任务，不为每个文件创建 Future；主流程结束时 stop 让其不再取新文件
+            pending = deque(files_to_download)
             
-            if use_tqdm:
-                file_pbar.close()
-            else:
-                print()
+            def download_loop():
+                while not stop.is_set():
+                    try:
+                        item = pending.popleft()
+                    except IndexError:
+                        return
+                    download_task(*item)
             
-            # 下载汇总
-            success_count = len(self.result.downloaded) - skipped_local
-            fail_count = len(self.result.download_failed)
-            print(f"  📊 下载完成: ✓ {success_count}  ✗ {fail_count}")
+            download_workers = min(workers, len(files_to_download))
+            executor = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="download")
+            for _ in range(download_workers):
+                executor.submit(download_loop)
         else:
-            print("  所有文件已下载或服务器已存在")
+            ready_queue.put(None)
         
-        # 阶段2: 串行服务器操作
-        print()
-        print("=" * 50)
-        print("  🔄 阶段2: 串行服务器操作")
-        print("=" * 50)
+        # 多个后台线程按就绪顺序并行预上传 ZIP，与当前文件的解压/检查/移动重叠
+        upload_enabled = self.scheduler.should_run(PipelineStep.UPLOAD)
+        uploaders_left = [PIPELINE_UPLOAD_WORKERS]
+        uploaders_lock = threading.Lock()
         
-        files_for_server = [(jf, stem) for jf, stem in files if stem not in self.result.download_failed]
+        def is_last_uploader() -> bool:
+            with uploaders_lock:
+                uploaders_left[0] -= 1
+                return uploaders_left[0] == 0
         
-        if not files_for_server:
-            print("  没有需要处理的文件")
-            return
-        
-        # 计算实际需要上传的文件数量（排除服务器已有ZIP的）
-        need_upload_count = sum(1 for jf, stem in files_for_server 
-                                if f"{stem}.zip" not in state['zip_files'] 
-                                and (self.local_zip_dir / f"{stem}.zip").exists())
-        
-        print(f"  待处理: {len(files_for_server)} 个 (需上传: {need_upload_count} 个)")
+        upload_threads = [
+            threading.Thread(
+                target=self._upload_ahead,
+                args=(ssh.server, ready_queue, process_queue, stop,
+                      lambda stem: upload_enabled and need_upload(stem)
+                      and not self.state_manager.can_skip_upload(stem),
+                      is_last_uploader),
+                name=f"upload-ahead-{i}", daemon=True,
+            )
+            for i in range(PIPELINE_UPLOAD_WORKERS)
+        ]
+        for thread in upload_threads:
+            thread.start()
         
-        progress = ProgressTracker(len(files_for_server), "服务器处理")
-        tracker = Tracker()
         upload_idx = 0
         
-        for idx, (json_file, stem) in enumerate(files_for_server, 1):
-            zip_name = f"{stem}.zip"
-            # 判断是否需要上传
-            need_upload = zip_name not in state['zip_files'] and (self.local_zip_dir / zip_name).exists()
-            if need_upload:
-                upload_idx += 1
-                success = self._process_single(ssh, processor, json_file, stem, state, upload_idx, need_upload_count)
-            else:
-                success = self._process_single(ssh, processor, json_file, stem, state, 0, 0)
-            # 只在成功时同步飞书
-            if success:
-                self._track_single_to_feishu(tracker, stem, silent=True)
-            progress.update(success=success, name=stem)
+        try:
+            for stem, downloaded in iter(process_queue.get, None):
+                if not downloaded:
+                    # 下载失败（或上传前检查失败）的文件不做服务器处理
+                    progress.update(success=False, name=stem)
+                    continue
+                if need_upload(stem):
+                    upload_idx += 1
+                    success = self._process_single(ssh, processor, jobs[stem].json_file, stem, state,
+                                                   upload_idx, need_upload_count)
+                else:
+                    success = self._process_single(ssh, processor, jobs[stem].json_file, stem, state, 0, 0)
+                # 只在成功时同步飞书
+                if success:
+                    self._track_single_to_feishu(stem)
+                progress.update(success=success, name=stem)
+        finally:
+            stop.set()
+            if executor is not None:
+                executor.shutdown(wait=True)
+            # 提前停止时未下载的文件不会发出结束标记，这里补发一个，确保上传线程都能退出
+            ready_queue.put(None)
+            for thread in upload_threads:
+                thread.join()
         
+        if files_to_download:
+            success_count = len(self.result.downloaded) - skipped_local
+            print(f"  📊 下载: ✓ {success_count}  ✗ {len(self.result.download_failed)}  ({download_status()})")
         progress.summary()
     
-    def _run_parallel(self, processor: RemoteProcessor, files: List[tuple], 
+    def _upload_ahead(self, server, ready_queue: Queue, process_queue: Queue,
+                      stop: threading.Event, should_upload, is_last_uploader):
+        """
+        后台预上传（每个线程独立 SSH 连接）：按就绪顺序取出文件，需要时先上传 ZIP，再交给主流程处理
+        process_queue 容量为 PIPELINE_UPLOAD_AHEAD，预上传最多领先主流程这么多个文件
+        上传成功的记为 UPLOADED，主流程随后跳过上传；失败的留给主流程重试
+        ready_queue 中的结束标记由取到的线程放回，供其他上传线程退出；最后退出的线程通知主流程
+        """
+        upload_ssh = None
+        
+        def forward(item) -> bool:
+            # 主流程已结束时放弃转交，避免阻塞
+            while not stop.is_set():
+                try:
+                    process_queue.put(item, timeout=0.5)
+                    return True
+                except Full:
+                    continue
+            return False
+        
+        try:
+            for stem, downloaded in iter(ready_queue.get, None):
+                if stop.is_set():
+                    return
+                upload = False
+                if downloaded:
+                    try:
+                        upload = should_upload(stem)
+                    except Exception as e:
+                        # 无法判断是否需要上传（如读取状态失败），记为失败，主流程不再处理
+                        logger.error(f"[{stem}] 上传前检查异常: {e}")
+                        self.result.log_error(stem, "上传", str(e))
+                        self.result.check_failed.append(stem)
+                        downloaded = False
+                if upload:
+                    try:
+                        if upload_ssh is None:
+                            upload_ssh = SSHClient(server)
+                            upload_ssh.connect()
+                        if upload_ssh.is_connected:
+                            local_zip = self.local_zip_dir / f"{stem}.zip"
+                            remote_zip = f"{server.zip_dir}/{stem}.zip"
+                            logger.info(f"[{stem}] ⬆ 后台上传ZIP...")
+                            if upload_ssh.upload_file(str(local_zip), remote_zip):
+                                drop_page_cache(local_zip)
+                                self.result.uploaded.append(stem)
+                                self.state_manager.update(stem, ProcessStatus.UPLOADED)
+                                logger.info(f"[{stem}] ✓ 后台上传完成")
+                            else:
+                                logger.warning(f"[{stem}] 后台上传失败，稍后重试")
+                    except Exception as e:
+                        logger.warning(f"[{stem}] 后台上传异常: {e}")
+                if not forward((stem, downloaded)):
+                    return
+            # 取到结束标记，放回给其他上传线程
+            ready_queue.put(None)
+        finally:
+            # 无论正常结束还是异常退出，最后退出的线程都通知主流程没有更多文件
+            if is_last_uploader():
+                forward(None)
+            if upload_ssh is not None:
+                upload_ssh.close()
+    
+    def _run_parallel(self, processor: RemoteProcessor, files: List[FileJob], 
                       state: Dict, workers: int):
         """全并行模式：使用连接池复用 SSH 连接"""
         progress = ProgressTracker(len(files), "并行处理")
-        pool = SSHConnectionPool(size=workers)
-        tracker = Tracker()
+        # run() 已通过主连接部署脚本，池中连接无需再部署
+        pool = SSHConnectionPool(size=workers, config=self.config, scripts_deployed=True)
         
         try:
-            with ThreadPoolExecutor(max_workers=workers) as executor:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline") as executor:
                 futures = {}
-                for json_file, stem in files:
+                for job in files:
                     future = executor.submit(
                         self._process_with_pool, 
-                        pool, json_file, stem, state
+                        pool, job.json_file, job.stem, state
                     )
-                    futures[future] = stem
+                    futures[future] = job.stem
                 
                 for future in as_completed(futures):
                     stem = futures[future]
@@ -495,7 +817,7 @@ class PipelineRunner:
                         success = future.result()
                         # 只在成功时同步飞书
                         if success:
-                            self._track_single_to_feishu(tracker, stem, silent=True)
+                            self._track_single_to_feishu(stem)
                         progress.update(success=success, name=stem)
                     except Exception as e:
                         logger.error(f"并行处理异常 {stem}: {e}")
@@ -506,36 +828,33 @@ class PipelineRunner:
         progress.summary()
     
     def _run_streaming(self, ssh: SSHClient, processor: RemoteProcessor,
-                       files: List[tuple], state: Dict):
-        """流式模式：下载一个处理一个，每完成一个立即同步飞书"""
+                       files: List[FileJob], state: Dict):
+        """流式模式：下载一个处理一个，每完成一个加入飞书同步队列"""
         progress = ProgressTracker(len(files), "流式处理")
-        tracker = Tracker()
         
         # 预计算需要下载和上传的文件
-        local_stems = set(f.stem for f in self.local_zip_dir.glob("*.zip"))
-        need_download_list = []
-        need_upload_list = []
+        local_stems = set(f.stem for f in list_files(self.local_zip_dir, ".zip"))
+        need_download_set = set()
+        need_upload_set = set()
         
-        for json_file, stem in files:
+        for job in files:
             # 规范化文件名用于查找ZIP
-            normalized_stem = normalize_zip_name(stem)
-            zip_name = f"{normalized_stem}.zip"
-            if zip_name not in state['zip_files'] and stem not in local_stems:
-                need_download_list.append(stem)
-            if zip_name not in state['zip_files']:
-                need_upload_list.append(stem)
+            if job.download_name not in state['zip_files']:
+                need_upload_set.add(job.stem)
+                if job.stem not in local_stems:
+                    need_download_set.add(job.stem)
         
         download_idx = 0
         upload_idx = 0
-        need_download_count = len(need_download_list)
-        need_upload_count = len(need_upload_list)
+        need_download_count = len(need_download_set)
+        need_upload_count = len(need_upload_set)
         
-        for json_file, stem in files:
-            zip_name = f"{stem}.zip"
+        for job in files:
+            stem = job.stem
             
             # 计算当前文件的进度索引
-            need_download = stem in need_download_list
-            need_upload = stem in need_upload_list
+            need_download = stem in need_download_set
+            need_upload = stem in need_upload_set
             
             if need_download:
                 download_idx += 1
@@ -549,10 +868,10 @@ class PipelineRunner:
                 current_idx = 0
                 total_count = 0
             
-            success = self._process_single(ssh, processor, json_file, stem, state, current_idx, total_count)
+            success = self._process_single(ssh, processor, job.json_file, stem, state, current_idx, total_count)
             # 只在成功时同步飞书
             if success:
-                self._track_single_to_feishu(tracker, stem, silent=True)
+                self._track_single_to_feishu(stem)
             progress.update(success=success, name=stem)
         
         progress.summary()
@@ -564,22 +883,27 @@ class PipelineRunner:
         # 使用原始文件名查找本地ZIP（下载器会保存为原始文件名）
         zip_name = f"{stem}.zip"
         local_zip = self.local_zip_dir / zip_name
+        # 服务器目录只取一次，后续远程路径均由局部变量拼接
         server = ssh.server
+        zip_dir, process_dir, final_dir = server.zip_dir, server.process_dir, server.final_dir
         
         # 检查服务器是否已有 ZIP 文件（可能带有 processed_ 前缀）
         server_has_zip = zip_name in state['zip_files']
-        actual_zip_name = state.get('zip_file_map', {}).get(zip_name, zip_name)
-        remote_zip = f"{server.zip_dir}/{actual_zip_name}"
+        actual_zip_name = state.get('zip_file_map', _EMPTY_MAP).get(zip_name, zip_name)
+        remote_zip = f"{zip_dir}/{actual_zip_name}"
         
         # 检查是否可以从中间状态恢复
         skip_download = self.state_manager.can_skip_download(stem)
         skip_upload = self.state_manager.can_skip_upload(stem)
         
         # 检查 process_dir 中是否已有解压的数据
-        in_processing = stem in state.get('processing_dirs', set())
+        in_processing = stem in state.get('processing_dirs', _EMPTY_SET)
         
-        # 检查本地文件是否存在（不验证完整性，避免卡顿）
-        local_exists = local_zip.exists() and local_zip.stat().st_size > 0
+        # 检查本地文件是否存在（不验证完整性，避免卡顿；直接 stat 一次，不先 exists 再 stat）
+        try:
+            local_exists = local_zip.stat().st_size > 0
+        except OSError:
+            local_exists = False
         
         try:
             # 步骤1: 下载ZIP（如果需要且调度器启用）
@@ -642,11 +966,14 @@ class PipelineRunner:
                     self.state_manager.update(stem, ProcessStatus.FAILED, "上传失败")
                     return False
                 print()
+                drop_page_cache(local_zip)
                 self.result.uploaded.append(stem)
                 self.state_manager.update(stem, ProcessStatus.UPLOADED)
             else:
                 if server_has_zip:
                     logger.info(f"[{stem}] ⏭ 跳过上传 (服务器已有)")
+                elif stem in self.result.uploaded:
+                    logger.info(f"[{stem}] ⏭ 跳过上传 (已在后台上传)")
                 elif skip_upload:
                     logger.info(f"[{stem}] ⏭ 跳过上传 (断点续传)")
             
@@ -655,19 +982,22 @@ class PipelineRunner:
                 logger.info(f"[{stem}] ⏭ 跳过解压 (调度器禁用)")
                 return True
             
-            data_dir = f"{server.process_dir}/{stem}"
+            data_dir = f"{process_dir}/{stem}"
             need_extract = True
+            kf_check = 0
             
             if in_processing:
-                # 目录已存在，验证数据完整性
+                # 目录已存在，验证数据完整性（优先使用 run 中批量获取的数量）
                 logger.info(f"[{stem}] 🔍 验证数据完整性...")
-                kf_check = processor.get_keyframe_count(data_dir)
+                kf_check = self._processing_counts.pop(stem, None)
+                if kf_check is None:
+                    kf_check = processor.get_keyframe_count(data_dir)
                 if kf_check > 0:
                     logger.info(f"[{stem}] ✓ 数据完整，跳过解压")
                     need_extract = False
                 else:
                     logger.warning(f"[{stem}] ✗ 数据不完整，重新解压")
-                    ssh.exec_command(f"rm -rf '{data_dir}'")
+                    ssh.exec_command(["rm", "-rf", data_dir])
             
             if need_extract:
                 # 尝试解压，失败时清理并重试一次
@@ -677,17 +1007,17 @@ class PipelineRunner:
                     if success:
                         break
                     
-                    # 解压失败
-                    if attempt < max_retries - 1:
+                    # 解压失败（解压前被拒绝的无需重试）
+                    if attempt < max_retries - 1 and not err.startswith(EARLY_REJECT_PREFIX):
                         # 还有重试机会，清理并重试
                         logger.warning(f"[{stem}] 解压失败 (尝试 {attempt + 1}/{max_retries}): {err[:100]}")
                         logger.info(f"[{stem}] 清理不完整数据并重试...")
-                        ssh.exec_command(f"rm -rf '{data_dir}'")
+                        ssh.exec_command(["rm", "-rf", data_dir])
                     else:
                         # 最后一次尝试也失败了
                         logger.error(f"[{stem}] 解压失败 ({max_retries}次尝试): {err}")
                         logger.info(f"[{stem}] 清理不完整的数据...")
-                        ssh.exec_command(f"rm -rf '{data_dir}'")
+                        ssh.exec_command(["rm", "-rf", data_dir])
                         self.result.log_error(stem, "处理", err)
                         self.result.check_failed.append(stem)
                         self.state_manager.update(stem, ProcessStatus.FAILED, err)
@@ -697,7 +1027,8 @@ class PipelineRunner:
             self.state_manager.update(stem, ProcessStatus.PROCESSED)
             
             # 步骤4: 检查标注质量（如果调度器启用）
-            kf = processor.get_keyframe_count(data_dir)
+            # 未重新解压时沿用完整性验证得到的数量
+            kf = processor.get_keyframe_count(data_dir) if need_extract else kf_check
             self.result.keyframe_counts[stem] = kf
             
             if not self.scheduler.should_run(PipelineStep.CHECK):
@@ -742,7 +1073,7 @@ class PipelineRunner:
                     logger.info(f"[{stem}] 💾 备份到NAS...")
                     backup_success, backup_msg = self.nas_backup.backup_data(
                         source_dir=dst,
-                        final_dir=server.final_dir,
+                        final_dir=final_dir,
                         data_name=stem
                     )
                     if backup_success:
@@ -777,35 +1108,25 @@ class PipelineRunner:
     def _process_with_pool(self, pool: SSHConnectionPool, json_file: Path, 
                            stem: str, state: Dict) -> bool:
         """使用连接池处理单个文件"""
-        ssh = None
+        conn = None
         try:
-            ssh = pool.get()
-            if not ssh or not ssh.is_connected:
+            conn = pool.get()
+            if not conn or not conn[0].is_connected:
                 self.result.log_error(stem, "连接", "无法获取SSH连接")
-                with self._lock:
-                    self.result.check_failed.append(stem)
+                self.result.check_failed.append(stem)
                 return False
             
-            processor = RemoteProcessor(ssh, self.config)
-            
-            # 线程安全的脚本部署（只部署一次）
-            with self._deploy_lock:
-                if not self._scripts_deployed:
-                    processor.deploy_scripts()
-                    self._scripts_deployed = True
-            
+            ssh, processor = conn
             return self._process_single(ssh, processor, json_file, stem, state)
         finally:
-            if ssh:
-                pool.put(ssh)
+            pool.put(conn)
     
     def _process_single_threaded(self, json_file: Path, stem: str, state: Dict) -> bool:
         """处理单个文件（独立SSH连接，用于并行模式）- 已弃用，保留兼容"""
         with SSHClient() as ssh:
             if not ssh.is_connected:
                 self.result.log_error(stem, "连接", "SSH连接失败")
-                with self._lock:
-                    self.result.check_failed.append(stem)
+                self.result.check_failed.append(stem)
                 return False
             
             processor = RemoteProcessor(ssh, self.config)
@@ -861,10 +1182,10 @@ class PipelineRunner:
                             print(f"    │    {line}")
                 print(f"    └─")
     
-    def _track_single_to_feishu(self, tracker: Tracker, stem: str, silent: bool = False):
-        """单个数据包完成后立即同步飞书（如果调度器启用）"""
+    def _track_single_to_feishu(self, stem: str):
+        """单个数据包完成后加入飞书同步队列（如果调度器启用），由后台线程攒批写入"""
         # 检查调度器是否启用飞书同步
-        if not self.scheduler.should_run(PipelineStep.FEISHU_SYNC):
+        if self._tracker is None or not self.scheduler.should_run(PipelineStep.FEISHU_SYNC):
             return
         
         try:
@@ -879,8 +1200,6 @@ class PipelineRunner:
                 uploaded=uploaded,
             )
             
-            result = tracker.track([record], str(self.json_dir), "configs/pipeline.yaml")
-            if result and not silent:
-                logger.info(f"飞书已同步: {stem}")
+            self._tracker.add(record)
         except Exception as e:
             logger.warning(f"飞书同步失败 {stem}: {e}")
@@ -2,15 +2,101 @@
 SSH 客户端模块
 封装 SSH/SFTP 操作，支持连接池和重试
 """
+import gzip
+import uuid
+import shlex
 import logging
+import threading
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import List, Optional, Sequence, Tuple, Union
 import paramiko
 
 from .config import ServerConfig, get_config
 
 logger = logging.getLogger(__name__)
 
+# 启用压缩传输时，内容不小于此大小才经 gzip 传输（小文件压缩收益不抵额外开销）
+GZIP_MIN_SIZE = 4096
+
+# 远程命令：shell 命令字符串，或参数列表（每个参数单独转义，无需手工加引号）
+Command = Union[str, Sequence[str]]
+
+
+def shell_join(argv: Sequence) -> str:
+    """把参数列表拼接为 shell 命令，每个参数单独转义"""
+    return " ".join(shlex.quote(str(arg)) for arg in argv)
+
+
+def _as_shell(cmd: Command) -> str:
+    return cmd if isinstance(cmd, str) else shell_join(cmd)
+
+
+class _ShellSession:
+    """
+    常驻的远程 sh 通道：多条命令复用同一个通道，省去每条命令打开新通道的往返
+    
+    每条命令在子 shell 中执行（命令中的 exit 不会结束会话），
+    执行结束后在 stdout/stderr 上各输出一行结束标记，stdout 的标记行带退出码。
+    """
+    
+    def __init__(self, transport: paramiko.Transport, timeout: int = 10):
+        self._channel = transport.open_session()
+        # 与单独执行命令时相同，使用用户的登录 shell 解释命令
+        self._channel.exec_command('exec "$SHELL"')
+        self._stdin = self._channel.makefile_stdin('wb')
+        self._stdout = self._channel.makefile('rb')
+        self._stderr = self._channel.makefile_stderr('rb')
+        self._marker = f"__ANNOTAPIPE_{uuid.uuid4().hex}__"
+        self.lock = threading.Lock()
+        # 确认 shell 能正确输出结束标记
+        if self.run("true", timeout)[0] != 0:
+            self.close()
+            raise RuntimeError("常驻 shell 不可用")
+    
+    @property
+    def alive(self) -> bool:
+        return not self._channel.closed and not self._channel.exit_status_ready()
+    
+    def run(self, cmd: str, timeout: int) -> Tuple[int, str, str]:
+        """执行命令，通道异常或超时时抛出异常（会话随即不可再用）"""
+        self._channel.settimeout(timeout)
+        marker = self._marker
+        self._stdin.write(
+            f"(\n{cmd}\n) </dev/null; printf '\\n%s %d\\n' {marker} $?; "
+            f"printf '\\n%s\\n' {marker} >&2\n".encode()
+        )
+        self._stdin.flush()
+        
+        out_lines = []
+        exit_status = None
+        while exit_status is None:
+            line = self._stdout.readline()
+            if not line:
+                raise EOFError("shell 通道已关闭")
+            text = line.decode()
+            if text.startswith(marker):
+                exit_status = int(text[len(marker):].strip())
+            else:
+                out_lines.append(text)
+        
+        err_lines = []
+        while True:
+            line = self._stderr.readline()
+            if not line:
+                raise EOFError("shell 通道已关闭")
+            text = line.decode()
+            if text.startswith(marker):
+                break
+            err_lines.append(text)
+        
+        return exit_status, "".join(out_lines).strip(), "".join(err_lines).strip()
+    
+    def close(self):
+        try:
+            self._channel.close()
+        except Exception:
+            pass
+
 
 class SSHClient:
     """SSH 客户端，封装常用操作"""
@@ -18,17 +104,41 @@ class SSHClient:
     def __init__(self, server: ServerConfig = None):
         self.server = server or get_config().get_available_server()
         self._ssh: Optional[paramiko.SSHClient] = None
+        # 复用其他客户端的传输通道时为 False，关闭时不断开底层连接
+        self._owns_transport = True
         self._sftp: Optional[paramiko.SFTPClient] = None
+        self._shell: Optional[_ShellSession] = None
+        self._shell_unsupported = False
+        self._shell_create_lock = threading.Lock()
     
     @property
     def is_connected(self) -> bool:
         return self._ssh is not None and self._ssh.get_transport() is not None
     
-    def connect(self, timeout: int = 10) -> bool:
-        """建立 SSH 连接"""
+    def connect(self, timeout: int = 10, share_with: "SSHClient" = None) -> bool:
+        """
+        建立 SSH 连接
+        
+        指定 share_with 时复用其 TCP 连接与认证，只在上面打开新的 SFTP/命令通道（省去握手与密钥交换），
+        复用失败时改为新建连接；share_with 关闭后本客户端随之断开
+        """
         if self.is_connected:
             return True
         
+        if share_with is not None and share_with.is_connected:
+            try:
+                self._ssh = share_with._ssh
+                self._owns_transport = False
+                self._sftp = self._ssh.open_sftp()
+                logger.debug(f"复用 SSH 连接: {self.server.ip}")
+                return True
+            except Exception as e:
+                # 如超出服务器 MaxSessions 限制
+                logger.debug(f"复用 SSH 连接失败，改为新建连接: {e}")
+                self._ssh = None
+                self._sftp = None
+        
+        self._owns_transport = True
         try:
             self._ssh = paramiko.SSHClient()
             self._ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -44,22 +154,66 @@ class SSHClient:
             logger.error(f"SSH 连接失败: {e}")
             self._ssh = None
             self._sftp = None
+            # 服务器可能已不可用，下次获取服务器时重新探测
+            get_config().invalidate_server_cache()
             return False
     
     def close(self):
         """关闭连接"""
+        if self._shell:
+            self._shell.close()
+            self._shell = None
         if self._sftp:
             self._sftp.close()
-        if self._ssh:
+        if self._ssh and self._owns_transport:
             self._ssh.close()
         self._ssh = None
         self._sftp = None
     
-    def exec_command(self, cmd: str, timeout: int = 60) -> Tuple[int, str, str]:
-        """执行远程命令"""
+    def _get_shell(self) -> Optional[_ShellSession]:
+        """获取常驻 shell 会话（不存在或已失效时重新创建），创建失败返回 None"""
+        shell = self._shell
+        if shell is not None and shell.alive:
+            return shell
+        with self._shell_create_lock:
+            if self._shell is not shell:
+                return self._shell
+            if self._shell_unsupported:
+                return None
+            try:
+                shell = _ShellSession(self._ssh.get_transport())
+            except Exception as e:
+                # 服务器不支持（如登录 shell 不兼容），此后一直单独打开通道执行
+                logger.debug(f"创建常驻 shell 失败: {e}")
+                self._shell_unsupported = True
+                return None
+            self._shell = shell
+            return shell
+    
+    def exec_command(self, cmd: Command, timeout: int = 60) -> Tuple[int, str, str]:
+        """
+        执行远程命令（cmd 可以是命令字符串或参数列表）
+        
+        优先复用常驻 shell 通道；会话正被其他线程占用或不可用时，单独打开一个通道执行
+        """
         if not self.is_connected:
             return -1, "", "Not connected"
         
+        cmd = _as_shell(cmd)
+        shell = self._get_shell()
+        if shell is not None and shell.lock.acquire(blocking=False):
+            try:
+                return shell.run(cmd, timeout)
+            except Exception as e:
+                # 会话状态未知（超时或通道断开），丢弃后由下一条命令重建
+                logger.debug(f"常驻 shell 执行失败: {e}")
+                shell.close()
+                if self._shell is shell:
+                    self._shell = None
+                return -1, "", str(e) or type(e).__name__
+            finally:
+                shell.lock.release()
+        
         try:
             stdin, stdout, stderr = self._ssh.exec_command(cmd, timeout=timeout)
             exit_status = stdout.channel.recv_exit_status()
@@ -69,6 +223,40 @@ class SSHClient:
         except Exception as e:
             return -1, "", str(e)
     
+    def exec_command_with_stdin(self, cmd: Command, stdin_bytes: bytes,
+                                timeout: int = 60) -> Tuple[int, str, str]:
+        """执行远程命令，并把 stdin_bytes 写入其标准输入（写完后发送 EOF）"""
+        if not self.is_connected:
+            return -1, "", "Not connected"
+        
+        try:
+            stdin, stdout, stderr = self._ssh.exec_command(_as_shell(cmd), timeout=timeout)
+            stdin.write(stdin_bytes)
+            stdin.flush()
+            stdin.channel.shutdown_write()
+            exit_status = stdout.channel.recv_exit_status()
+            out = stdout.read().decode().strip()
+            err = stderr.read().decode().strip()
+            return exit_status, out, err
+        except Exception as e:
+            return -1, "", str(e)
+    
+    def start_process(self, cmd: Command, timeout: int = 60):
+        """
+        启动长驻远程进程，返回 (stdin, stdout) 文件对象，失败返回 None
+        
+        timeout 为单次读写超时；连接关闭时远程进程收到 EOF 自行退出
+        """
+        if not self.is_connected:
+            return None
+        
+        try:
+            stdin, stdout, _ = self._ssh.exec_command(_as_shell(cmd), timeout=timeout)
+            return stdin, stdout
+        except Exception as e:
+            logger.debug(f"启动远程进程失败: {e}")
+            return None
+    
     def upload_file(self, local_path: str, remote_path: str, 
                     progress_callback=None, verify: bool = True,
                     resume: bool = True, chunk_size: int = 32 * 1024 * 1024) -> bool:
@@ -183,21 +371,21 @@ class SSHClient:
                     logger.info(f"   计算远程 MD5...")
                     verify_start = time.time()
                     status, remote_partial_md5, err = self.exec_command(
-                        f"md5sum '{temp_path}' | cut -d' ' -f1",
+                        f"md5sum {shlex.quote(temp_path)} | cut -d' ' -f1",
                         timeout=3600
                     )
                     
                     if status != 0:
                         logger.warning(f"⚠️ 远程 MD5 计算失败: {err}")
                         logger.warning(f"⚠️ 将删除临时文件，重新上传")
-                        self.exec_command(f"rm -f '{temp_path}'")
+                        self.exec_command(["rm", "-f", temp_path])
                         uploaded_size = 0
                     elif remote_partial_md5.strip() != local_partial_md5:
                         logger.warning(f"⚠️ MD5 不匹配!")
                         logger.warning(f"   本地: {local_partial_md5}")
                         logger.warning(f"   远程: {remote_partial_md5.strip()}")
                         logger.warning(f"⚠️ 将删除临时文件，重新上传")
-                        self.exec_command(f"rm -f '{temp_path}'")
+                        self.exec_command(["rm", "-f", temp_path])
                         uploaded_size = 0
                     else:
                         logger.info(f"✅ 已上传部分校验通过 (耗时 {time.time() - verify_start:.1f}秒)")
@@ -281,7 +469,7 @@ class SSHClient:
                 logger.info(f"   计算远程 MD5...")
                 md5_start = time.time()
                 status, remote_md5, err = self.exec_command(
-                    f"md5sum '{temp_path}' | cut -d' ' -f1", 
+                    f"md5sum {shlex.quote(temp_path)} | cut -d' ' -f1", 
                     timeout=7200  # 40GB 文件可能需要较长时间
                 )
                 
@@ -298,19 +486,14 @@ class SSHClient:
                     logger.error(f"   本地: {local_md5}")
                     logger.error(f"   远程: {remote_md5}")
                     # MD5 不匹配说明数据损坏，删除临时文件
-                    self.exec_command(f"rm -f '{temp_path}'")
+                    self.exec_command(["rm", "-f", temp_path])
                     raise Exception(f"最终 MD5 校验失败: 数据损坏，本地 {local_md5}, 远程 {remote_md5}")
                 
                 logger.info(f"✅ 完整性验证通过!")
             
-            # 如果目标文件已存在，先删除
-            if self.file_exists(remote_path):
-                logger.info(f"🗑️ 删除已存在的目标文件...")
-                self.exec_command(f"rm -f '{remote_path}'")
-            
-            # 重命名为正式文件（原子操作）
+            # 重命名为正式文件（原子操作，目标文件已存在时直接覆盖）
             logger.info(f"📝 重命名临时文件为正式文件...")
-            status, _, err = self.exec_command(f"mv '{temp_path}' '{remote_path}'")
+            status, _, err = self.exec_command(["mv", "-f", temp_path, remote_path])
             if status != 0:
                 logger.error(f"❌ 重命名失败: {err}")
                 raise Exception(f"重命名失败: {err}")
@@ -324,20 +507,19 @@ class SSHClient:
                 logger.info(f"💾 保留临时文件以便断点续传: {temp_path}")
             else:
                 logger.info(f"🗑️ 清理临时文件...")
-                self.exec_command(f"rm -f '{temp_path}'")
+                self.exec_command(["rm", "-f", temp_path])
             logger.error(f"❌ 上传失败: {filename} - {e}")
             return False
     
     def cleanup_uploading_files(self, remote_dir: str) -> int:
-        """清理指定目录下的 .uploading 临时文件"""
-        status, out, _ = self.exec_command(f"ls {remote_dir}/*.uploading 2>/dev/null || true")
-        if not out:
-            return 0
-        
-        files = [f.strip() for f in out.splitlines() if f.strip()]
+        """清理指定目录下的 .uploading 临时文件（查找和删除合并为一次远程调用），返回实际删除的数量"""
+        # -delete 成功时才执行 -printf，输出的只有确实删除的文件
+        status, out, _ = self.exec_command(
+            f"find {shlex.quote(remote_dir)} -maxdepth 1 -type f -name '*.uploading' -delete -printf '%f\\n' 2>/dev/null"
+        )
+        files = [f for f in out.splitlines() if f.strip()]
         for f in files:
-            self.exec_command(f"rm -f '{f}'")
-            logger.info(f"🧹 清理残留临时文件: {Path(f).name}")
+            logger.info(f"🧹 清理残留临时文件: {f}")
         return len(files)
     
     def download_file(self, remote_path: str, local_path: str,
@@ -440,7 +622,7 @@ class SSHClient:
                 logger.info(f"   计算远程 MD5...")
                 verify_start = time.time()
                 status, remote_partial_md5, err = self.exec_command(
-                    f"head -c {downloaded_size} '{remote_path}' | md5sum | cut -d' ' -f1",
+                    f"head -c {downloaded_size} {shlex.quote(remote_path)} | md5sum | cut -d' ' -f1",
                     timeout=3600
                 )
                 
@@ -532,7 +714,7 @@ class SSHClient:
                 logger.info(f"   计算远程 MD5...")
                 md5_start = time.time()
                 status, remote_md5, err = self.exec_command(
-                    f"md5sum '{remote_path}' | cut -d' ' -f1",
+                    f"md5sum {shlex.quote(remote_path)} | cut -d' ' -f1",
                     timeout=7200
                 )
                 
@@ -584,19 +766,34 @@ class SSHClient:
     
     def file_exists(self, remote_path: str) -> bool:
         """检查远程文件是否存在"""
-        status, out, _ = self.exec_command(f"test -e '{remote_path}' && echo exists")
-        return 'exists' in out
+        status, _, _ = self.exec_command(["test", "-e", remote_path])
+        return status == 0
     
     def dir_exists(self, remote_path: str) -> bool:
         """检查远程目录是否存在"""
-        status, out, _ = self.exec_command(f"test -d '{remote_path}' && echo exists")
-        return 'exists' in out
+        status, _, _ = self.exec_command(["test", "-d", remote_path])
+        return status == 0
     
     def mkdir_p(self, remote_path: str) -> bool:
         """创建远程目录（递归）"""
-        status, _, _ = self.exec_command(f"mkdir -p '{remote_path}'")
+        status, _, _ = self.exec_command(["mkdir", "-p", remote_path])
         return status == 0
     
+    def exec_batch(self, cmds: List[str], timeout: int = 60) -> List[str]:
+        """
+        在一次远程调用中依次执行多条命令，返回各命令的标准输出（顺序与 cmds 一致）
+        
+        各命令输出之间用分隔标记隔开；单条命令失败不影响其余命令，调用失败时全部返回空字符串
+        """
+        marker = "===ANNOTAPIPE_BATCH==="
+        script = "; ".join(f"echo '{marker}'; {{ {cmd}; }}" for cmd in cmds)
+        status, out, _ = self.exec_command(script, timeout=timeout)
+        if status == -1:
+            return [""] * len(cmds)
+        parts = out.split(marker)[1:]
+        parts += [""] * (len(cmds) - len(parts))
+        return [part.strip() for part in parts[:len(cmds)]]
+    
     def list_files(self, remote_dir: str, pattern: str = "*") -> list:
         """列出远程目录中的文件"""
         status, out, _ = self.exec_command(f"ls {remote_dir}/{pattern} 2>/dev/null || true")
@@ -611,23 +808,68 @@ class SSHClient:
             return []
         return [Path(d.strip().rstrip('/')).name for d in out.splitlines() if d.strip()]
     
-    def write_file(self, remote_path: str, content: str):
-        """写入远程文件"""
+    def write_file(self, remote_path: str, content: Union[str, bytes], compress: bool = False):
+        """
+        写入远程文件（支持 str 或 bytes）
+        compress=True 且内容较大时 gzip 压缩后经标准输入传输、远程解压写入，失败时回退到 SFTP
+        """
         if not self.is_connected:
             return
+        if compress and len(content) >= GZIP_MIN_SIZE:
+            data = content.encode() if isinstance(content, str) else content
+            status, _, err = self.exec_command_with_stdin(
+                f"gzip -dc > {shlex.quote(remote_path)}", gzip.compress(data)
+            )
+            if status == 0:
+                return
+            logger.debug(f"压缩写入失败，回退到 SFTP: {err}")
         with self._sftp.file(remote_path, 'w') as f:
             f.write(content)
     
-    def read_file(self, remote_path: str) -> Optional[str]:
-        """读取远程文件"""
+    def file_size(self, remote_path: str) -> Optional[int]:
+        """获取远程文件大小（SFTP stat），文件不存在或获取失败返回 None"""
+        if not self.is_connected:
+            return None
+        try:
+            return self._sftp.stat(remote_path).st_size
+        except Exception:
+            return None
+    
+    def _read_gzipped(self, remote_path: str, timeout: int = 60) -> Optional[bytes]:
+        """远程 gzip 压缩后读取并在本地解压，失败返回 None"""
+        try:
+            _, stdout, _ = self._ssh.exec_command(f"gzip -c -- {shlex.quote(remote_path)}", timeout=timeout)
+            data = stdout.read()
+            if stdout.channel.recv_exit_status() != 0:
+                return None
+            return gzip.decompress(data)
+        except Exception as e:
+            logger.debug(f"压缩读取失败: {e}")
+            return None
+    
+    def read_bytes(self, remote_path: str, compress: bool = False) -> Optional[bytes]:
+        """
+        读取远程文件内容，失败返回 None
+        compress=True 时远程 gzip 压缩后传输（适合较大的文本文件），失败时回退到 SFTP
+        """
         if not self.is_connected:
             return None
+        if compress:
+            data = self._read_gzipped(remote_path)
+            if data is not None:
+                return data
         try:
-            with self._sftp.file(remote_path, 'r') as f:
-                return f.read().decode() if hasattr(f.read(), 'decode') else f.read()
+            with self._sftp.file(remote_path, 'rb') as f:
+                f.prefetch()
+                return f.read()
         except Exception:
             return None
     
+    def read_file(self, remote_path: str, compress: bool = False) -> Optional[str]:
+        """读取远程文件"""
+        data = self.read_bytes(remote_path, compress=compress)
+        return data.decode() if data is not None else None
+    
     def __enter__(self):
         self.connect()
         return self
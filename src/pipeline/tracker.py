@@ -5,7 +5,9 @@
 import os
 import time
 import logging
+import threading
 from pathlib import Path
+from queue import Queue, Empty
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from datetime import datetime
@@ -15,8 +17,18 @@ import re
 import yaml
 import requests
 
+from .config import YamlLoader, clear_env_cache
+
 logger = logging.getLogger(__name__)
 
+# 飞书批量写入：每批最多记录数，以及相邻两批请求的最小间隔（秒）
+FEISHU_BATCH_SIZE = 500
+FEISHU_BATCH_INTERVAL = 0.5
+
+# 流水线逐条追踪时攒批：攒够多少条记录，或第一条记录等待多久（秒）后写入一次
+TRACK_BATCH_SIZE = 16
+TRACK_FLUSH_INTERVAL = 5.0
+
 
 def _extract_text_value(value) -> str:
     """从飞书字段值中提取纯文本（处理复杂对象格式）"""
@@ -65,6 +77,7 @@ def _load_env_file(env_path: str = "configs/.env"):
                     os.environ[key] = value
     except Exception:
         pass
+    clear_env_cache()
 
 
 @dataclass
@@ -140,6 +153,10 @@ class FeishuTracker(BaseTracker):
         self._available = False
         self._records_cache: Optional[Dict[str, Dict]] = None  # 缓存所有记录
         self._cache_time: Optional[float] = None
+        # 复用 HTTPS 连接（keep-alive），分页读取和分批写入不再每次重新握手
+        self._session = requests.Session()
+        # 上一次批量写入请求的发出时间，用于控制写入频率
+        self._last_batch_time = 0.0
         self._init_config()
     
     def _init_config(self):
@@ -153,7 +170,7 @@ class FeishuTracker(BaseTracker):
                 return
             
             with open(self.config_path, 'r', encoding='utf-8') as f:
-                self.config = yaml.safe_load(f) or {}
+                self.config = yaml.load(f, Loader=YamlLoader) or {}
             
             # 从环境变量获取敏感信息
             self.config['app_id'] = os.environ.get('FEISHU_APP_ID', '')
@@ -186,7 +203,7 @@ class FeishuTracker(BaseTracker):
         }
         
         try:
-            r = requests.post(url, json=payload, timeout=10)
+            r = self._session.post(url, json=payload, timeout=10)
             data = r.json()
             if data.get('code') == 0:
                 self._token = data.get('tenant_access_token')
@@ -241,7 +258,7 @@ class FeishuTracker(BaseTracker):
                 for attempt in range(2):
                     try:
                         headers = self._get_headers(force_refresh=(attempt > 0))
-                        r = requests.get(url, params=params, headers=headers, timeout=30)
+                        r = self._session.get(url, params=params, headers=headers, timeout=30)
                         data = r.json()
                         
                         # 检查是否是token失效错误
@@ -314,6 +331,13 @@ class FeishuTracker(BaseTracker):
         logger.debug(f"  ✗ 未找到: {name} (将新增)")
         return None
     
+    def _pace_batch(self):
+        """距上一批写入请求不足 FEISHU_BATCH_INTERVAL 时等待剩余时间（请求本身耗时已计入间隔）"""
+        wait = self._last_batch_time + FEISHU_BATCH_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_batch_time = time.monotonic()
+    
     def _batch_create_records(self, records_fields: List[Dict]) -> tuple:
         """批量创建记录，返回 (创建数量, 创建的记录列表)"""
         if not records_fields:
@@ -329,7 +353,7 @@ class FeishuTracker(BaseTracker):
         for attempt in range(2):
             try:
                 headers = self._get_headers(force_refresh=(attempt > 0))
-                r = requests.post(url, json=payload, headers=headers, timeout=30)
+                r = self._session.post(url, json=payload, headers=headers, timeout=30)
                 data = r.json()
                 
                 # 检查是否是token失效错误
@@ -375,7 +399,7 @@ class FeishuTracker(BaseTracker):
         for attempt in range(2):
             try:
                 headers = self._get_headers(force_refresh=(attempt > 0))
-                r = requests.post(url, json=payload, headers=headers, timeout=30)
+                r = self._session.post(url, json=payload, headers=headers, timeout=30)
                 data = r.json()
                 logger.debug(f"📝 更新响应: code={data.get('code')}, msg={data.get('msg', 'OK')}")
                 
@@ -417,7 +441,7 @@ class FeishuTracker(BaseTracker):
                 return "上传data02/dataset/scenesnew"
             
             with open(config_path, 'r', encoding='utf-8') as f:
-                pipeline_config = yaml.safe_load(f) or {}
+                pipeline_config = yaml.load(f, Loader=YamlLoader) or {}
             
             # 获取第一个启用的服务器的 final_dir
             servers = pipeline_config.get('servers', [])
@@ -539,12 +563,13 @@ class FeishuTracker(BaseTracker):
                 to_create.append(fields)
                 created_names.append(rec.name)
         
-        # 执行批量操作（飞书限制每批 500 条）
+        # 执行批量操作（飞书限制每批 500 条；同一表不支持并发写入，各批依次发送并控制频率）
         created_count = 0
         updated_count = 0
         
-        for i in range(0, len(to_create), 500):
-            batch = to_create[i:i+500]
+        for i in range(0, len(to_create), FEISHU_BATCH_SIZE):
+            batch = to_create[i:i + FEISHU_BATCH_SIZE]
+            self._pace_batch()
             count, created_records = self._batch_create_records(batch)
             created_count += count
             # 更新缓存，避免后续重复创建
@@ -555,14 +580,11 @@ class FeishuTracker(BaseTracker):
                         'record_id': rec.get('record_id'),
                         'fields': rec.get('fields', {})
                     }
-            if i + 500 < len(to_create):
-                time.sleep(0.5)
         
-        for i in range(0, len(to_update), 500):
-            batch = to_update[i:i+500]
+        for i in range(0, len(to_update), FEISHU_BATCH_SIZE):
+            batch = to_update[i:i + FEISHU_BATCH_SIZE]
+            self._pace_batch()
             updated_count += self._batch_update_records(batch)
-            if i + 500 < len(to_update):
-                time.sleep(0.5)
         
         logger.info(f"✅ 飞书更新: 新增 {created_count}, 更新 {updated_count}")
         
@@ -595,6 +617,75 @@ class Tracker:
         return []
 
 
+class BatchTracker:
+    """
+    批量追踪器：add() 只把记录放入队列，由单个后台线程攒批后调用 Tracker.track
+    
+    每次 track 都要重新读取整张表再写入，逐条同步时每个文件一次往返；攒批后每批一次。
+    Tracker 只在后台线程中使用，无需考虑线程安全；close() 写入剩余记录并等待线程结束
+    """
+    
+    def __init__(self, tracker: Tracker, json_dir: str = None,
+                 pipeline_config_path: str = "configs/pipeline.yaml",
+                 batch_size: int = TRACK_BATCH_SIZE, flush_interval: float = TRACK_FLUSH_INTERVAL):
+        self.tracker = tracker
+        self.json_dir = json_dir
+        self.pipeline_config_path = pipeline_config_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # 待写入记录，None 表示结束
+        self._queue: Queue = Queue()
+        self._thread = threading.Thread(target=self._run, name="tracker", daemon=True)
+        self._thread.start()
+    
+    def add(self, record: TrackingRecord):
+        """加入待同步记录（线程安全，立即返回）"""
+        self._queue.put(record)
+    
+    def close(self):
+        """写入剩余记录并等待后台线程结束"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+    
+    def _run(self):
+        pending: List[TrackingRecord] = []
+        deadline = 0.0
+        done = False
+        while not done:
+            try:
+                # 有待写入记录时最多等到截止时间，否则一直等待
+                timeout = max(0.0, deadline - time.monotonic()) if pending else None
+                record = self._queue.get(timeout=timeout)
+                if record is None:
+                    done = True
+                else:
+                    if not pending:
+                        deadline = time.monotonic() + self.flush_interval
+                    pending.append(record)
+                    if len(pending) < self.batch_size:
+                        continue
+            except Empty:
+                pass
+            if pending:
+                self._flush(pending)
+                pending = []
+    
+    def _flush(self, records: List[TrackingRecord]):
+        try:
+            self.tracker.track(records, self.json_dir, self.pipeline_config_path)
+            logger.info(f"飞书已同步 {len(records)} 条记录")
+        except Exception as e:
+            names = ", ".join(rec.name for rec in records)
+            logger.warning(f"飞书同步失败 ({names}): {e}")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
 def create_tracking_records(result, keyframe_counts: Dict[str, int]) -> List[TrackingRecord]:
     """从 PipelineResult 创建追踪记录"""
     records = []
@@ -609,17 +700,22 @@ def create_tracking_records(result, keyframe_counts: Dict[str, int]) -> List[Tra
     all_names.update(result.moved_to_final)
     all_names.update(result.skipped_server_exists)
     
+    # 先转为集合：result 的字段可能是普通列表，逐个名称判断时避免线性查找
+    passed = set(result.check_passed) | set(result.skipped_server_exists)
+    failed = set(result.check_failed)
+    uploaded_names = set(result.moved_to_final) | set(result.skipped_server_exists)
+    
     for name in sorted(all_names):
         # 确定标注状态
-        if name in result.check_passed or name in result.skipped_server_exists:
+        if name in passed:
             status = "已完成"
-        elif name in result.check_failed:
+        elif name in failed:
             status = "检查不通过"
         else:
             status = "已完成"
         
         # 是否已上传
-        uploaded = name in result.moved_to_final or name in result.skipped_server_exists
+        uploaded = name in uploaded_names
         
         records.append(TrackingRecord(
             name=name,
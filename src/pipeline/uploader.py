@@ -8,6 +8,7 @@ from typing import Dict, List, Set, Tuple
 
 from .ssh_client import SSHClient
 from .config import get_config
+from .utils import drop_page_cache
 
 logger = logging.getLogger(__name__)
 
@@ -59,6 +60,8 @@ class Uploader:
         )
         
         if success:
+            # 上传完成后本地 ZIP 不会再被读取
+            drop_page_cache(local_path)
             return True, ""
         else:
             return False, "上传失败（临时文件已保留，下次可断点续传）"
@@ -104,19 +107,12 @@ class Uploader:
         """
         server = self.ssh.server
         
-        status, out, _ = self.ssh.exec_command(
-            f"ls {server.zip_dir}/*.uploading 2>/dev/null || true"
-        )
+        # 查找并删除合并为一次远程调用，只有确实删除了文件时才提示断点续传失效
+        count = self.ssh.cleanup_uploading_files(server.zip_dir)
+        if not count:
+            logger.debug("没有需要清理的临时文件")
+            return
         
-        if out:
-            uploading_files = [f.strip() for f in out.splitlines() if f.strip()]
-            if uploading_files:
-                if not force:
-                    logger.warning(f"⚠️ 即将清理 {len(uploading_files)} 个临时文件，这会破坏断点续传功能！")
-                logger.info(f"🧹 发现 {len(uploading_files)} 个未完成的上传，正在清理...")
-                for f in uploading_files:
-                    self.ssh.exec_command(f"rm -f '{f}'")
-                    logger.info(f"  已删除: {Path(f).name}")
-                logger.info(f"✅ 清理完成")
-        else:
-            logger.info(f"✅ 没有需要清理的临时文件")
+        if not force:
+            logger.warning(f"⚠️ 已清理 {count} 个未完成上传的临时文件，这些文件无法再断点续传！")
+        logger.info(f"✅ 清理完成: {count} 个未完成的上传")
@@ -1,8 +1,18 @@
 """
 工具函数
 """
+import os
 import re
-from typing import List
+import sys
+import errno
+import ctypes
+import ctypes.util
+from pathlib import Path
+from typing import List, Union
+
+# 预编译的文件名后缀模式
+_RERE_SUFFIX = re.compile(r'_rere_\d+$')
+_INDEX_RERE_SUFFIX = re.compile(r'_\d{1,2}_rere_\d+$')
 
 
 def normalize_zip_name(stem: str) -> str:
@@ -21,7 +31,7 @@ def normalize_zip_name(stem: str) -> str:
         规范化后的文件名
     """
     # 移除 _rere_数字 等后缀
-    normalized = re.sub(r'_rere_\d+$', '', stem)
+    normalized = _RERE_SUFFIX.sub('', stem)
     # 可以根据需要添加更多模式
     # normalized = re.sub(r'_v\d+$', '', normalized)  # 移除 _v1, _v2 等
     return normalized
@@ -48,14 +58,14 @@ def get_zip_name_candidates(stem: str) -> List[str]:
     seen = set()  # 用于去重
     
     # 策略1: 只移除 _rere_数字 后缀
-    candidate1 = re.sub(r'_rere_\d+$', '', stem)
+    candidate1 = _RERE_SUFFIX.sub('', stem)
     if candidate1 not in seen:
         candidates.append(f"{candidate1}.zip")
         seen.add(candidate1)
     
     # 策略2: 移除 _单/双位数字_rere_数字 后缀（如 _1_rere_1）
     # 限制为1-2位数字，避免匹配时间戳部分
-    candidate2 = re.sub(r'_\d{1,2}_rere_\d+$', '', stem)
+    candidate2 = _INDEX_RERE_SUFFIX.sub('', stem)
     if candidate2 not in seen and candidate2 != stem:
         candidates.append(f"{candidate2}.zip")
         seen.add(candidate2)
@@ -65,3 +75,70 @@ def get_zip_name_candidates(stem: str) -> List[str]:
         candidates.append(f"{stem}.zip")
     
     return candidates
+
+
+def list_files(directory: Union[str, Path], suffix: str) -> List[Path]:
+    """
+    列出目录下指定后缀的文件（不递归）
+    
+    使用 os.scandir：文件类型来自目录项缓存，不必像 Path.glob 那样逐个 stat，
+    文件很多或位于网络挂载目录时明显更快。目录不存在或无法读取时返回空列表
+    
+    Args:
+        directory: 目录
+        suffix: 文件后缀，如 ".json"
+    
+    Returns:
+        文件路径列表
+    """
+    try:
+        with os.scandir(directory) as it:
+            return [Path(entry.path) for entry in it
+                    if entry.name.endswith(suffix) and entry.is_file()]
+    except OSError:
+        return []
+
+
+def drop_page_cache(path: Union[str, Path]):
+    """
+    通知内核丢弃文件的页缓存（文件不会再被读取时调用，如 ZIP 上传完成后），
+    避免大文件挤占其他进程的缓存。不支持 posix_fadvise 的平台上不做任何事。
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# fallocate(2) 的 FALLOC_FL_KEEP_SIZE：只预留磁盘空间，不改变文件大小
+_FALLOC_FL_KEEP_SIZE = 0x01
+_libc_fallocate = None
+if sys.platform.startswith('linux'):
+    try:
+        _libc_fallocate = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True).fallocate
+        _libc_fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+        _libc_fallocate.restype = ctypes.c_int
+    except (OSError, AttributeError):
+        _libc_fallocate = None
+
+
+def preallocate_file(fd: int, offset: int, length: int):
+    """
+    为文件 [offset, offset+length) 预留连续磁盘空间，减少边下载边分配导致的碎片。
+    文件大小保持不变，追加写入和断点续传不受影响；磁盘空间不足时立即抛出 OSError，
+    文件系统或平台不支持时不做任何事。
+    """
+    if _libc_fallocate is None or length <= 0:
+        return
+    if _libc_fallocate(fd, _FALLOC_FL_KEEP_SIZE, offset, length) != 0:
+        err = ctypes.get_errno()
+        if err == errno.ENOSPC:
+            raise OSError(err, os.strerror(err))
@@ -11,10 +11,21 @@ import sys
 import json
 import math
 import argparse
+from operator import itemgetter
 import yaml
 import numpy as np
 from pathlib import Path
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 def get_euler_angles(q):
     """四元数转欧拉角 (返回弧度)"""
@@ -57,9 +68,160 @@ def transform_to_world(pos_ego, ins_entry):
     return R_ego @ np.array(pos_ego) + ego_utm
 
 
+def quaternions_to_rotation_matrices(q):
+    """批量四元数转旋转矩阵，q 为 (N, 4) 的 [w, x, y, z]，返回 (N, 3, 3)"""
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    R = np.empty((len(q), 3, 3))
+    R[:, 0, 0] = 1 - 2*(y*y + z*z)
+    R[:, 0, 1] = 2*(x*y - w*z)
+    R[:, 0, 2] = 2*(x*z + w*y)
+    R[:, 1, 0] = 2*(x*y + w*z)
+    R[:, 1, 1] = 1 - 2*(x*x + z*z)
+    R[:, 1, 2] = 2*(y*z - w*x)
+    R[:, 2, 0] = 2*(x*z - w*y)
+    R[:, 2, 1] = 2*(y*z + w*x)
+    R[:, 2, 2] = 1 - 2*(x*x + y*y)
+    return R
+
+
+def build_track_arrays(track_data, frame_to_ins):
+    """
+    将轨迹转换为 SoA 数组
+    
+    Returns:
+        positions: (N, 2) 世界坐标系（无 INS 时为自车坐标系）下的 xy 位置
+        rotations: (N, 4) 对象四元数，无效行为 0
+        rot_valid: (N,) 四元数是否有效
+        azimuths: (N,) 自车航向角(弧度)，无 INS 时为 0
+    """
+    n = len(track_data)
+    use_world = len(frame_to_ins) > 0
+    
+    translations = np.zeros((n, 3))
+    rotations = np.zeros((n, 4))
+    rot_valid = np.zeros(n, dtype=bool)
+    ego_utm = np.zeros((n, 3))
+    ego_quat = np.tile([1.0, 0.0, 0.0, 0.0], (n, 1))
+    azimuths = np.zeros(n)
+    
+    for i, (frame_idx, obj) in enumerate(track_data):
+        translations[i] = obj.get('translation', [0, 0, 0])
+        rotation = obj.get('rotation', [])
+        if len(rotation) == 4:
+            rotations[i] = rotation
+            rot_valid[i] = True
+        ins = frame_to_ins.get(frame_idx)
+        if use_world and ins:
+            ego_utm[i] = (ins.get('utm_x', 0), ins.get('utm_y', 0), ins.get('utm_z', 0))
+            ego_quat[i] = (
+                ins.get('quaternion_w', 1),
+                ins.get('quaternion_x', 0),
+                ins.get('quaternion_y', 0),
+                ins.get('quaternion_z', 0),
+            )
+            azimuths[i] = math.radians(ins.get('azimuth', 0))
+    
+    # 自车坐标系 -> 世界坐标系（无 INS 的帧为单位旋转 + 零平移，即保持自车坐标）
+    R_ego = quaternions_to_rotation_matrices(ego_quat)
+    positions = np.einsum('nij,nj->ni', R_ego, translations) + ego_utm
+    
+    return positions[:, :2], rotations, rot_valid, azimuths
+
+
+def _heading_kernel_numpy(positions, rotations, rot_valid, azimuths, window_size):
+    """
+    朝向检查数值核心（NumPy 向量化版本）
+    
+    Returns:
+        diff_abs: (N,) 运动方向与对象朝向的夹角(弧度)
+        local_displacement: (N,) 滑动窗口内的局部位移
+        flagged: (N,) 是否为朝向异常帧
+    """
+    n = len(positions)
+    idx = np.arange(n)
+    start_idx = np.maximum(0, idx - window_size)
+    end_idx = np.minimum(n - 1, idx + window_size)
+    
+    motion_vec = positions[end_idx] - positions[start_idx]
+    local_displacement = np.linalg.norm(motion_vec, axis=1)
+    
+    # 有效帧：四元数有效、窗口足够、局部位移不太小（短暂停车或低速跳过）
+    valid = rot_valid & (end_idx - start_idx >= 2) & (local_displacement >= 0.3)
+    
+    # 运动方向与对象朝向（yaw 公式同 get_euler_angles）
+    motion_yaw = np.arctan2(motion_vec[:, 1], motion_vec[:, 0])
+    w, x, y, z = rotations[:, 0], rotations[:, 1], rotations[:, 2], rotations[:, 3]
+    obj_yaw = np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z)) + azimuths
+    
+    # 计算角度差并归一化到 [-pi, pi)
+    diff = np.mod(motion_yaw - obj_yaw + math.pi, 2 * math.pi) - math.pi
+    diff_abs = np.abs(diff)
+    
+    # 判断：正向（<60°）、倒车（~180°±60°）、或异常
+    is_forward = diff_abs < 1.05  # ~60度
+    is_backward = np.abs(diff_abs - math.pi) < 1.05  # 倒车
+    flagged = valid & ~is_forward & ~is_backward
+    
+    return diff_abs, local_displacement, flagged
+
+
+def _heading_kernel_loop(positions, rotations, rot_valid, azimuths, window_size):
+    """朝向检查数值核心（逐帧循环版本，供 Numba 编译，结果与 NumPy 版本一致）"""
+    n = positions.shape[0]
+    diff_abs = np.zeros(n)
+    local_displacement = np.zeros(n)
+    flagged = np.zeros(n, dtype=np.bool_)
+    
+    for i in range(n):
+        start_idx = max(0, i - window_size)
+        end_idx = min(n - 1, i + window_size)
+        
+        dx = positions[end_idx, 0] - positions[start_idx, 0]
+        dy = positions[end_idx, 1] - positions[start_idx, 1]
+        disp = math.sqrt(dx * dx + dy * dy)
+        local_displacement[i] = disp
+        
+        w = rotations[i, 0]
+        x = rotations[i, 1]
+        y = rotations[i, 2]
+        z = rotations[i, 3]
+        obj_yaw = math.atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z)) + azimuths[i]
+        
+        diff = (math.atan2(dy, dx) - obj_yaw + math.pi) % (2 * math.pi) - math.pi
+        d = abs(diff)
+        diff_abs[i] = d
+        
+        if not rot_valid[i] or end_idx - start_idx < 2 or disp < 0.3:
+            continue
+        
+        is_forward = d < 1.05
+        is_backward = abs(d - math.pi) < 1.05
+        flagged[i] = not is_forward and not is_backward
+    
+    return diff_abs, local_displacement, flagged
+
+
+# 服务器安装了 numba 时使用 JIT 编译的循环版本（cache=True 复用编译结果），否则使用 NumPy 版本
+if njit is not None:
+    heading_kernel = njit(cache=True)(_heading_kernel_loop)
+else:
+    heading_kernel = _heading_kernel_numpy
+
+
+class IssueRecord:
+    """单个对象的问题记录（固定字段，__slots__ 避免每条记录一个 dict）"""
+    __slots__ = ('token', 'instance', 'class_name', 'issues')
+    
+    def __init__(self, token, instance, class_name, issues):
+        self.token = token
+        self.instance = instance
+        self.class_name = class_name
+        self.issues = issues
+
+
 def check_vehicle_heading(track_data, frame_to_ins, min_frames=3, min_displacement=1.0):
     """
-    使用多帧轨迹检查车辆朝向一致性
+    使用多帧轨迹检查车辆朝向一致性（整条轨迹一次性计算）
     
     Args:
         track_data: [(frame_idx, obj), ...] 按帧排序的轨迹数据
@@ -68,27 +230,15 @@ def check_vehicle_heading(track_data, frame_to_ins, min_frames=3, min_displaceme
         min_displacement: 最小位移阈值(米)，低于此值视为静止
     
     Returns:
-        dict: {frame_idx: issue_msg} 有问题的帧
+        dict: {track_pos: issue_msg} 有问题的轨迹点（track_data 中的下标）
     """
     issues = {}
     
-    if len(track_data) < min_frames:
+    n = len(track_data)
+    if n < min_frames:
         return issues
     
-    use_world = len(frame_to_ins) > 0
-    
-    # 提取所有位置
-    positions = []
-    for frame_idx, obj in track_data:
-        pos_ego = np.array(obj.get('translation', [0, 0, 0]))
-        ins = frame_to_ins.get(frame_idx)
-        if use_world and ins:
-            pos = transform_to_world(pos_ego, ins)
-        else:
-            pos = pos_ego
-        positions.append(pos[:2])
-    
-    positions = np.array(positions)
+    positions, rotations, rot_valid, azimuths = build_track_arrays(track_data, frame_to_ins)
     
     # 计算总位移，判断是否静止
     total_displacement = np.linalg.norm(positions[-1] - positions[0])
@@ -96,59 +246,17 @@ def check_vehicle_heading(track_data, frame_to_ins, min_frames=3, min_displaceme
         # 静止车辆，跳过检查
         return issues
     
-    # 使用滑动窗口计算局部运动方向（前后各N帧）
-    window_size = 2  # 前后各2帧
+    # 使用滑动窗口计算局部运动方向（前后各2帧）
+    diff_abs, local_displacement, flagged = heading_kernel(positions, rotations, rot_valid, azimuths, 2)
     
-    for i, (frame_idx, obj) in enumerate(track_data):
-        rotation = obj.get('rotation', [])
-        if len(rotation) != 4:
-            continue
-        
-        # 计算局部运动向量（使用前后多帧）
-        start_idx = max(0, i - window_size)
-        end_idx = min(len(positions) - 1, i + window_size)
-        
-        if end_idx - start_idx < 2:
-            continue
-        
-        motion_vec = positions[end_idx] - positions[start_idx]
-        local_displacement = np.linalg.norm(motion_vec)
-        
-        # 局部位移太小，可能是短暂停车或低速，跳过
-        if local_displacement < 0.3:
-            continue
-        
-        # 计算运动方向
-        motion_yaw = math.atan2(motion_vec[1], motion_vec[0])
-        
-        # 获取对象朝向
-        _, _, obj_yaw_ego = get_euler_angles(rotation)
-        ins = frame_to_ins.get(frame_idx)
-        if use_world and ins:
-            azimuth_rad = math.radians(ins.get('azimuth', 0))
-            obj_yaw = azimuth_rad + obj_yaw_ego
-        else:
-            obj_yaw = obj_yaw_ego
-        
-        # 计算角度差并归一化
-        diff = motion_yaw - obj_yaw
-        while diff > math.pi:
-            diff -= 2 * math.pi
-        while diff < -math.pi:
-            diff += 2 * math.pi
-        diff_abs = abs(diff)
-        
-        # 判断：正向（<60°）、倒车（~180°±60°）、或异常
-        is_forward = diff_abs < 1.05  # ~60度
-        is_backward = abs(diff_abs - math.pi) < 1.05  # 倒车
-        
-        if not is_forward and not is_backward:
-            direction = "侧向" if 1.05 <= diff_abs <= 2.09 else "异常"
-            issues[frame_idx] = (
-                f"朝向与运动方向不一致({direction}): "
-                f"差值{math.degrees(diff_abs):.1f}°, "
-                f"局部位移{local_displacement:.2f}m"
-            )
+    for i in np.flatnonzero(flagged):
+        d = diff_abs[i]
+        direction = "侧向" if 1.05 <= d <= 2.09 else "异常"
+        issues[int(i)] = (
+            f"朝向与运动方向不一致({direction}): "
+            f"差值{math.degrees(d):.1f}°, "
+            f"局部位移{local_displacement[i]:.2f}m"
+        )
     
     return issues
 
@@ -173,7 +281,7 @@ def main():
     rules = {}
     if Path(args.config).exists():
         with open(args.config, 'r') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=_YamlLoader)
             rules = config.get('rules', {})
     
     # 加载 INS 数据
@@ -225,11 +333,14 @@ def main():
                 if isinstance(objects, list):
                     frames_to_check.append((str(frame_id), objects))
     
-    # 排序
+    # 排序（先一次性解析数字帧号再排序，序号作为并列时的稳定性保证）
     try:
-        frames_to_check.sort(key=lambda x: int(x[0]))
-    except (ValueError, TypeError):
-        frames_to_check.sort(key=lambda x: x[0])
+        keyed = [(int(fid), i) for i, (fid, _) in enumerate(frames_to_check)]
+    except ValueError:
+        frames_to_check.sort(key=itemgetter(0))
+    else:
+        keyed.sort()
+        frames_to_check = [frames_to_check[i] for _, i in keyed]
     
     total_frames = len(frames_to_check)
     print(f"开始检查 {total_frames} 帧 (仅检查车辆朝向)...")
@@ -290,21 +401,18 @@ def main():
                 skipped_static += 1
             continue
         
-        # 记录问题
-        for frame_idx, issue_msg in track_issues.items():
+        # 记录问题（问题按轨迹下标返回，直接取对应对象）
+        for track_pos, issue_msg in track_issues.items():
             issue_objects += 1
+            frame_idx, obj = track_data[track_pos]
             frame_id = frames_to_check[frame_idx][0]
-            obj = next(o for fi, o in track_data if fi == frame_idx)
-            
-            if frame_id not in issues_by_frame:
-                issues_by_frame[frame_id] = []
             
-            issues_by_frame[frame_id].append({
-                'token': obj.get('token', 'unknown'),
-                'instance': inst_id[:8] + '...',
-                'class': obj.get('attribute_tokens', {}).get('Class', 'unknown'),
-                'issues': [issue_msg]
-            })
+            issues_by_frame.setdefault(frame_id, []).append(IssueRecord(
+                obj.get('token', 'unknown'),
+                inst_id[:8] + '...',
+                obj.get('attribute_tokens', {}).get('Class', 'unknown'),
+                [issue_msg],
+            ))
     
     issue_frames = len(issues_by_frame)
     print(f"  检查实例: {checked_instances}, 静止跳过: {skipped_static}, 轨迹过短: {skipped_short}")
@@ -315,39 +423,55 @@ def main():
     print(f"  问题对象数: {issue_objects}")
     
     # 写入报告
+    # 先在内存中拼接报告，最后一次性写入
+    sep = "=" * 50
+    lines = [
+        f"检查报告 - {data_dir.name}\n",
+        f"{sep}\n\n",
+        "检查项目: 车辆朝向与运动方向一致性\n\n",
+        "统计汇总:\n",
+        f"  总帧数: {total_frames}\n",
+        f"  总对象数: {total_objects}\n",
+        f"  问题帧数: {issue_frames}\n",
+        f"  问题对象数: {issue_objects}\n",
+        f"  通过率: {(total_frames - issue_frames) * 100 / max(total_frames, 1):.1f}%\n",
+    ]
+    if ins_data:
+        lines.append(f"  自车位姿补偿: 已启用 ({len(ins_data)} 条INS数据)\n")
+    else:
+        lines.append("  自车位姿补偿: 未启用\n")
+    lines.append(f"\n{sep}\n\n")
+    
+    if not issues_by_frame:
+        lines.append("恭喜! 所有帧检查通过，未发现问题。\n")
+    else:
+        lines.append("问题详情:\n\n")
+        for frame_id, issues in sorted(issues_by_frame.items(), 
+                                       key=lambda x: int(x[0]) if x[0].isdigit() else x[0]):
+            lines.append(f"帧: {frame_id}\n")
+            for item in issues:
+                lines.append(f"  对象: {item.token} (类别: {item.class_name})\n")
+                lines.extend(f"    - {issue}\n" for issue in item.issues)
+            lines.append("\n")
+    
     with open(args.report, 'w') as f:
-        f.write(f"检查报告 - {data_dir.name}\n")
-        f.write("=" * 50 + "\n\n")
-        f.write(f"检查项目: 车辆朝向与运动方向一致性\n\n")
-        f.write(f"统计汇总:\n")
-        f.write(f"  总帧数: {total_frames}\n")
-        f.write(f"  总对象数: {total_objects}\n")
-        f.write(f"  问题帧数: {issue_frames}\n")
-        f.write(f"  问题对象数: {issue_objects}\n")
-        f.write(f"  通过率: {(total_frames - issue_frames) * 100 / max(total_frames, 1):.1f}%\n")
-        if ins_data:
-            f.write(f"  自车位姿补偿: 已启用 ({len(ins_data)} 条INS数据)\n")
-        else:
-            f.write(f"  自车位姿补偿: 未启用\n")
-        f.write("\n" + "=" * 50 + "\n\n")
-        
-        if not issues_by_frame:
-            f.write("恭喜! 所有帧检查通过，未发现问题。\n")
-        else:
-            f.write("问题详情:\n\n")
-            for frame_id, issues in sorted(issues_by_frame.items(), 
-                                           key=lambda x: int(x[0]) if x[0].isdigit() else x[0]):
-                f.write(f"帧: {frame_id}\n")
-                for item in issues:
-                    f.write(f"  对象: {item['token']} (类别: {item['class']})\n")
-                    for issue in item['issues']:
-                        f.write(f"    - {issue}\n")
-                f.write("\n")
+        f.write("".join(lines))
+    
+    # 机器可读的统计摘要（一行 JSON），调用方无需解析文本报告
+    with open(args.report + ".summary.json", 'w') as f:
+        json.dump({
+            "issues": issue_frames,
+            "issue_objects": issue_objects,
+            "total_frames": total_frames,
+            "total_objects": total_objects,
+        }, f)
     
     if issue_frames == 0:
         print("RESULT: PASS")
     else:
         print(f"RESULT: FAIL ({issue_frames} frames with issues)")
+    # 最后一行输出问题帧数，供调用方直接解析，无需回读报告
+    print(f"ISSUES={issue_frames}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+远程关键帧计数脚本
+在服务器上统计数据目录中的关键帧数量（流式解析，不将整个 JSON 载入内存）
+
+使用方法:
+    python3 keyframe_worker.py --data_dir /path/to/data --names sample.json undistorted/sample.json
+    python3 keyframe_worker.py --data_dirs /path/a /path/b   # 批量模式，每行输出 "数量\t目录"
+    python3 keyframe_worker.py --serve                       # 常驻模式，从 stdin 逐行读目录（或 "zip\tZIP路径"），逐行输出数量
+    python3 keyframe_worker.py --zip /path/to/file.zip       # 直接读取 ZIP 内的 sample.json（不解压）
+    python3 keyframe_worker.py --zips /path/a.zip /path/b.zip # 多进程并行统计多个 ZIP，每行输出 "数量\tZIP"
+"""
+import os
+import sys
+import json
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+# ijson 中表示一个完整值开始的事件
+_VALUE_EVENTS = ("start_map", "start_array", "string", "number", "boolean", "null")
+
+
+def _count_streaming(f):
+    """使用 ijson 事件流计数（f 为二进制文件对象），内存占用与文件大小无关"""
+    top_type = None
+    top_count = 0
+    frames_count = None
+    for prefix, event, value in ijson.parse(f):
+        if top_type is None:
+            top_type = event
+            continue
+        if top_type == "start_map":
+            if prefix == "" and event == "map_key":
+                top_count += 1
+                if value == "frames":
+                    frames_count = 0
+            elif prefix == "frames.item" and event in _VALUE_EVENTS and frames_count is not None:
+                frames_count += 1
+        elif top_type == "start_array":
+            if prefix == "item" and event in _VALUE_EVENTS:
+                top_count += 1
+    if top_type not in ("start_map", "start_array"):
+        raise ValueError("JSON 顶层既不是对象也不是数组")
+    return frames_count if frames_count is not None else top_count
+
+
+def _count_full(f):
+    """回退方案：完整加载 JSON"""
+    data = json.load(f)
+    return len(data['frames']) if isinstance(data, dict) and 'frames' in data else len(data)
+
+
+def _count_fileobj(f):
+    if ijson is not None:
+        return _count_streaming(f)
+    return _count_full(f)
+
+
+def count_keyframes(path):
+    """统计单个 JSON 文件的关键帧数量"""
+    with open(path, 'rb') as f:
+        return _count_fileobj(f)
+
+
+def count_data_dir(data_dir, names):
+    """按候选文件顺序查找并统计关键帧，找不到或解析失败返回 0"""
+    for name in names:
+        path = Path(data_dir) / name
+        if not path.exists():
+            continue
+        try:
+            return count_keyframes(path)
+        except Exception as e:
+            print(f"读取失败 {path}: {e}", file=sys.stderr)
+    return 0
+
+
+def count_zip(zip_path, names):
+    """
+    直接从 ZIP 中读取候选 JSON 计数（经中央目录定位成员，不解压到磁盘）
+    每个候选名取层级最浅的匹配成员，找不到或解析失败返回 0
+    """
+    try:
+        zf = zipfile.ZipFile(zip_path)
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"打开失败 {zip_path}: {e}", file=sys.stderr)
+        return 0
+    with zf:
+        members = [n for n in zf.namelist() if not n.endswith('/')]
+        for name in names:
+            matches = [n for n in members if n == name or n.endswith('/' + name)]
+            if not matches:
+                continue
+            member = min(matches, key=lambda n: n.count('/'))
+            try:
+                with zf.open(member) as f:
+                    return _count_fileobj(f)
+            except Exception as e:
+                print(f"读取失败 {zip_path}:{member}: {e}", file=sys.stderr)
+    return 0
+
+
+def serve(names, zip_names):
+    """
+    常驻模式：每读入一行输出一行数量，直到 stdin 关闭
+    输入行为数据目录，或 "zip\t<ZIP 路径>"（按 zip_names 直接读取 ZIP 内的 JSON）
+    """
+    for line in sys.stdin:
+        query = line.rstrip("\n")
+        if not query:
+            continue
+        if query.startswith("zip\t"):
+            print(count_zip(query[4:], zip_names), flush=True)
+        else:
+            print(count_data_dir(query, names), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键帧计数脚本")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--data_dir", help="数据目录")
+    group.add_argument("--data_dirs", nargs="+", help="多个数据目录（单次启动批量统计）")
+    group.add_argument("--serve", action="store_true", help="常驻模式，从 stdin 读取目录")
+    group.add_argument("--zip", help="ZIP 文件（直接读取其中的候选 JSON）")
+    group.add_argument("--zips", nargs="+", help="多个 ZIP 文件（多进程并行统计）")
+    parser.add_argument("--names", nargs="+", default=["sample.json", "undistorted/sample.json"],
+                        help="候选 JSON 文件（相对数据目录，按优先级排序）")
+    parser.add_argument("--zip_names", nargs="+", default=["sample.json", "undistorted/sample.json"],
+                        help="常驻模式下 ZIP 查询使用的候选 JSON 文件")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.names, args.zip_names)
+    elif args.zip:
+        print(count_zip(args.zip, args.names))
+    elif args.zips:
+        workers = min(len(args.zips), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            counts = executor.map(count_zip, args.zips, [args.names] * len(args.zips))
+            for zip_path, count in zip(args.zips, counts):
+                print(f"{count}\t{zip_path}")
+    elif args.data_dirs:
+        for data_dir in args.data_dirs:
+            print(f"{count_data_dir(data_dir, args.names)}\t{data_dir}")
+    else:
+        print(count_data_dir(args.data_dir, args.names))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,13 @@
 
 使用方法:
     python3 zip_worker.py --zip /path/to/file.zip --json /path/to/annotation.json --out /output/dir
+    cat annotation.json | python3 zip_worker.py --zip /path/to/file.zip --json - --json_name annotation.json --out /output/dir
+    python3 zip_worker.py --serve    # 常驻模式：每行一个 JSON 任务，每行输出一个 JSON 结果
 """
 import os
 import sys
+import json
+import base64
 import shutil
 import zipfile
 import argparse
@@ -41,23 +45,37 @@ def find_data_root_in_zip(zip_file):
     return ""
 
 
-def main():
-    parser = argparse.ArgumentParser(description="ZIP 文件处理脚本")
-    parser.add_argument("--zip", required=True, help="ZIP 文件路径")
-    parser.add_argument("--json", required=True, help="JSON 标注文件路径")
-    parser.add_argument("--out", required=True, help="输出目录")
-    parser.add_argument("--output_name", default=None, help="输出目录名（可选，默认使用 ZIP 文件名）")
-    parser.add_argument("--rename_json", default="False", help="是否重命名 JSON 为 annotations.json")
-    args = parser.parse_args()
-    
-    zip_path = Path(args.zip)
-    json_path = Path(args.json)
-    output_root = Path(args.out)
-    rename = args.rename_json.lower() == "true"
+# 需要保留的文件和目录
+KEEP_ITEMS = [
+    "sample.json",
+    "ins.json", 
+    "sensor_config_combined_latest.json",
+    "combined_scales",
+    "camera_cam_3M_front",
+    "camera_cam_3M_left",
+    "camera_cam_3M_right",
+    "camera_cam_3M_rear",
+    "camera_cam_8M_wa_front",
+    "iv_points_front_left",
+    "iv_points_front_mid",
+    "iv_points_front_right",
+    "iv_points_rear_left",
+    "iv_points_rear_right",
+    "iv_points_left_mid",
+    "iv_points_right_mid"
+]
+
+
+def process(zip_path, output_root, output_name, rename, json_path, json_data=None, log=print):
+    """
+    解压 ZIP 并放入 JSON，返回提取的文件数
+    json_data 不为 None 时直接写入该内容（json_path 仅用于确定文件名），否则复制 json_path
+    """
+    zip_path = Path(zip_path)
+    json_path = Path(json_path)
     
     # 目标目录：优先使用指定的输出名称，否则使用 ZIP 文件名
-    output_name = args.output_name if args.output_name else zip_path.stem
-    final_dir = output_root / output_name
+    final_dir = Path(output_root) / (output_name or zip_path.stem)
     
     try:
         # 创建最终目录（如果已存在则清理）
@@ -67,35 +85,18 @@ def main():
         
         # 复制 JSON 文件
         target_json = "annotations.json" if rename else json_path.name
-        shutil.copy(str(json_path), str(final_dir / target_json))
-        print(f"复制 JSON: {target_json}")
-        
-        # 需要保留的文件和目录
-        keep_items = [
-            "sample.json",
-            "ins.json", 
-            "sensor_config_combined_latest.json",
-            "combined_scales",
-            "camera_cam_3M_front",
-            "camera_cam_3M_left",
-            "camera_cam_3M_right",
-            "camera_cam_3M_rear",
-            "camera_cam_8M_wa_front",
-            "iv_points_front_left",
-            "iv_points_front_mid",
-            "iv_points_front_right",
-            "iv_points_rear_left",
-            "iv_points_rear_right",
-            "iv_points_left_mid",
-            "iv_points_right_mid"
-        ]
+        if json_data is not None:
+            (final_dir / target_json).write_bytes(json_data)
+        else:
+            shutil.copy(str(json_path), str(final_dir / target_json))
+        log(f"复制 JSON: {target_json}")
         
         # 选择性解压：只提取需要的文件
-        print(f"选择性解压: {zip_path.name}")
+        log(f"选择性解压: {zip_path.name}")
         with zipfile.ZipFile(zip_path, 'r') as zf:
             # 查找数据根目录
             data_root = find_data_root_in_zip(zf)
-            print(f"数据根目录: {data_root}")
+            log(f"数据根目录: {data_root}")
             
             # 构建需要提取的文件路径前缀
             prefix = data_root + "/" if data_root else ""
@@ -114,7 +115,7 @@ def main():
                 
                 # 检查是否是需要保留的项目
                 should_extract = False
-                for item in keep_items:
+                for item in KEEP_ITEMS:
                     if rel_path == item or rel_path.startswith(item + "/"):
                         should_extract = True
                         break
@@ -136,10 +137,10 @@ def main():
                         
                         # 每提取100个文件打印一次进度
                         if extracted_count % 100 == 0:
-                            print(f"已提取: {extracted_count} 个文件")
+                            log(f"已提取: {extracted_count} 个文件")
         
-        print(f"提取完成: 共 {extracted_count} 个文件")
-        print("OK")
+        log(f"提取完成: 共 {extracted_count} 个文件")
+        return extracted_count
         
     except Exception as e:
         # 如果出错，清理不完整的目标目录
@@ -148,5 +149,54 @@ def main():
         raise
 
 
+def serve():
+    """
+    常驻模式：每读入一行 JSON 任务输出一行 JSON 结果，直到 stdin 关闭
+    任务字段: zip, out, output_name, rename_json, json_name, json_b64（JSON 内容的 base64）
+    结果: {"ok": true, "extracted": n} 或 {"ok": false, "error": "..."}
+    """
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+            count = process(
+                job["zip"], job["out"], job.get("output_name"), bool(job.get("rename_json")),
+                job.get("json_name") or "annotations.json", base64.b64decode(job["json_b64"]),
+                log=lambda msg: None,
+            )
+            result = {"ok": True, "extracted": count}
+        except Exception as e:
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        print(json.dumps(result, ensure_ascii=False), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ZIP 文件处理脚本")
+    parser.add_argument("--serve", action="store_true", help="常驻模式，从 stdin 逐行读取 JSON 任务")
+    parser.add_argument("--zip", help="ZIP 文件路径")
+    parser.add_argument("--json", help="JSON 标注文件路径（- 表示从标准输入读取）")
+    parser.add_argument("--json_name", default=None, help="从标准输入读取时的 JSON 文件名")
+    parser.add_argument("--out", help="输出目录")
+    parser.add_argument("--output_name", default=None, help="输出目录名（可选，默认使用 ZIP 文件名）")
+    parser.add_argument("--rename_json", default="False", help="是否重命名 JSON 为 annotations.json")
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve()
+        return
+    if not (args.zip and args.json and args.out):
+        parser.error("非常驻模式需要 --zip、--json 和 --out")
+    
+    from_stdin = args.json == "-"
+    json_path = (args.json_name or "annotations.json") if from_stdin else args.json
+    
+    # 先读完标准输入，避免发送端阻塞
+    json_data = sys.stdin.buffer.read() if from_stdin else None
+    
+    process(args.zip, args.out, args.output_name, args.rename_json.lower() == "true",
+            json_path, json_data)
+    print("OK")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+SSH 连接池测试脚本
+使用假的 SSH 客户端验证连接池的脚本部署行为（无需真实服务器）
+"""
+import sys
+from pathlib import Path
+from contextlib import contextmanager
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.pipeline import runner
+from src.pipeline.config import ServerConfig
+
+
+class FakeSSHClient:
+    """记录所有远程调用的假 SSH 客户端"""
+    server = ServerConfig(name="fake", ip="127.0.0.1", user="test",
+                          zip_dir="/tmp/zips", process_dir="/tmp/process", final_dir="/tmp/final")
+
+    def __init__(self, server=None):
+        self.calls = []
+        self.is_connected = False
+
+    def connect(self, timeout: int = 10, share_with=None) -> bool:
+        self.is_connected = True
+        return True
+
+    def close(self):
+        self.is_connected = False
+
+    def exec_command(self, cmd, timeout: int = 60):
+        self.calls.append(("exec_command", cmd))
+        return 0, "", ""
+
+    def write_file(self, remote_path, content, compress: bool = False):
+        self.calls.append(("write_file", remote_path))
+
+
+@contextmanager
+def _fake_pool(scripts_deployed: bool):
+    """临时把连接池使用的 SSHClient 换成假客户端"""
+    original = runner.SSHClient
+    runner.SSHClient = FakeSSHClient
+    pool = runner.SSHConnectionPool(size=2, scripts_deployed=scripts_deployed)
+    try:
+        yield pool
+    finally:
+        pool.close_all()
+        runner.SSHClient = original
+
+
+def test_pooled_connection_skips_deploy():
+    """scripts_deployed=True 时池中连接及其处理器都不再部署"""
+    with _fake_pool(scripts_deployed=True) as pool:
+        ssh, processor = pool.get()
+        processor.deploy_scripts()
+        assert ssh.calls == [], ssh.calls
+        pool.put((ssh, processor))
+
+
+def test_first_connection_deploys_once():
+    """未部署时首个连接部署，之后创建的连接不再部署"""
+    with _fake_pool(scripts_deployed=False) as pool:
+        first = pool.get()
+        second = pool.get()
+        assert any(name == "exec_command" for name, _ in first[0].calls)
+        second[1].deploy_scripts()
+        assert second[0].calls == [], second[0].calls
+        pool.put(first)
+        pool.put(second)
+
+
+def main():
+    for test in (test_pooled_connection_skips_deploy, test_first_connection_deploys_once):
+        test()
+        print(f"✓ {test.__name__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+关键帧计数测试脚本
+验证格式化 JSON 的字节扫描快速路径与完整解析结果一致
+"""
+import sys
+import json
+import tempfile
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tools.keyframe_counter import count_keyframes
+
+
+SAMPLE = {"0": {"a": 1}, "1": {"b": {"c": 2}}, "2": [1, 2, {"d": 3}]}
+
+
+def _count(data, **dump_kwargs) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "sample.json"
+        path.write_text(json.dumps(data, **dump_kwargs), encoding="utf-8")
+        return count_keyframes(str(path))
+
+
+def test_indented_json():
+    """带缩进的 JSON 走快速路径"""
+    assert _count(SAMPLE, indent=2) == 2
+    assert _count(SAMPLE, indent="\t") == 2
+
+
+def test_compact_json():
+    """单行 JSON 走完整解析"""
+    assert _count(SAMPLE) == 2
+
+
+def test_zero_indent_json():
+    """indent=0 时各层缩进相同，不能走快速路径（否则嵌套键也会被计数）"""
+    assert _count(SAMPLE, indent=0) == 2
+
+
+def test_non_object_json():
+    """顶层不是对象的 JSON 不是关键帧文件，不计数"""
+    assert _count(list(range(50))) is None
+    assert _count(list(range(50)), indent=2) is None
+    assert _count("hello") is None
+
+
+def main():
+    for test in (test_indented_json, test_compact_json, test_zero_indent_json, test_non_object_json):
+        test()
+        print(f"✓ {test.__name__}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,11 @@ import sys
 import yaml
 import requests
 
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 def load_env():
     """加载环境变量"""
     env_file = "configs/.env"
@@ -25,7 +30,7 @@ def main():
     load_env()
     
     with open("configs/feishu.yaml", 'r') as f:
-        config = yaml.safe_load(f)
+        config = yaml.load(f, Loader=_YamlLoader)
     
     app_id = os.environ.get('FEISHU_APP_ID', '')
     app_secret = os.environ.get('FEISHU_APP_SECRET', '')
@@ -1,6 +1,37 @@
 import os
+import re
 import json
+import mmap
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 格式化 JSON 中第一个顶层键的缩进（至少一个空白；indent=0 时各层缩进相同，无法区分层级）
+_FIRST_KEY_INDENT = re.compile(rb'\A\s*\{[ \t]*\r?\n([ \t]+)"')
+
+def _count_top_level_keys(mv):
+    """
+    按字节扫描统计格式化（带缩进）JSON 的顶层键数量。
+    顶层键都以"换行 + 顶层缩进 + 引号"开头，更深层的行缩进更长，不会被匹配。
+    非格式化或无缩进（indent=0）的 JSON 返回 None。
+    """
+    m = _FIRST_KEY_INDENT.match(mv)
+    if m is None:
+        return None
+    prefix = b'\n' + m.group(1) + b'"'
+    n = len(re.findall(re.escape(prefix), mv))
+    return n - 1 if mv.find(prefix + b'0":') != -1 else n
+
+def _load_json(json_file_path):
+    if orjson is not None:
+        with open(json_file_path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(json_file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
 def count_keyframes(json_file_path):
     """
@@ -8,32 +39,61 @@ def count_keyframes(json_file_path):
     假设JSON格式为：键为字符串'1', '2', ..., 'n'，值是关键帧数据。
     关键帧ID从'1'开始，排除'0'。
     关键帧个数为键的数量减去'0'（如果存在）。
+    格式化的 JSON 通过 mmap 字节扫描计数，无需完整解析。
     """
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        try:
+            with open(json_file_path, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mv:
+                n = _count_top_level_keys(mv)
+            if n is not None:
+                return n
+        except ValueError:
+            # 空文件无法 mmap，交给 JSON 解析报错
+            pass
+        data = _load_json(json_file_path)
+        # 顶层不是对象（列表、字符串等）的不是关键帧文件，不计数（json 与 orjson 解析结果相同）
+        if not isinstance(data, dict):
+            return None
         # 排除'0'，关键帧从'1'开始
-        keyframe_count = len([k for k in data.keys() if k != '0'])
-        return keyframe_count
+        n = len(data)
+        return n - 1 if '0' in data else n
     except Exception as e:
         print(f"Error reading {json_file_path}: {e}")
         return None
 
-def count_keyframes_in_directory(directory):
+def collect_json_files(directory):
+    """
+    递归收集目录下的所有JSON文件路径（os.scandir 复用目录项缓存的类型信息）。
+    """
+    paths = []
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith('.json'):
+                        paths.append(entry.path)
+        except OSError as e:
+            print(f"Error scanning {current}: {e}")
+    return paths
+
+def count_keyframes_in_directory(directory, executor=None):
     """
     递归统计目录下的所有JSON文件的关键帧总数。
+    传入 executor 时在进程池中并行解析。
     """
-    total_keyframes = 0
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.json'):
-                file_path = os.path.join(root, file)
-                count = count_keyframes(file_path)
-                if count is not None:
-                    total_keyframes += count
-    return total_keyframes
+    paths = collect_json_files(directory)
+    if executor is not None:
+        counts = executor.map(count_keyframes, paths, chunksize=64)
+    else:
+        counts = map(count_keyframes, paths)
+    return sum(c for c in counts if c is not None)
 
-def main(root_directory):
+def main(root_directory, workers=None):
     """
     统计根目录下每个子目录的关键帧数量，并计算总和。
     """
@@ -43,16 +103,19 @@ def main(root_directory):
 
     subdirs = [d for d in os.listdir(root_directory) if os.path.isdir(os.path.join(root_directory, d))]
     total_all = 0
-    for subdir in sorted(subdirs):
-        subdir_path = os.path.join(root_directory, subdir)
-        count = count_keyframes_in_directory(subdir_path)
-        print(f"{subdir}: {count}")
-        total_all += count
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for subdir in sorted(subdirs):
+            subdir_path = os.path.join(root_directory, subdir)
+            count = count_keyframes_in_directory(subdir_path, executor)
+            print(f"{subdir}: {count}")
+            total_all += count
 
     print(f"\n总和: {total_all}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Count total keyframes in subdirectories.")
     parser.add_argument("directory", help="Root directory to scan.")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="Number of worker processes (default: CPU count).")
     args = parser.parse_args()
-    main(args.directory)
\ No newline at end of file
+    main(args.directory, args.workers)
\ No newline at end of file
@@ -18,6 +18,12 @@ import yaml
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
 from tqdm import tqdm
 
 from src.pipeline.downloader import TokenManager
@@ -79,7 +85,7 @@ class DataWeaveUploader:
             }
         
         with open(config_file, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f) or {}
+            return yaml.load(f, Loader=_YamlLoader) or {}
     
     def scan_zip_files(self, local_dir: str, pattern: str = "*.zip") -> List[Path]:
         """扫描本地目录中的 ZIP 文件（递归搜索所有子目录）"""